@@ -0,0 +1,109 @@
+import io
+import os
+from typing import Any, Iterator, Sequence
+
+# pyarrow is optional: it is imported on first use by select_arrow/insert_arrow,
+# so the rest of the package works without it.
+
+# column kind (see DBBase._type_kind) -> pyarrow type factory name
+ARROW_KINDS = {
+    "int": "int64",
+    "float": "float64",
+    "bool": "bool_",
+    "str": "string",
+}
+
+
+def require_pyarrow(feature: str = "select_arrow/insert_arrow"):
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError(f"{feature} need pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def arrow_type(kind: str | None):
+    """pyarrow type for a column kind, or None to let pyarrow infer it from the values."""
+    pa = require_pyarrow()
+    if kind == "datetime":
+        return pa.timestamp("us")
+    name = ARROW_KINDS.get(kind)
+    return getattr(pa, name)() if name else None
+
+
+def record_batch(rows: Sequence[Sequence[Any]], columns: list[str], types: list[Any]):
+    """Build a RecordBatch from driver tuple rows, one typed array per column.
+
+    types holds a pyarrow type (or None: infer) per column and is updated in place with the
+    inferred types, so later batches of the same result get the same schema.
+    """
+    pa = require_pyarrow()
+    column_values = list(zip(*rows)) if rows else [()] * len(columns)
+    arrays = []
+    for i, values in enumerate(column_values):
+        try:
+            array = pa.array(values, type=types[i])
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, OverflowError):
+            # e.g. tz-aware datetimes or out-of-range ints: fall back to inference
+            array = pa.array(values)
+        if array.type != pa.null():
+            types[i] = array.type
+        arrays.append(array)
+    return pa.RecordBatch.from_arrays(arrays, names=columns)
+
+
+def iter_batches(source: Any, batch_size: int) -> Iterator[Any]:
+    """Yield RecordBatches of at most batch_size rows from a pyarrow Table, RecordBatch,
+    RecordBatchReader or a Parquet file path (read one row group slice at a time)."""
+    pa = require_pyarrow()
+    if isinstance(source, (str, os.PathLike)):
+        import pyarrow.parquet as pq
+        yield from pq.ParquetFile(source).iter_batches(batch_size=batch_size)
+        return
+    if isinstance(source, pa.RecordBatch):
+        source = pa.Table.from_batches([source])
+    if isinstance(source, pa.Table):
+        yield from source.to_batches(max_chunksize=batch_size)
+        return
+    if isinstance(source, pa.RecordBatchReader):
+        for batch in source:
+            for start in range(0, batch.num_rows, batch_size):
+                yield batch.slice(start, batch_size)
+        return
+    raise TypeError(f"Expected a pyarrow Table, RecordBatch, RecordBatchReader or Parquet path, got {type(source).__name__}")
+
+
+def batch_rows(batch) -> list[tuple]:
+    """Rows of a RecordBatch as tuples for DB-API executemany, converted one column at a time."""
+    return list(zip(*(column.to_pylist() for column in batch.columns)))
+
+
+def batch_csv(batch) -> bytes:
+    """CSV bytes of a RecordBatch without header: values quoted, NULL as an unquoted empty field
+    (the convention of PostgreSQL COPY ... (FORMAT CSV))."""
+    import pyarrow.csv as pcsv
+    sink = io.BytesIO()
+    pcsv.write_csv(batch, sink, write_options=pcsv.WriteOptions(include_header=False, quoting_style="all_valid"))
+    return sink.getvalue()
+
+
+class ChunkReader(io.RawIOBase):
+    """Readable file object over an iterator of bytes-like chunks (e.g. a COPY TO STDOUT stream)."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(bytes(chunk))
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
@@ -0,0 +1,280 @@
+import asyncio
+import functools
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Sequence
+
+import pandas as pd
+import psycopg
+from psycopg.rows import dict_row, tuple_row
+
+from Database.src.dbbase import DBBase
+from Database.src.pool import AsyncConnectionPool, PoolConfig
+from Database.src.postgresql import PostgreSQLDatabase
+from Database.src.sqlite import SQLiteDatabase
+
+
+#AsyncDBBase is the asyncio counterpart of DBBase.
+class AsyncDBBase(ABC):
+    """Abstract base class for asyncio database access.
+
+    Mirrors the DBBase API with coroutines. `self.sync` is the matching DBBase
+    instance; it provides SQL building, normalization and the schema cache, and
+    for executor-backed backends it also runs the blocking calls.
+    """
+
+    def __init__(self, sync: DBBase):
+        self.sync = sync
+
+    @abstractmethod
+    async def select(self, query: str, params: tuple = ()) -> list[dict[str, Any]]:
+        pass
+    @abstractmethod
+    async def select_df(self, query: str, params: tuple = (), include_columns_when_empty: bool = False) -> pd.DataFrame:
+        pass
+    @abstractmethod
+    async def select_where(self, query_or_table: str, columns: Sequence[str] | None = None, where: str | None = None, params: tuple = ()) -> list[dict[str, Any]]:
+        pass
+    @abstractmethod
+    async def execute(self, query: str, params: tuple = ()) -> dict[str, Any]:
+        pass
+    @abstractmethod
+    async def get_table_schema(self, table: str) -> dict[str, str]:
+        pass
+    @abstractmethod
+    async def insert_dataframe(self, table: str, df: pd.DataFrame, batch_size: int = 1000) -> dict[str, Any]:
+        pass
+    @abstractmethod
+    async def close(self) -> None:
+        pass
+
+    async def insert(self, table: str, data: dict[str, Any]) -> dict[str, Any]:
+        return await self.execute(self.sync._insert_sql(table, list(data)), tuple(data.values()))
+
+    async def update(self, table: str, data: dict[str, Any], where: str, params: tuple = ()) -> dict[str, Any]:
+        return await self.execute(self.sync._update_sql(table, list(data), where), tuple(data.values()) + params)
+
+    async def delete(self, table: str, where: str, params: tuple = ()) -> dict[str, Any]:
+        return await self.execute(self.sync._delete_sql(table, where), params)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    @staticmethod
+    def _select_sql(query_or_table: str, columns: Sequence[str] | None, where: str | None) -> str:
+        if columns is None and where is None:
+            return query_or_table
+        query = f"SELECT {', '.join(columns) if columns else '*'} FROM {query_or_table}"
+        if where:
+            query += f" WHERE {where}"
+        return query
+
+
+class AsyncExecutorDatabase(AsyncDBBase):
+    """Runs a blocking DBBase on a thread pool (fallback for pytds and mysql-connector).
+
+    The wrapped instance is switched to pooled mode so each worker thread reuses
+    a connection instead of reconnecting per call.
+    """
+
+    def __init__(self, sync: DBBase, max_workers: int = 4):
+        super().__init__(sync)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{type(sync).__name__}-async")
+        if sync.pool is None:
+            sync.enable_pool(PoolConfig(min_size=0, max_size=max_workers))
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def select(self, query: str, params: tuple = ()) -> list[dict[str, Any]]:
+        return await self._run(self.sync.select, query, params)
+
+    async def select_df(self, query: str, params: tuple = (), include_columns_when_empty: bool = False) -> pd.DataFrame:
+        return await self._run(self.sync.select_df, query, params, include_columns_when_empty)
+
+    async def select_where(self, query_or_table: str, columns: Sequence[str] | None = None, where: str | None = None, params: tuple = ()) -> list[dict[str, Any]]:
+        return await self._run(self.sync.select_where, query_or_table, columns, where, params)
+
+    async def execute(self, query: str, params: tuple = ()) -> dict[str, Any]:
+        return await self._run(self.sync.execute, query, params)
+
+    async def insert(self, table: str, data: dict[str, Any]) -> dict[str, Any]:
+        return await self._run(self.sync.insert, table, data)
+
+    async def update(self, table: str, data: dict[str, Any], where: str, params: tuple = ()) -> dict[str, Any]:
+        return await self._run(self.sync.update, table, data, where, params)
+
+    async def delete(self, table: str, where: str, params: tuple = ()) -> dict[str, Any]:
+        return await self._run(self.sync.delete, table, where, params)
+
+    async def get_table_schema(self, table: str) -> dict[str, str]:
+        return await self._run(self.sync.get_table_schema, table)
+
+    async def insert_dataframe(self, table: str, df: pd.DataFrame, batch_size: int = 1000) -> dict[str, Any]:
+        return await self._run(self.sync.insert_dataframe, table, df, batch_size)
+
+    async def close(self) -> None:
+        await self._run(self.sync.close)
+        self._executor.shutdown(wait=False)
+
+
+class AsyncSQLiteDatabase(AsyncExecutorDatabase):
+    """SQLite on one dedicated thread with one connection, the way aiosqlite does it."""
+
+    def __init__(self, database: str):
+        super().__init__(SQLiteDatabase(database), max_workers=1)
+
+
+class AsyncPostgreSQLDatabase(AsyncDBBase):
+    """PostgreSQL on psycopg.AsyncConnection, optionally through an AsyncConnectionPool."""
+
+    def __init__(self, host, database, user, password, port=5432, pool_config: PoolConfig | None = None):
+        """
+        Args:
+            host, database, user, password, port: as for PostgreSQLDatabase.
+            pool_config: Enable an AsyncConnectionPool with these settings (None: connect per call).
+        """
+        super().__init__(PostgreSQLDatabase(host, database, user, password, port))
+        self.pool: AsyncConnectionPool | None = None
+        if pool_config is not None:
+            self.pool = AsyncConnectionPool(self.connect, pool_config, check=self._check_connection)
+
+    async def connect(self) -> psycopg.AsyncConnection:
+        return await psycopg.AsyncConnection.connect(
+            host=self.sync.host,
+            dbname=self.sync.database,
+            user=self.sync.user,
+            password=self.sync.password,
+            port=self.sync.port,
+            row_factory=dict_row,
+            autocommit=False
+        )
+
+    @asynccontextmanager
+    async def _connection(self) -> AsyncIterator[psycopg.AsyncConnection]:
+        if self.pool is not None:
+            async with self.pool.connection() as conn:
+                yield conn
+            return
+        conn = await self.connect()
+        try:
+            yield conn
+        finally:
+            await conn.close()
+
+    @staticmethod
+    async def _check_connection(conn) -> None:
+        await conn.execute("SELECT 1")
+        await conn.rollback()
+
+    async def select(self, query: str, params: tuple = ()) -> list[dict[str, Any]]:
+        async with self._connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+                return await cur.fetchall()
+
+    async def select_df(self, query: str, params: tuple = (), include_columns_when_empty: bool = False) -> pd.DataFrame:
+        async with self._connection() as conn:
+            async with conn.cursor(row_factory=tuple_row) as cur:
+                await cur.execute(query, params)
+                description = cur.description or []
+                rows = await cur.fetchall() if description else []
+        columns = [col[0] for col in description]
+        kinds = [self.sync._type_kind(col[1]) for col in description]
+        return self.sync._frame_from_rows(rows, columns, kinds)
+
+    async def select_where(self, query_or_table: str, columns: Sequence[str] | None = None, where: str | None = None, params: tuple = ()) -> list[dict[str, Any]]:
+        return await self.select(self._select_sql(query_or_table, columns, where), params)
+
+    async def select_iter(self, query: str, params: tuple = (), batch_size: int = 1000) -> AsyncIterator[dict[str, Any]]:
+        """Yield rows from a server-side cursor, batch_size rows per round trip."""
+        async with self._connection() as conn:
+            async with conn.cursor(name=f"select_iter_{uuid.uuid4().hex[:12]}") as cur:
+                await cur.execute(query, params)
+                while True:
+                    batch = await cur.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    for row in batch:
+                        yield row
+
+    async def execute(self, query: str, params: tuple = ()) -> dict[str, Any]:
+        try:
+            async with self._connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(query, params)
+                await conn.commit()
+            return {"success": True, "rows_affected": cur.rowcount, "error": None}
+        except Exception as e:
+            return {"success": False, "rows_affected": 0, "error": str(e)}
+
+    async def get_table_schema(self, table: str) -> dict[str, str]:
+        """Same catalog query and schema cache (self.sync.schema_cache) as PostgreSQLDatabase.get_table_schema."""
+        async def load() -> dict[str, str]:
+            rows = await self.select(self.sync.TABLE_SCHEMA_SQL, self.sync._split_table(table))
+            return {r["column_name"]: r["data_type"] for r in rows}
+
+        cache = self.sync.schema_cache
+        if cache is None:
+            return await load()
+        return await cache.get_or_load_async(self.sync._schema_key(table), load)
+
+    async def insert_dataframe(self, table: str, df: pd.DataFrame, batch_size: int = 1000) -> dict[str, Any]:
+        """Same report and batching as DBBase.insert_dataframe; normalization runs off the event loop."""
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        schema = await self.get_table_schema(table)
+        columns = [col for col in schema if col in df.columns]
+        attempted = len(df)
+        if attempted == 0:
+            return {"attempted": 0, "succeeded": 0, "failed": 0, "errors": []}
+        if not columns:
+            error = ValueError(f"No DataFrame columns match the schema of {table}")
+            return {"attempted": attempted, "succeeded": 0, "failed": attempted,
+                    "errors": [(pos + 1, error) for pos in range(attempted)]}
+
+        rows, errors = await asyncio.to_thread(self.sync._normalize_frame, df, columns, schema)
+        failed_positions = {pos for pos, _ in errors}
+        pending = [(pos, row) for pos, row in enumerate(rows, start=1) if pos not in failed_positions]
+        query = self.sync._insert_sql(table, columns)
+        succeeded = 0
+        async with self._connection() as conn:
+            for start in range(0, len(pending), batch_size):
+                succeeded += await self._insert_batch(conn, query, pending[start:start + batch_size], errors)
+
+        errors.sort(key=lambda e: e[0])
+        return {
+            "attempted": attempted,
+            "succeeded": succeeded,
+            "failed": attempted - succeeded,
+            "errors": errors,
+        }
+
+    async def _insert_batch(self, conn, query: str, batch: list[tuple[int, tuple]], errors: list[tuple[int, Exception]]) -> int:
+        try:
+            async with conn.cursor() as cur:
+                await cur.executemany(query, [row for _, row in batch])
+            await conn.commit()
+            return len(batch)
+        except Exception as e:
+            await conn.rollback()
+            if len(batch) == 1:
+                errors.append((batch[0][0], e))
+                return 0
+        middle = len(batch) // 2
+        return (await self._insert_batch(conn, query, batch[:middle], errors)
+                + await self._insert_batch(conn, query, batch[middle:], errors))
+
+    def pool_stats(self) -> dict[str, Any] | None:
+        return self.pool.stats() if self.pool is not None else None
+
+    async def close(self) -> None:
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
@@ -0,0 +1,97 @@
+import threading
+
+# Error text of drivers that reject a batch for its size rather than its content
+LIMIT_ERROR_MARKERS = (
+    "too many sql variables",        # SQLite
+    "too many parameters",           # SQL Server (2100), PostgreSQL (65535)
+    "max_allowed_packet",            # MySQL
+    "packet too large",
+    "packet for query is too large",
+    "packet bigger than",
+)
+
+
+def is_batch_limit_error(error: Exception) -> bool:
+    text = str(error).lower()
+    return any(marker in text for marker in LIMIT_ERROR_MARKERS)
+
+
+class AdaptiveBatcher:
+    """AIMD batch size controller for bulk writes.
+
+    After each batch, record() compares its rows/sec with the best seen so far: while
+    throughput holds, the size grows by a fixed step (additive increase); when it drops,
+    the size falls back to the best size, or shrinks by `decrease` if it is already
+    there (multiplicative decrease). back_off() is called when the driver rejects a batch
+    for its size; it also lowers the ceiling so the size never grows past it again.
+    Shared by the worker threads of one load, so all methods are thread-safe.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        maximum: int = 100_000,
+        minimum: int = 1,
+        step: int | None = None,
+        decrease: float = 0.5,
+        tolerance: float = 0.1,
+    ):
+        """
+        Args:
+            initial: First batch size (see DBBase._initial_batch_size).
+            maximum: Upper bound, e.g. from the backend's packet size.
+            minimum: Lower bound.
+            step: Rows added per increase (default initial // 4).
+            decrease: Factor applied on a throughput drop or a size error.
+            tolerance: Relative drop from the best rows/sec that still counts as "holding".
+        """
+        if minimum < 1 or maximum < minimum:
+            raise ValueError("need 1 <= minimum <= maximum")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.size = min(max(initial, minimum), maximum)
+        self.step = step or max(1, self.size // 4)
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.best_size = self.size
+        self.best_rate = 0.0
+        self.batches = 0
+        self.backoffs = 0
+        self._lock = threading.Lock()
+
+    def record(self, rows: int, seconds: float) -> None:
+        """Feed the outcome of a successful batch of `rows` rows."""
+        if rows <= 0 or seconds <= 0:
+            return
+        rate = rows / seconds
+        with self._lock:
+            self.batches += 1
+            if rows < self.size:
+                # the short last batch of a partition says nothing about the current size
+                return
+            if rate > self.best_rate:
+                self.best_rate, self.best_size = rate, self.size
+            if rate >= self.best_rate * (1 - self.tolerance):
+                self.size = min(self.maximum, self.size + self.step)
+            elif self.best_size < self.size:
+                self.size = self.best_size
+            else:
+                self.size = max(self.minimum, int(self.size * self.decrease))
+            # let an old peak fade, so one lucky measurement does not pin the size
+            self.best_rate *= 1 - self.tolerance / 10
+
+    def back_off(self, failed_size: int) -> None:
+        """A batch of failed_size rows was too large for the driver or server."""
+        with self._lock:
+            self.backoffs += 1
+            self.maximum = max(self.minimum, min(self.maximum, int(failed_size * self.decrease)))
+            self.size = min(self.size, self.maximum)
+            if self.best_size > self.maximum:
+                # the old peak is out of reach now; measure again below the new ceiling
+                self.best_size, self.best_rate = self.maximum, 0.0
+
+    @property
+    def settled(self) -> int:
+        """Batch size with the best measured throughput (the current size before any measurement)."""
+        with self._lock:
+            return self.best_size if self.best_rate > 0 else self.size
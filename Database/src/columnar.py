@@ -0,0 +1,89 @@
+from datetime import datetime
+from typing import Any, Sequence
+
+import numpy as np
+
+# column kind -> dtype of its buffer; "str" and unknown kinds are object arrays
+KIND_DTYPES = {"int": np.dtype(np.int64), "float": np.dtype(np.float64), "bool": np.dtype(bool),
+               "datetime": np.dtype("datetime64[us]")}
+SAMPLE_KINDS = {bool: "bool", int: "int", float: "float", datetime: "datetime"}
+OBJECT = np.dtype(object)
+
+
+class ColumnBuffer:
+    """Typed NumPy array for one result column, filled chunk by chunk.
+
+    The array starts with `capacity` slots and doubles whenever a chunk does not fit, so
+    filling n rows copies O(n) values in total even when the row count is not known up front.
+    Without a kind (no type code in cursor.description) the kind is taken from the first
+    non-NULL value. A chunk the dtype cannot hold promotes the whole column, as select_df
+    would have typed it: NULLs in an int column give float64 with NaN, everything else
+    (NULLs in a bool column, text in a number column, tz-aware datetimes) gives object.
+    """
+
+    __slots__ = ("kind", "length", "data")
+
+    def __init__(self, kind: str | None = None, capacity: int = 1024):
+        self.kind = kind
+        self.length = 0
+        self.data = np.empty(max(capacity, 1), dtype=KIND_DTYPES.get(kind, OBJECT))
+
+    def extend(self, values: Sequence[Any]) -> None:
+        """Append one chunk of column values (a tuple from zip(*rows) or a list)."""
+        if not values:
+            return
+        if self.kind is None:
+            sample = next((v for v in values if v is not None), None)
+            if sample is not None:
+                self.kind = SAMPLE_KINDS.get(type(sample), "str")
+                dtype = KIND_DTYPES.get(self.kind, OBJECT)
+                if self.length:
+                    # the rows so far were all NULL
+                    dtype = {"int": np.dtype(np.float64), "bool": OBJECT}.get(self.kind, dtype)
+                if dtype != OBJECT:
+                    self._retype(dtype)
+        chunk = self._convert(values)
+        end = self.length + len(chunk)
+        if end > len(self.data):
+            self._resize(max(end, 2 * len(self.data)))
+        self.data[self.length:end] = chunk
+        self.length = end
+
+    def finish(self) -> np.ndarray:
+        """The filled array. Shrinks the buffer in place (no copy when realloc can shrink it)."""
+        if self.length < len(self.data):
+            self.data.resize(self.length, refcheck=False)
+        return self.data
+
+    ### Private helper methods ###
+    def _convert(self, values: Sequence[Any]) -> np.ndarray:
+        dtype = self.data.dtype
+        if dtype != OBJECT:
+            sample = next((v for v in values if v is not None), None)
+            if (dtype.kind == "b" and None in values) or getattr(sample, "tzinfo", None) is not None:
+                self._retype(OBJECT)
+            else:
+                try:
+                    return np.array(values, dtype=dtype)
+                except (TypeError, ValueError, OverflowError):
+                    if dtype.kind == "i" and None in values:
+                        self._retype(np.dtype(np.float64))
+                    else:
+                        self._retype(OBJECT)
+                    return self._convert(values)
+        # fromiter keeps sequence values (e.g. PostgreSQL arrays) as single objects
+        return np.fromiter(values, dtype=object, count=len(values))
+
+    def _retype(self, dtype: np.dtype) -> None:
+        data = np.empty(len(self.data), dtype=dtype)
+        if dtype == OBJECT and self.data.dtype.kind == "M":
+            # keep datetimes as datetime objects, as pandas would, rather than integers
+            data[:self.length] = self.data[:self.length].astype(object)
+        else:
+            data[:self.length] = self.data[:self.length]
+        self.data = data
+
+    def _resize(self, capacity: int) -> None:
+        data = np.empty(capacity, dtype=self.data.dtype)
+        data[:self.length] = self.data[:self.length]
+        self.data = data
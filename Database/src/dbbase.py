@@ -1,13 +1,28 @@
 from abc import ABC, abstractmethod
-from typing import Any, Sequence
+from typing import Any, Iterator, Sequence
+import threading
+import time
 from enum import Enum
 from dataclasses import dataclass
-import math
-from datetime import datetime, date
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
 
-import hashlib
+import numpy as np
 import pandas as pd
 
+from Database.src.pool import ConnectionPool, PoolConfig
+from Database.src.schema_cache import SchemaCache
+from Database.src.statement_cache import StatementCache
+from Database.src.result_cache import ResultCache, invalidates
+from Database.src.instrumentation import QueryEvent, QueryObserver, TimedCursor, instrumented, phase
+from Database.src.batching import AdaptiveBatcher, is_batch_limit_error
+from Database.src.columnar import ColumnBuffer
+from Database.src.arrow import arrow_type, batch_rows, iter_batches, record_batch, require_pyarrow
+from Database.src.watermark import SQLiteWatermarkStore, WatermarkStore
+from Database.src.row_hash import RowHashCache, row_hashes, stable_row_hash
+from Database.src.normalizer import column_converter, compile_normalizer, parse_yymmddhhmm, scalar_converter
+
 @dataclass
 class DataFrameInsertResult:
     attempted: int
@@ -22,10 +37,35 @@ class DatabaseType(Enum):
     MYSQL = "mysql"
     SQLITE = "sqlite"
 
+class _Session:
+    """Connection pinned to one thread by DBBase.session()/transaction()."""
+    __slots__ = ("conn", "depth", "autocommit_every", "pending", "error", "savepoints", "written")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.depth = 0  # 0: session only, 1: transaction, >1: nested savepoints
+        self.autocommit_every: int | None = None
+        self.pending = 0
+        self.error: Exception | None = None
+        self.savepoints = 0
+        self.written: set[str] = set()  # tables to invalidate in the result cache at commit
+
 #DBBase is the base class for all database connections.
 class DBBase(ABC):
     """Abstract base class for database connections."""
 
+    # set by each backend
+    db_type: DatabaseType
+    # DB-API parameter marker used when building statements
+    placeholder = "%s"
+    # schema used when a table name has no "schema." prefix
+    default_schema = "public"
+    # whether several connections can hold open write transactions at once (atomic parallel inserts)
+    concurrent_writers = True
+    # bind parameters allowed in one statement, and rows allowed in one VALUES list (None: no limit)
+    max_params = 65535
+    max_rows_per_statement: int | None = None
+
     def __init__(self, host: str, database: str, user: str, password: str, port: int):
         """Initialize the database connection.
         Args:
@@ -41,6 +81,16 @@ class DBBase(ABC):
         self.password = password
         self.port = port
         self.conn = None
+        self._local = threading.local()
+        self.pool: ConnectionPool | None = None
+        # per-instance by default; assign a shared SchemaCache to share across instances
+        self.schema_cache: SchemaCache | None = SchemaCache()
+        # generated INSERT/UPDATE/DELETE text, keyed by (operation, table, columns, ...)
+        self.statement_cache = StatementCache()
+        # opt-in select/select_df result cache, see enable_result_cache()
+        self.result_cache: ResultCache | None = None
+        # instrumentation is off while this is empty, see add_observer()
+        self.observers: list[QueryObserver] = []
 
     @abstractmethod
     def connect(self):
@@ -74,64 +124,772 @@ class DBBase(ABC):
         """Delete rows in the given table matching the WHERE condition."""
         pass
     @abstractmethod
+    def _fetch_table_schema(self, table: str) -> dict[str, str]:
+        """Query the catalog for one table. Returns {column_name: data_type} in column order."""
+        pass
+    def _fetch_schema_tables(self, schema: str) -> dict[str, dict[str, str]]:
+        """Query the catalog for every table in a schema: {table: {column_name: data_type}}."""
+        raise NotImplementedError(f"{type(self).__name__} does not support schema prefetching")
+
+    ## Table schema (cached) ##
+    @instrumented
     def get_table_schema(self, table: str) -> dict[str, str]:
         """
         Returns: {column_name: data_type}
         Example: {"timeofcreation": "timestamp", "accountnumber": "integer"}
+
+        Results are served from self.schema_cache (TTL + LRU) when one is set.
         """
-        pass
+        if self.schema_cache is None:
+            return self._fetch_table_schema(table)
+        return self.schema_cache.get_or_load(self._schema_key(table), lambda: self._fetch_table_schema(table))
+
+    def invalidate_schema(self, table: str) -> None:
+        """Forget the cached schema of one table, e.g. after ALTER TABLE."""
+        if self.schema_cache is not None:
+            key = self._schema_key(table)
+            self.schema_cache.invalidate(lambda k: k == key)
+
+    def clear_schema_cache(self) -> None:
+        """Forget every cached schema that belongs to this database."""
+        if self.schema_cache is not None:
+            prefix = self._schema_key("")[:3]
+            self.schema_cache.invalidate(lambda k: k[:3] == prefix)
+
+    def prefetch_schema(self, schema: str | None = None) -> int:
+        """Load the schemas of all tables in `schema` with one catalog query. Returns tables cached."""
+        schema = schema or self._split_table("")[0]
+        tables = self._fetch_schema_tables(schema)
+        if self.schema_cache is not None:
+            for table_name, columns in tables.items():
+                if columns:
+                    self.schema_cache.put(self._schema_key(f"{schema}.{table_name}"), columns)
+        return len(tables)
+
+    ## Streaming selects ##
+    @instrumented
+    def select_iter(self, query: str, params: tuple = (), batch_size: int = 1000) -> Iterator[dict[str, Any]]:
+        """Execute a SELECT query and yield rows as dicts, fetching batch_size rows per round trip.
+        The connection is held until the generator is exhausted or closed.
+        """
+        for columns, batch in self._fetch_batches(query, params, batch_size):
+            for row in batch:
+                yield row if isinstance(row, dict) else dict(zip(columns, row))
+
+    @instrumented
+    def select_df_chunks(self, query: str, params: tuple = (), chunk_size: int = 10_000) -> Iterator[pd.DataFrame]:
+        """Execute a SELECT query and yield DataFrames of at most chunk_size rows."""
+        for columns, batch in self._fetch_batches(query, params, chunk_size):
+            with phase(self._event(), "frame"):
+                chunk = pd.DataFrame.from_records(batch, columns=columns)
+            yield chunk
+
+    @instrumented
+    def select_incremental(
+        self,
+        table: str,
+        watermark_column: str,
+        state_store: WatermarkStore | None = None,
+        columns: Sequence[str] | None = None,
+        where: str | None = None,
+        params: tuple = (),
+        chunk_size: int = 10_000,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Yield only the rows added since the last extract, as DataFrames of at most chunk_size rows.
+
+        Rows are read with WHERE watermark_column > <stored watermark> ORDER BY watermark_column,
+        so the column must only grow (an id, a creation timestamp, or fixed-width text such as
+        timeofcreation yymmddhhmm); rows where it is NULL are never returned. The watermark of a chunk is stored when the next chunk is
+        requested or the extract ends, so a job that stops while handling a chunk reads it again.
+        Args:
+            table: Table to extract from.
+            watermark_column: Monotonically increasing column.
+            state_store: Where watermarks are kept. Defaults to SQLiteWatermarkStore("watermarks.db"),
+                opened for this extract and closed when it ends (or the generator is closed).
+            columns: Columns to read (default all); the watermark column is always included.
+            where: Extra filter, ANDed with the watermark condition.
+            params: Parameters for where.
+            chunk_size: Rows per DataFrame.
+        """
+        store = state_store if state_store is not None else SQLiteWatermarkStore()
+        try:
+            name = self._watermark_name(table, watermark_column)
+            last = store.get(name)
+            conditions = [f"{watermark_column} IS NOT NULL"] + ([f"({where})"] if where else [])
+            if columns and watermark_column not in columns:
+                columns = [*columns, watermark_column]
+            if last is not None:
+                conditions.append(f"{watermark_column} > {self.placeholder}")
+                params = tuple(params) + (last,)
+            query = (f"SELECT {', '.join(columns) if columns else '*'} FROM {table} "
+                     f"WHERE {' AND '.join(conditions)} ORDER BY {watermark_column}")
+
+            pending = None
+            for chunk in self.select_df_chunks(query, params, chunk_size):
+                if pending is not None:
+                    store.set(name, pending)
+                # ordered by the watermark, so the last row holds the chunk's maximum
+                pending = chunk[watermark_column].iloc[-1]
+                yield chunk
+            if pending is not None:
+                store.set(name, pending)
+        finally:
+            if state_store is None:
+                # the default store is opened per extract; do not leave its connection behind
+                store.close()
+
+    def _watermark_name(self, table: str, watermark_column: str) -> str:
+        return f"{self.db_type.value}://{self.host}:{self.port}/{self.database}/{table}.{watermark_column}"
+
+    ## NumPy columns ##
+    @instrumented
+    def select_numpy(self, query: str, params: tuple = (), chunk_size: int = 65_536, expected_rows: int | None = None) -> dict[str, np.ndarray]:
+        """Execute a SELECT query and return {column: NumPy array}.
+
+        Rows are fetched chunk_size at a time and written straight into one preallocated array
+        per column (see ColumnBuffer), typed from cursor.description where the backend knows the
+        type, else from the first non-NULL value; no per-row dicts and no fetchall list.
+
+        Args:
+            query: SELECT statement; repeated column names keep the last one.
+            params: Query parameters.
+            chunk_size: Rows per fetchmany.
+            expected_rows: Initial array size when the row count is roughly known; the arrays
+                grow geometrically past it.
+        """
+        with self._read_connection() as conn:
+            cur = self._stream_cursor(conn)
+            cur.execute(query, params)
+            columns, arrays = self._fetch_columns(cur, chunk_size, expected_rows)
+        return dict(zip(columns, arrays))
+
+    ## Parallel range-partitioned select ##
+    @instrumented
+    def select_df_parallel(
+        self,
+        table: str,
+        partition_column: str,
+        num_partitions: int = 4,
+        columns: Sequence[str] | None = None,
+        where: str | None = None,
+        params: tuple = (),
+        chunk_size: int = 65_536,
+    ) -> pd.DataFrame:
+        """Read a table as num_partitions range queries running at the same time, one connection each.
+
+        MIN/MAX of partition_column split its range into equal-width slices
+        (partition_column >= lower AND partition_column < upper); a last query picks up the rows
+        where it is NULL. Every slice is read into typed column arrays on its own thread and
+        connection (borrowed from the pool when pooled, so at most max_size run at once), and the
+        slices are copied in order into one preallocated array per column. Rows come grouped by
+        slice, lowest range first and NULLs last, in no particular order within a slice. Inside
+        session()/transaction() the slices run one after another on the pinned connection.
+
+        Args:
+            table: Table (or view) to read.
+            partition_column: Numeric, date or timestamp column, ideally indexed. Equal-width
+                slices only balance the work when its values are spread evenly over the range.
+            num_partitions: Number of range slices.
+            columns: Columns to select (default all).
+            where: Optional filter, applied to the MIN/MAX lookup and every slice.
+            params: Parameters of where.
+            chunk_size: Rows per fetchmany within a slice.
+        Returns:
+            The DataFrame select_df would return for the same rows.
+        """
+        if num_partitions < 1:
+            raise ValueError("num_partitions must be at least 1")
+        col_str = ", ".join(columns) if columns else "*"
+        filter_sql = f"({where}) AND " if where else ""
+        bounds = self._select_uncached(
+            f"SELECT MIN({partition_column}) AS lo, MAX({partition_column}) AS hi FROM {table}"
+            + (f" WHERE {where}" if where else ""), params)[0]
+        lo, hi = bounds["lo"], bounds["hi"]
+
+        ph = self.placeholder
+        queries: list[tuple[str, tuple]] = []
+        if lo is not None:
+            edges = self._range_edges(lo, hi, num_partitions)
+            for i, lower in enumerate(edges[:-1]):
+                upper_op = "<=" if i == len(edges) - 2 else "<"
+                queries.append((f"SELECT {col_str} FROM {table} WHERE {filter_sql}"
+                                f"{partition_column} >= {ph} AND {partition_column} {upper_op} {ph}",
+                                tuple(params) + (lower, edges[i + 1])))
+        queries.append((f"SELECT {col_str} FROM {table} WHERE {filter_sql}{partition_column} IS NULL", tuple(params)))
+
+        def read(query: str, query_params: tuple) -> tuple[list[str], list[np.ndarray]]:
+            with self._read_connection() as conn:
+                cur = self._stream_cursor(conn)
+                cur.execute(query, query_params)
+                return self._fetch_columns(cur, chunk_size)
+
+        if getattr(self._local, "session", None) is not None:
+            pieces = [read(q, p) for q, p in queries]
+        else:
+            workers = len(queries) if self.pool is None else min(len(queries), self.pool.config.max_size)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(read, q, p) for q, p in queries]
+                pieces = [future.result() for future in futures]
+
+        with phase(self._event(), "frame"):
+            names = pieces[0][0]
+            lengths = [len(arrays[0]) if arrays else 0 for _, arrays in pieces]
+            merged = [self._concat_arrays([arrays[i] for _, arrays in pieces], sum(lengths)) for i in range(len(names))]
+            return self._frame_from_columns(names, merged, sum(lengths))
+
+    ## Apache Arrow (needs pyarrow) ##
+    @instrumented
+    def select_arrow(self, query: str, params: tuple = (), batch_size: int = 65_536) -> Any:
+        """Execute a SELECT query and return a pyarrow.Table."""
+        pa = require_pyarrow()
+        tables = [pa.Table.from_batches([batch]) for batch in self.select_arrow_batches(query, params, batch_size)]
+        # a leading all-NULL batch is typed null; permissive promotion widens it to the later type
+        return pa.concat_tables(tables, promote_options="permissive")
+
+    @instrumented
+    def select_arrow_batches(self, query: str, params: tuple = (), batch_size: int = 65_536) -> Iterator[Any]:
+        """Execute a SELECT query and yield pyarrow.RecordBatches of at most batch_size rows.
+        Columns are typed from cursor.description where the backend knows the type, else inferred.
+        An empty result yields one empty batch, so the columns are always known.
+        The connection is held until the generator is exhausted or closed.
+        """
+        require_pyarrow()
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        with self._read_connection() as conn:
+            cur = self._stream_cursor(conn)
+            try:
+                cur.execute(query, params)
+                description = cur.description or []
+                columns = [col[0] for col in description]
+                types = [arrow_type(self._type_kind(col[1])) for col in description]
+                rows = cur.fetchmany(batch_size)
+                yield record_batch(rows, columns, types)
+                while rows:
+                    rows = cur.fetchmany(batch_size)
+                    if rows:
+                        yield record_batch(rows, columns, types)
+            finally:
+                try:
+                    cur.close()
+                except Exception:
+                    pass
+
+    @instrumented
+    @invalidates
+    def insert_arrow(self, table: str, source: Any, batch_size: int = 10_000) -> dict[str, Any]:
+        """
+        Insert Arrow data through the backend's bulk path (COPY on PostgreSQL, bulk copy on SQL Server,
+        executemany elsewhere). Data is read and sent batch by batch; it never goes through pandas.
+        Args:
+            table: Target table.
+            source: pyarrow Table, RecordBatch, RecordBatchReader, or the path of a Parquet file.
+                Columns are matched to the table schema by name; others are ignored.
+            batch_size: Rows per batch/transaction. A failing batch is retried row-wise as in insert_dataframe.
+        Returns:
+            {"attempted", "succeeded", "failed", "errors": [(row_number, Exception)]} like insert_dataframe.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        pa = require_pyarrow()
+        schema = self.get_table_schema(table)
+        attempted = 0
+        succeeded = 0
+        errors: list[tuple[int, Exception]] = []
+        with self._connection() as conn:
+            for batch in iter_batches(source, batch_size):
+                columns = [col for col in schema if col in batch.schema.names]
+                first_row = attempted + 1
+                attempted += batch.num_rows
+                if not columns:
+                    error = ValueError(f"No Arrow columns match the schema of {table}")
+                    errors.extend((pos, error) for pos in range(first_row, attempted + 1))
+                    continue
+                batch = pa.RecordBatch.from_arrays([batch.column(col) for col in columns], names=columns)
+                succeeded += self._insert_arrow_batch(conn, table, columns, batch, first_row, errors)
+        errors.sort(key=lambda e: e[0])
+        return {
+            "attempted": attempted,
+            "succeeded": succeeded,
+            "failed": attempted - succeeded,
+            "errors": errors,
+        }
+
+    def _insert_arrow_batch(self, conn, table: str, columns: list[str], batch: Any, first_row: int, errors: list[tuple[int, Exception]]) -> int:
+        """Load one RecordBatch (columns already in table order). Backends override with their bulk path."""
+        pending = list(enumerate(batch_rows(batch), start=first_row))
+        return self._insert_batch(conn, self._insert_sql(table, columns), pending, errors)
+
+    ## Connection pooling ##
+    def enable_pool(self, config: PoolConfig | None = None) -> ConnectionPool:
+        """Switch this instance to pooled mode.
+        Args:
+            config: Pool settings (min/max size, timeouts). Defaults to PoolConfig().
+        Returns:
+            The ConnectionPool now used by every method of this instance.
+        """
+        if self.pool is not None:
+            self.pool.close()
+        self.pool = ConnectionPool(self.connect, config, check=self.check_connection)
+        return self.pool
+
+    def pool_stats(self) -> dict[str, Any] | None:
+        """Return pool counters, or None when the instance is not pooled."""
+        return self.pool.stats() if self.pool is not None else None
+
+    def close(self) -> None:
+        """Close the pool (if any). Safe to call more than once."""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    def check_connection(self, conn) -> None:
+        """Health check used on pool checkout. Raises if the connection is unusable."""
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT 1")
+            cur.fetchall()
+        finally:
+            cur.close()
+        conn.rollback()
+
+    ## Sessions and transactions ##
+    @contextmanager
+    def session(self) -> Iterator[Any]:
+        """Pin one connection to the calling thread for the duration of the block.
+
+        Every method called inside the block reuses that connection instead of
+        connecting (or borrowing from the pool) per call; each call still commits
+        on its own. Nested session()/transaction() blocks reuse the pinned connection.
+        """
+        current = getattr(self._local, "session", None)
+        if current is not None:
+            yield current.conn
+            return
+        with self._connection() as conn:
+            self._local.session = _Session(conn)
+            try:
+                yield conn
+            finally:
+                self._local.session = None
+
+    @contextmanager
+    def transaction(self, autocommit_every: int | None = None) -> Iterator[Any]:
+        """Run the block as one transaction on a pinned connection.
+
+        Methods called inside defer their commits: the block commits when it ends
+        and rolls back when it raises. A statement that failed inside the block
+        (execute() reports errors instead of raising) makes the block roll back
+        and raise RuntimeError at the end. A nested transaction() is a savepoint.
+
+        Args:
+            autocommit_every: Commit after every N statements/batches (long loads that
+                do not need all-or-nothing). Only applies outside nested savepoints.
+        Yields:
+            The pinned DB-API connection.
+        """
+        current = getattr(self._local, "session", None)
+        if current is not None and current.depth > 0:
+            yield from self._nested_transaction(current)
+            return
+
+        with self.session() as conn:
+            session = self._local.session
+            session.depth, session.autocommit_every, session.pending, session.error = 1, autocommit_every, 0, None
+            session.written = set()
+            self._begin(conn)
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                if session.error is not None:
+                    conn.rollback()
+                    raise RuntimeError(f"transaction rolled back: {session.error}") from session.error
+                conn.commit()
+                # results cached by other threads while the transaction was open are stale now
+                self._invalidate_written(session)
+            finally:
+                session.depth = 0
+
+    def _nested_transaction(self, session: "_Session") -> Iterator[Any]:
+        conn = session.conn
+        name = self._savepoint(conn, session)
+        error_before = session.error
+        session.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            self._rollback_savepoint(conn, name)
+            session.error = error_before
+            raise
+        else:
+            self._release_savepoint(conn, name)
+        finally:
+            session.depth -= 1
+
+    def _in_transaction_block(self) -> bool:
+        session = getattr(self._local, "session", None)
+        return session is not None and session.depth > 0
+
+    def _in_transaction(self, conn) -> "_Session | None":
+        session = getattr(self._local, "session", None)
+        if session is not None and session.depth > 0 and session.conn is conn:
+            return session
+        return None
+
+    def _commit(self, conn) -> None:
+        """Commit, unless conn belongs to an open transaction() (then the block commits)."""
+        session = self._in_transaction(conn)
+        if session is None:
+            conn.commit()
+            return
+        session.pending += 1
+        if session.autocommit_every and session.depth == 1 and session.pending >= session.autocommit_every:
+            conn.commit()
+            session.pending = 0
+            self._invalidate_written(session)
+            self._begin(conn)
+
+    def _rollback(self, conn, error: Exception | None = None) -> None:
+        """Roll back, or inside transaction() mark the transaction failed so the block rolls back."""
+        session = self._in_transaction(conn)
+        if session is None:
+            conn.rollback()
+        elif session.error is None:
+            session.error = error or RuntimeError("statement failed")
+
+    @contextmanager
+    def _atomic(self, conn) -> Iterator[None]:
+        """One unit of work that can fail on its own: its own transaction outside
+        transaction(), a savepoint inside one."""
+        session = self._in_transaction(conn)
+        if session is None:
+            try:
+                yield
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+            return
+        name = self._savepoint(conn, session)
+        try:
+            yield
+        except BaseException:
+            self._rollback_savepoint(conn, name)
+            raise
+        self._release_savepoint(conn, name)
+        self._commit(conn)
+
+    def _begin(self, conn) -> None:
+        """Start a transaction explicitly where the driver would not (DB-API drivers begin implicitly)."""
+
+    def _savepoint(self, conn, session: "_Session") -> str:
+        session.savepoints += 1
+        name = f"sp_{session.savepoints}"
+        self._run_sql(conn, f"SAVEPOINT {name}")
+        return name
+
+    def _rollback_savepoint(self, conn, name: str) -> None:
+        self._run_sql(conn, f"ROLLBACK TO SAVEPOINT {name}")
+
+    def _release_savepoint(self, conn, name: str) -> None:
+        self._run_sql(conn, f"RELEASE SAVEPOINT {name}")
+
+    @staticmethod
+    def _run_sql(conn, sql: str) -> None:
+        cur = conn.cursor()
+        try:
+            cur.execute(sql)
+        finally:
+            cur.close()
+
+    ## Result cache and instrumentation ##
+    def enable_result_cache(self, cache: ResultCache | None = None) -> ResultCache:
+        """Serve select/select_df/select_where from a ResultCache (a new default one when None).
+        Writes through this instance invalidate results reading the written tables; writes
+        made elsewhere are only picked up when the TTL runs out. Reads inside transaction()
+        bypass the cache; writes inside it invalidate when the transaction commits. Cached
+        methods take cache_ttl=seconds to override the TTL for one call.
+        """
+        self.result_cache = ResultCache() if cache is None else cache
+        return self.result_cache
+
+    def add_observer(self, observer: QueryObserver) -> QueryObserver:
+        """Report every public select/write call to observer (e.g. a MetricsAggregator) as a QueryEvent
+        with connect, pool wait, execute, fetch, DataFrame build and normalize times, rows and bytes."""
+        self.observers = [*self.observers, observer]
+        return observer
+
+    def remove_observer(self, observer: QueryObserver) -> None:
+        self.observers = [o for o in self.observers if o is not observer]
+
+    def _event(self) -> QueryEvent | None:
+        """The QueryEvent of the instrumented call running on this thread, if any."""
+        return getattr(self._local, "event", None) if self.observers else None
+
+    def _cursor(self, conn, *args, **kwargs):
+        """conn.cursor(...), timed while an instrumented call is running."""
+        return self._timed(conn.cursor(*args, **kwargs))
+
+    def _timed(self, cur):
+        event = self._event()
+        return cur if event is None else TimedCursor(cur, event)
+
+    def _select_uncached(self, query: str, params: tuple = ()) -> list[dict[str, Any]]:
+        """select() without the result cache, for internal lookups (schemas, existing hashes)."""
+        select = type(self).select
+        return getattr(select, "__wrapped__", select)(self, query, params)
+
+    def _defer_invalidation(self, tables) -> bool:
+        """Inside transaction(), record written tables for the commit and return True: until then
+        other threads still read (and may cache) the committed rows."""
+        session = getattr(self._local, "session", None)
+        if session is None or session.depth == 0:
+            return False
+        session.written.update(tables)
+        return True
+
+    def _invalidate_written(self, session: "_Session") -> None:
+        """After a commit inside transaction(): drop results for the tables written since the last one."""
+        if session.written and self.result_cache is not None:
+            self.result_cache.invalidate_tables(session.written)
+        session.written = set()
+
     ### Private helper methods ###
+    def _split_table(self, table: str) -> tuple[str, str]:
+        """Split "schema.table" into (schema, table), using default_schema when there is no prefix."""
+        if "." in table:
+            schema_name, table_name = table.split(".", 1)
+            return schema_name, table_name
+        return self.default_schema, table
+
+    def _schema_key(self, table: str) -> tuple:
+        schema_name, table_name = self._split_table(table)
+        return (self.db_type.value, f"{self.host}:{self.port}", self.database, schema_name, table_name)
+
+    def _type_kind(self, type_code: Any) -> str | None:
+        """Map a cursor.description type code to "int", "float", "bool", "datetime" or "str".
+        None means unknown; the column kind is then taken from its first non-NULL value.
+        """
+        return None
+
+    def _frame_from_cursor(self, cur) -> pd.DataFrame:
+        """Build a DataFrame column by column from an executed tuple cursor."""
+        description = cur.description or []
+        columns = [col[0] for col in description]
+        rows = cur.fetchall() if description else []
+        kinds = [self._type_kind(col[1]) for col in description]
+        return self._frame_from_rows(rows, columns, kinds)
+
+    def _frame_from_rows(self, rows: list[Sequence[Any]], columns: list[str], kinds: list[str | None] | None = None) -> pd.DataFrame:
+        """Transpose tuple rows into typed column arrays. Column names are kept even with no rows."""
+        with phase(self._event(), "frame"):
+            kinds = kinds or [None] * len(columns)
+            column_values = list(zip(*rows)) if rows else [()] * len(columns)
+            arrays = [self._column_array(values, kind) for values, kind in zip(column_values, kinds)]
+            return self._frame_from_columns(columns, arrays, len(rows))
+
+    @staticmethod
+    def _frame_from_columns(columns: list[str], arrays: list[Any], length: int) -> pd.DataFrame:
+        # integer keys first, so repeated column names survive
+        frame = pd.DataFrame(dict(enumerate(arrays)), index=pd.RangeIndex(length), copy=False)
+        frame.columns = columns
+        return frame
+
+    @staticmethod
+    def _range_edges(lo: Any, hi: Any, parts: int) -> list[Any]:
+        """parts + 1 ascending slice edges from lo to hi; fewer when the range is too narrow to split."""
+        try:
+            if isinstance(lo, (bool, str, bytes)):
+                raise TypeError
+            if isinstance(lo, int):
+                edges = [lo + (hi - lo) * i // parts for i in range(parts)]
+            else:
+                edges = [lo + (hi - lo) * i / parts for i in range(parts)]
+        except TypeError:
+            raise ValueError(f"partition column must be numeric or a date/time, not {type(lo).__name__}") from None
+        edges = sorted(set(edges))
+        return edges + [hi]
+
+    @staticmethod
+    def _concat_arrays(arrays: list[np.ndarray], length: int) -> np.ndarray:
+        """Copy per-slice arrays into one array allocated up front; mixed dtypes fall back to object."""
+        filled = [a for a in arrays if len(a)]
+        # an all-NULL slice (e.g. the partition_column IS NULL one) is untyped; it only forces NaN/None
+        all_null = [a.dtype == object and all(v is None for v in a) for a in filled]
+        nulls = any(all_null)
+        dtypes = {a.dtype for a, empty in zip(filled, all_null) if not empty}
+        if len(dtypes) > 1 and all(d.kind in "if" for d in dtypes):
+            dtype = np.dtype(np.float64)  # an int slice next to a slice with NULLs
+        else:
+            dtype = dtypes.pop() if len(dtypes) == 1 else np.dtype(object)
+        if nulls and dtype.kind in "ib":
+            dtype = np.dtype(np.float64) if dtype.kind == "i" else np.dtype(object)
+        out = np.empty(length, dtype=dtype)
+        start = 0
+        for a in filled:
+            out[start:start + len(a)] = a
+            start += len(a)
+        return out
+
+    def _fetch_columns(self, cur, chunk_size: int, expected_rows: int | None = None) -> tuple[list[str], list[np.ndarray]]:
+        """Drain an executed tuple cursor into one ColumnBuffer per column, chunk_size rows per fetchmany."""
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        description = cur.description or []
+        columns = [col[0] for col in description]
+        buffers = [ColumnBuffer(self._type_kind(col[1]), expected_rows or chunk_size) for col in description]
+        event = self._event()
+        while description:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            with phase(event, "frame"):
+                for buffer, values in zip(buffers, zip(*rows)):
+                    buffer.extend(values)
+        return columns, [buffer.finish() for buffer in buffers]
+
+    @staticmethod
+    def _column_array(values: Sequence[Any], kind: str | None) -> Any:
+        if kind is None:
+            sample = next((v for v in values if v is not None), None)
+            kind = {bool: "bool", int: "int", float: "float", datetime: "datetime"}.get(type(sample))
+        try:
+            if kind == "int":
+                # NULLs force float64 with NaN, as pandas does when inferring from rows
+                dtype = np.float64 if None in values else np.int64
+                return np.array(values, dtype=dtype)
+            if kind == "float":
+                return np.array(values, dtype=np.float64)
+            if kind == "bool" and None not in values:
+                return np.array(values, dtype=bool)
+            if kind == "datetime":
+                return pd.to_datetime(np.array(values, dtype=object))
+        except (TypeError, ValueError, OverflowError):
+            pass
+        # fromiter keeps sequence values (e.g. PostgreSQL arrays) as single objects
+        return np.fromiter(values, dtype=object, count=len(values))
+
+    def _stream_cursor(self, conn):
+        """Cursor used by the streaming selects. Backends override to get server-side/unbuffered cursors."""
+        return self._cursor(conn)
+
+    def _fetch_batches(self, query: str, params: tuple, batch_size: int) -> Iterator[tuple[list[str], list[Any]]]:
+        """Yield (column_names, rows) per fetchmany round trip, holding one connection throughout."""
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        with self._read_connection() as conn:
+            cur = self._stream_cursor(conn)
+            try:
+                cur.execute(query, params)
+                columns = [col[0] for col in cur.description] if cur.description else []
+                while True:
+                    batch = cur.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    yield columns, batch
+            finally:
+                try:
+                    cur.close()
+                except Exception:
+                    # closing a cursor with unread rows fails on some drivers when the caller stops early;
+                    # the connection is closed or reset right after, which discards the rest
+                    pass
+    @contextmanager
+    def _connection(self) -> Iterator[Any]:
+        """Use the connection pinned by session()/transaction(), else borrow one from the
+        pool, or open a fresh one when not pooled."""
+        session = getattr(self._local, "session", None)
+        if session is not None:
+            yield session.conn
+            return
+        event = self._event()
+        if self.pool is not None:
+            started = time.perf_counter()
+            with self.pool.connection() as conn:
+                if event is not None:
+                    event.pool_wait_seconds += time.perf_counter() - started
+                yield conn
+            return
+        with phase(event, "connect"):
+            conn = self.connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _read_connection(self):
+        """Connection for read-only queries. Backends with a separate reader pool override this."""
+        return self._connection()
+
+    def _insert_sql(self, table: str, columns: Sequence[str]) -> str:
+        def build() -> str:
+            placeholders = ", ".join([self.placeholder] * len(columns))
+            return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+        return self.statement_cache.get_or_build(("insert", table, tuple(columns)), build)
+
+    def _update_sql(self, table: str, columns: Sequence[str], where: str) -> str:
+        def build() -> str:
+            set_clause = ", ".join([f"{col} = {self.placeholder}" for col in columns])
+            return f"UPDATE {table} SET {set_clause} WHERE {where}"
+        return self.statement_cache.get_or_build(("update", table, tuple(columns), where), build)
+
+    def _delete_sql(self, table: str, where: str) -> str:
+        return self.statement_cache.get_or_build(("delete", table, where), lambda: f"DELETE FROM {table} WHERE {where}")
+
+    def _execute_statement(self, query: str, params: tuple) -> Any:
+        """Run a cached INSERT/UPDATE/DELETE. Backends that can prepare statements override this."""
+        return self.execute(query, params)
+
+    def _reuses_connections(self) -> bool:
+        """True when statements run on long-lived connections (pool or pinned session), where preparing pays off."""
+        return self.pool is not None or getattr(self._local, "session", None) is not None
+
+    def _insert_many(self, cur, query: str, rows: list[tuple]) -> None:
+        """Send a batch of rows for one INSERT statement. Backends may override."""
+        cur.executemany(query, rows)
+
+    def _insert_batch(self, conn, query: str, batch: list[tuple[int, tuple]], errors: list[tuple[int, Exception]]) -> int:
+        """Insert a batch in one transaction (savepoint inside transaction()); bisect on failure. Returns rows inserted."""
+        try:
+            with self._atomic(conn):
+                cur = self._cursor(conn)
+                try:
+                    self._insert_many(cur, query, [row for _, row in batch])
+                finally:
+                    cur.close()
+            return len(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                errors.append((batch[0][0], e))
+                return 0
+        middle = len(batch) // 2
+        return (self._insert_batch(conn, query, batch[:middle], errors)
+                + self._insert_batch(conn, query, batch[middle:], errors))
+
+    def _normalize_frame(self, df: pd.DataFrame, columns: list[str], schema: dict[str, str], first_row: int = 1) -> tuple[list[tuple], list[tuple[int, Exception]]]:
+        """Normalize df[columns] with the compiled normalizer for schema. Returns (rows, [(row_number, error)])."""
+        with phase(self._event(), "normalize"):
+            return compile_normalizer(schema).normalize_frame(df, columns, first_row)
+
     def __enter__(self):
-        """Optional: for use in `with` statements."""
-        self.conn = self.connect()
+        """Optional: for use in `with` statements. Pins one connection (see session()) for the block."""
+        self._enter_session = self.session()
+        self.conn = self._enter_session.__enter__()
         return self
     def __exit__(self, exc_type, exc_value, traceback):
-        """Ensure connection is closed."""
-        if hasattr(self, "conn") and self.conn:
-            self.conn.close()
+        """Release the connection pinned by __enter__. A pool stays open; close() shuts it down."""
+        session, self._enter_session = getattr(self, "_enter_session", None), None
+        if session is not None:
+            session.__exit__(exc_type, exc_value, traceback)
+        self.conn = None
     ## Utility methods ##
     def normalize_value(self, value: Any, pg_type: str) -> Any:
-        if value is None:
-            return None
-
-        # pandas NaN → SQL NULL
-        if isinstance(value, float) and math.isnan(value):
-            return None
-
-        t = pg_type.lower()
-
-        if "timestamp" in t:
-            if isinstance(value, (int, str)):
-                s = str(value)
-                if len(s) == 10 and s.isdigit():  # YYMMDDHHMM
-                    return datetime(
-                        2000 + int(s[:2]),
-                        int(s[2:4]),
-                        int(s[4:6]),
-                        int(s[6:8]),
-                        int(s[8:10]),
-                    )
-            if isinstance(value, datetime):
-                return value
-
-        if t == "date":
-            if isinstance(value, str) and len(value) == 6:
-                return date(
-                    2000 + int(value[4:6]),
-                    int(value[2:4]),
-                    int(value[0:2]),
-                )
-
-        if "int" in t:
-            return int(value)
-
-        if "double" in t or "numeric" in t:
-            if isinstance(value, str) and value.strip() == "":
-                return float('0')
-            return float(value)
-
-        # varchar / text / default
-        return str(value)    
+        """Convert one value to pg_type (see Database.src.normalizer for the rules)."""
+        return scalar_converter(pg_type)(value)
 
     def parse_timeofcreation(self,v) -> datetime | None:
         if v is None:
@@ -143,194 +901,611 @@ class DBBase(ABC):
         # Expect YYMMDDHHMM (10 digits)
         # e.g. 2512090506 -> 2025-12-09 05:06
         if len(s) == 10 and s.isdigit():
-            yy = int(s[0:2])
-            year = 2000 + yy
-            month = int(s[2:4])
-            day = int(s[4:6])
-            hour = int(s[6:8])
-            minute = int(s[8:10])
-            return datetime(year, month, day, hour, minute)
+            return parse_yymmddhhmm(s)
 
         raise ValueError(f"Unsupported TimeOfCreation format: {v!r}")
 
-    def insert_dataframe(self, table: str, df: pd.DataFrame) -> dict[str, Any]:
+    def normalize_column(self, values: pd.Series, pg_type: str) -> list[Any]:
+        """Vectorized normalize_value for a whole column.
+        Returns plain Python values ready for the driver; raises if any cell cannot be converted.
+        """
+        return column_converter(pg_type)(values)
+
+    @instrumented
+    @invalidates
+    def insert_dataframe(self, table: str, df: pd.DataFrame, batch_size: int | str = 1000, workers: int = 1, atomic: bool = False) -> dict[str, Any]:
+        """Insert all rows of a DataFrame into the given table.
+
+        Columns are normalized to the table schema one column at a time and sent
+        with executemany in batches of `batch_size`, one transaction per batch.
+        A failing batch is bisected until the offending rows are isolated, so the
+        report still lists every failed row.
+
+        With workers > 1 the rows are split into contiguous partitions that are
+        loaded concurrently, each on its own (pooled) connection.
+
+        Args:
+            table: Target table.
+            df: Rows to insert; columns not in the table schema are ignored.
+            batch_size: Rows per batch/transaction, or "auto" to let an AdaptiveBatcher pick it:
+                it starts from a size that fits the backend's limits for this column count,
+                follows the measured rows/sec per batch and backs off on packet-size or
+                parameter-limit errors (atomic loads keep the starting size).
+            workers: Number of partitions loaded in parallel (capped by the pool's max_size).
+            atomic: All or nothing. Every partition writes inside one open transaction and
+                all of them are committed only when every partition succeeded; otherwise all
+                are rolled back. Failed batches are reported by their first row number.
+        Returns:
+            {"attempted", "succeeded", "failed", "errors": [(row_number, Exception)]}
+            where row_number is the 1-based position of the row in df.
+            With batch_size="auto" also "batch_size": the size the batcher settled on.
+        """
+        adaptive = batch_size == "auto"
+        if not adaptive and (not isinstance(batch_size, int) or batch_size < 1):
+            raise ValueError("batch_size must be at least 1 or \"auto\"")
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
 
         schema = self.get_table_schema(table)
-        attempted = 0
-        succeeded = 0
+        columns = [col for col in schema if col in df.columns]
+        attempted = len(df)
         errors: list[tuple[int, Exception]] = []
-        idx=1
-        for _, row in df.iterrows():
-            attempted += 1
-            raw = row.to_dict()
-            cleaned = {}
-
-            for col, col_type in schema.items():
-                if col in raw:
-                    cleaned_value = self.normalize_value(raw[col], col_type)
-                    cleaned[col] = cleaned_value
-
-            insert_result = self.insert(table, cleaned)
-            if insert_result.get("success"):
-                succeeded += 1
-            else:
-                errors.append((idx, Exception(insert_result.get("error"))))
-            idx +=1
 
-        failed = attempted - succeeded
+        if attempted == 0:
+            return {"attempted": 0, "succeeded": 0, "failed": 0, "errors": []}
+        if not columns:
+            error = ValueError(f"No DataFrame columns match the schema of {table}")
+            errors = [(pos + 1, error) for pos in range(attempted)]
+            return {"attempted": attempted, "succeeded": 0, "failed": attempted, "errors": errors}
+
+        rows, bad_rows = self._normalize_frame(df, columns, schema)
+        errors.extend(bad_rows)
+        if atomic and bad_rows:
+            return {"attempted": attempted, "succeeded": 0, "failed": attempted, "errors": errors}
+        failed_positions = {pos for pos, _ in bad_rows}
+        pending = [(pos, row) for pos, row in enumerate(rows, start=1) if pos not in failed_positions]
+
+        query = self._insert_sql(table, columns)
+        if adaptive:
+            batch_size = self._adaptive_batcher(len(columns), [row for _, row in pending[:100]])
+        succeeded = self._load_rows(query, pending, batch_size, workers, atomic, errors)
+
+        errors.sort(key=lambda e: e[0])
         result = {
             "attempted": attempted,
             "succeeded": succeeded,
-            "failed": failed,
+            "failed": attempted - succeeded,
             "errors": errors,
         }
+        if adaptive:
+            result["batch_size"] = batch_size.settled
         return result
 
-    # def get_existing_hashes(self, table: str, hashes: list[str]) -> set[str]:
-    #     if not hashes:
-    #         return set()
-
-
-    #     # chunk to avoid too many parameters
-    #     out: set[str] = set()
-    #     chunk_size = 500
-    #     for i in range(0, len(hashes), chunk_size):
-    #         chunk = hashes[i:i+chunk_size]
-
-    #         placeholders = ",".join(["%s"] * len(chunk))  # change to "?" or ":p1" based on your driver
-    #         sql = f"SELECT row_hash FROM {table} WHERE row_hash IN ({placeholders})"
-
-    #         rows = self.select(sql, chunk)  # you need a method that returns rows
-    #         out.update(r["row_hash"] if isinstance(r, dict) else r[0] for r in rows)
-
-    #     return out
-    
-
-
-
-
-
-    # def _stable_row_hash(self, values: list[Any]) -> str:
-    #     parts = []
-    #     for v in values:
-    #         if v is None or (isinstance(v, float) and pd.isna(v)):
-    #             parts.append("<NULL>")
-    #         else:
-    #             parts.append(str(v))
-    #     return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
-
-
-    # def _df_with_hash(
-    #     self,
-    #     table: str,
-    #     df: pd.DataFrame,
-    #     exclude_columns: list[str] | None = None,
-    #     keep_non_schema_columns: bool = False,
-    # ) -> pd.DataFrame:
-        
-    #     if "row_hash" not in exclude_columns:
-    #         exclude_columns.append("row_hash")
-        
-        
-    #     schema = self.get_table_schema(table)
-    #     exclude_columns = exclude_columns or []
-
-    #     schema_cols = list(schema.keys())              # all cols we want in output
-    #     hash_cols = [c for c in schema_cols if c not in exclude_columns]  # cols used for hash
-
-    #     # Normalize into ALL schema columns (even excluded ones)
-    #     normalized_rows = []
-    #     for _, row in df.iterrows():
-    #         raw = row.to_dict()
-    #         cleaned = {}
-    #         for col, col_type in schema.items():
-    #             cleaned[col] = self.normalize_value(raw.get(col), col_type)
-    #         normalized_rows.append(cleaned)
-
-    #     cleaned_df = pd.DataFrame(normalized_rows, columns=schema_cols)
-
-    #     # Optionally keep extra columns from original df (not in schema)
-    #     if keep_non_schema_columns:
-    #         extra_cols = [c for c in df.columns if c not in cleaned_df.columns]
-    #         if extra_cols:
-    #             cleaned_df = pd.concat([cleaned_df, df[extra_cols].reset_index(drop=True)], axis=1)
-
-    #     # Hash uses ONLY hash_cols, but excluded cols still remain in cleaned_df
-    #     try:
-    #         # Hash uses ONLY hash_cols, but excluded cols still remain in cleaned_df
-    #         cleaned_df["row_hash"] = cleaned_df.apply(
-    #             lambda r: self._stable_row_hash([r[c] for c in hash_cols]),
-    #             axis=1,
-    #         )
-    #     except Exception as e:
-    #         print(f"Error hashing rows: {e}")
-    #         print(cleaned_df)
-    #         print(hash_cols)
-    #         raise e
-
-    #     return cleaned_df
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-#     def insert_dataframe(
-#         self,
-#         table: str,
-#         df: pd.DataFrame,
-#         raise_on_error: bool = True,
-#     ) -> dict[str, Any]:
-#         """
-#         Insert all rows from a pandas DataFrame into the given table.
-
-#         Returns a dict with attempted/succeeded/failed and errors.
-#         """
-#         if not isinstance(df, pd.DataFrame):
-#             raise TypeError(f"insert_dataframe expects a pandas DataFrame, got {type(df)}")
-
-#         attempted = 0
-#         succeeded = 0
-#         errors: list[tuple[int, Exception]] = []
-
-#         for idx, row in df.iterrows():
-#             attempted += 1
-#             row_dict = row.to_dict()
-
-#             # print(f"[DEBUG] Inserting row {idx}: {row_dict}")  # debug
+    def _load_rows(self, query: str, pending: list[tuple[int, tuple]], batch_size: "int | AdaptiveBatcher", workers: int, atomic: bool, errors: list[tuple[int, Exception]]) -> int:
+        """Insert (row_number, row) pairs as insert_dataframe does. Returns rows inserted; failures go to errors."""
+        if not pending:
+            return 0
+        if (atomic and not self.concurrent_writers) or getattr(self._local, "session", None) is not None:
+            # a pinned connection cannot be shared between worker threads
+            workers = 1
+        if self.pool is not None:
+            workers = min(workers, self.pool.config.max_size)
+        partitions = self._partition(pending, workers)
+
+        if atomic:
+            size = batch_size.size if isinstance(batch_size, AdaptiveBatcher) else batch_size
+            return self._insert_atomic(query, partitions, size, errors)
+        if len(partitions) == 1:
+            succeeded, partition_errors = self._insert_partition(query, partitions[0], batch_size)
+            errors.extend(partition_errors)
+            return succeeded
+        succeeded = 0
+        with ThreadPoolExecutor(max_workers=len(partitions)) as executor:
+            futures = [executor.submit(self._insert_partition, query, part, batch_size) for part in partitions]
+            for future in futures:
+                ok, partition_errors = future.result()
+                succeeded += ok
+                errors.extend(partition_errors)
+        return succeeded
+
+    def _partition(self, pending: list[tuple[int, tuple]], parts: int) -> list[list[tuple[int, tuple]]]:
+        """Split rows into at most `parts` contiguous, non-empty partitions of near equal size."""
+        parts = max(1, min(parts, len(pending)))
+        size, extra = divmod(len(pending), parts)
+        out, start = [], 0
+        for i in range(parts):
+            end = start + size + (1 if i < extra else 0)
+            out.append(pending[start:end])
+            start = end
+        return out
+
+    def _insert_partition(self, query: str, partition: list[tuple[int, tuple]], batch_size: "int | AdaptiveBatcher") -> tuple[int, list[tuple[int, Exception]]]:
+        """Load one partition on its own connection, one transaction per batch."""
+        errors: list[tuple[int, Exception]] = []
+        succeeded = 0
+        with self._connection() as conn:
+            if isinstance(batch_size, AdaptiveBatcher):
+                succeeded = self._insert_adaptive(conn, query, partition, batch_size, errors)
+            else:
+                for start in range(0, len(partition), batch_size):
+                    succeeded += self._insert_batch(conn, query, partition[start:start + batch_size], errors)
+        return succeeded, errors
 
-#             # this calls your DB-specific insert()
-#             insert_result = self.insert(table, row_dict)
-#             if insert_result.get("success"):
-#                 succeeded += 1
-#             else:
-#                 errors.append((idx, Exception(insert_result.get("error"))))
-# #                raise Exception(insert_result.get("error"))
+    def _insert_adaptive(self, conn, query: str, partition: list[tuple[int, tuple]], batcher: AdaptiveBatcher, errors: list[tuple[int, Exception]]) -> int:
+        """Like the fixed-size loop of _insert_partition, with the size taken from batcher before every batch."""
+        succeeded = 0
+        start = 0
+        while start < len(partition):
+            batch = partition[start:start + batcher.size]
+            started = time.perf_counter()
+            try:
+                with self._atomic(conn):
+                    cur = self._cursor(conn)
+                    try:
+                        self._insert_many(cur, query, [row for _, row in batch])
+                    finally:
+                        cur.close()
+            except Exception as e:
+                if len(batch) > 1 and self._is_batch_limit_error(e):
+                    # retry the same rows with the smaller size
+                    batcher.back_off(len(batch))
+                    continue
+                if len(batch) == 1:
+                    errors.append((batch[0][0], e))
+                else:
+                    # a bad row: bisect as _insert_batch does
+                    middle = len(batch) // 2
+                    succeeded += (self._insert_batch(conn, query, batch[:middle], errors)
+                                  + self._insert_batch(conn, query, batch[middle:], errors))
+            else:
+                succeeded += len(batch)
+                batcher.record(len(batch), time.perf_counter() - started)
+            start += len(batch)
+        return succeeded
+
+    def _adaptive_batcher(self, width: int, sample: list[tuple]) -> AdaptiveBatcher:
+        limit = self._batch_size_limit(width, sample)
+        return AdaptiveBatcher(self._initial_batch_size(width), maximum=limit or 100_000)
+
+    def _initial_batch_size(self, width: int) -> int:
+        """A first batch that fits the backend's per-statement limits for `width` columns."""
+        return self._rows_per_statement(width, 1000)
+
+    def _batch_size_limit(self, width: int, sample: list[tuple]) -> int | None:
+        """Largest batch the backend accepts for rows like `sample`, if it has a known limit."""
+        return None
+
+    def _is_batch_limit_error(self, error: Exception) -> bool:
+        """Whether the driver rejected a batch for its size (packet, parameter count) rather than a bad row."""
+        return is_batch_limit_error(error)
+
+    def _write_partition(self, conn, query: str, partition: list[tuple[int, tuple]], batch_size: int) -> tuple[int, Exception] | None:
+        """Write a partition without committing. Returns (first row of the failed batch, error) or None."""
+        for start in range(0, len(partition), batch_size):
+            batch = partition[start:start + batch_size]
+            try:
+                cur = self._cursor(conn)
+                try:
+                    self._insert_many(cur, query, [row for _, row in batch])
+                finally:
+                    cur.close()
+            except Exception as e:
+                return batch[0][0], e
+        return None
+
+    def _insert_atomic(self, query: str, partitions: list[list[tuple[int, tuple]]], batch_size: int, errors: list[tuple[int, Exception]]) -> int:
+        """Write every partition in its own open transaction; commit all or roll back all."""
+        with ExitStack() as stack:
+            conns = [stack.enter_context(self._connection()) for _ in partitions]
+            if len(partitions) == 1:
+                failures = [self._write_partition(conns[0], query, partitions[0], batch_size)]
+            else:
+                with ThreadPoolExecutor(max_workers=len(partitions)) as executor:
+                    futures = [executor.submit(self._write_partition, conn, query, part, batch_size)
+                               for conn, part in zip(conns, partitions)]
+                    failures = [future.result() for future in futures]
+            failures = [f for f in failures if f is not None]
+            if failures:
+                errors.extend(failures)
+                for conn in conns:
+                    self._rollback(conn, failures[0][1])
+                return 0
+            # coordinated, not two-phase: a commit failing after others succeeded is reported, not undone
+            committed = 0
+            for conn, part in zip(conns, partitions):
+                try:
+                    self._commit(conn)
+                    committed += len(part)
+                except Exception as e:
+                    errors.append((part[0][0], e))
+            return committed
+
+    def _bulk_insert(self, table: str, df: pd.DataFrame, chunk_size: int) -> dict[str, Any]:
+        """Fastest non-atomic load of a frame, used by copy_table. Backends override with COPY/bulk copy."""
+        return self.insert_dataframe(table, df, batch_size=chunk_size)
+
+    ## Upsert ##
+    @instrumented
+    @invalidates
+    def upsert_dataframe(
+        self,
+        table: str,
+        df: pd.DataFrame,
+        key_columns: Sequence[str],
+        update_columns: Sequence[str] | None = None,
+        batch_size: int = 1000,
+    ) -> dict[str, Any]:
+        """Insert new rows and update existing ones (matched on key_columns) with bulk statements.
+
+        Each batch is one backend-native statement (ON CONFLICT, MERGE or ON DUPLICATE KEY)
+        in its own transaction, sized to the driver's parameter limit. Failing batches are
+        bisected like in insert_dataframe. When several rows share a key the last one wins
+        and the earlier ones count as skipped, as do existing rows when update_columns is empty.
 
-#         failed = attempted - succeeded
-#         result = {
-#             "attempted": attempted,
-#             "succeeded": succeeded,
-#             "failed": failed,
-#             "errors": errors,
-#         }
-#         # print("[DEBUG] insert_dataframe result:", result)
-        
-#         return result
+        Args:
+            table: Target table; key_columns must be a primary key or unique constraint.
+            df: Rows to upsert; columns not in the table schema are ignored.
+            key_columns: Columns identifying a row.
+            update_columns: Columns overwritten on a match. Defaults to every non-key column;
+                an empty list leaves existing rows untouched.
+            batch_size: Upper bound on rows per statement.
+        Returns:
+            {"attempted", "succeeded", "inserted", "updated", "skipped", "failed", "errors": [(row_number, Exception)]}
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        schema = self.get_table_schema(table)
+        columns = [col for col in schema if col in df.columns]
+        missing = [col for col in key_columns if col not in columns]
+        if missing:
+            raise ValueError(f"key columns {missing} are not in both the DataFrame and {table}")
+        if update_columns is None:
+            update_columns = [col for col in columns if col not in key_columns]
+        else:
+            unknown = [col for col in update_columns if col not in columns]
+            if unknown:
+                raise ValueError(f"update columns {unknown} are not in both the DataFrame and {table}")
+
+        attempted = len(df)
+        report = {"attempted": attempted, "succeeded": 0, "inserted": 0, "updated": 0, "skipped": 0, "failed": 0, "errors": []}
+        if attempted == 0:
+            return report
+
+        rows, errors = self._normalize_frame(df, columns, schema)
+        failed_positions = {pos for pos, _ in errors}
+        key_index = [columns.index(col) for col in key_columns]
+        latest: dict[tuple, tuple[int, tuple]] = {}
+        for pos, row in enumerate(rows, start=1):
+            if pos not in failed_positions:
+                latest[tuple(row[i] for i in key_index)] = (pos, row)
+        pending = sorted(latest.values(), key=lambda item: item[0])
+
+        per_statement = self._rows_per_statement(len(columns), batch_size)
+        inserted = updated = 0
+        with self._connection() as conn:
+            for start in range(0, len(pending), per_statement):
+                ins, upd = self._upsert_rows(conn, table, columns, key_columns, update_columns, pending[start:start + per_statement], errors)
+                inserted += ins
+                updated += upd
+
+        errors.sort(key=lambda e: e[0])
+        failed = len({pos for pos, _ in errors})
+        report.update({
+            "succeeded": inserted + updated,
+            "inserted": inserted,
+            "updated": updated,
+            "skipped": attempted - failed - inserted - updated,
+            "failed": failed,
+            "errors": errors,
+        })
+        return report
+
+    def _upsert_rows(self, conn, table: str, columns: list[str], key_columns: Sequence[str], update_columns: Sequence[str],
+                     batch: list[tuple[int, tuple]], errors: list[tuple[int, Exception]]) -> tuple[int, int]:
+        """Upsert a batch in one transaction (savepoint inside transaction()); bisect on failure. Returns (inserted, updated)."""
+        try:
+            with self._atomic(conn):
+                cur = self._cursor(conn)
+                try:
+                    counts = self._upsert_batch(cur, table, columns, key_columns, update_columns, [row for _, row in batch])
+                finally:
+                    cur.close()
+            return counts
+        except Exception as e:
+            if len(batch) == 1:
+                errors.append((batch[0][0], e))
+                return 0, 0
+        middle = len(batch) // 2
+        first = self._upsert_rows(conn, table, columns, key_columns, update_columns, batch[:middle], errors)
+        second = self._upsert_rows(conn, table, columns, key_columns, update_columns, batch[middle:], errors)
+        return first[0] + second[0], first[1] + second[1]
+
+    def _upsert_batch(self, cur, table: str, columns: list[str], key_columns: Sequence[str], update_columns: Sequence[str], rows: list[tuple]) -> tuple[int, int]:
+        """Run one upsert statement for rows (unique keys). Returns (inserted, updated).
+        Default: count the keys that already exist, then run _upsert_sql.
+        """
+        key_index = [columns.index(col) for col in key_columns]
+        keys = [tuple(row[i] for i in key_index) for row in rows]
+        cur.execute(f"SELECT COUNT(*) FROM {table} WHERE {self._key_predicate(key_columns, len(keys))}",
+                    tuple(v for key in keys for v in key))
+        existing = cur.fetchone()[0]
+        cur.execute(self._upsert_sql(table, columns, key_columns, update_columns, len(rows)), tuple(v for row in rows for v in row))
+        return len(rows) - existing, existing if update_columns else 0
+
+    def _upsert_sql(self, table: str, columns: Sequence[str], key_columns: Sequence[str], update_columns: Sequence[str], n_rows: int) -> str:
+        raise NotImplementedError(f"{type(self).__name__} does not support upsert_dataframe")
+
+    def _rows_per_statement(self, width: int, batch_size: int) -> int:
+        """Rows of `width` parameters that fit one multi-row VALUES statement."""
+        return max(1, min(batch_size, self.max_params // max(width, 1), self.max_rows_per_statement or batch_size))
+
+    def _values_sql(self, width: int, n_rows: int) -> str:
+        """ "(?, ?), (?, ?)" for n_rows rows of width parameters."""
+        row = f"({', '.join([self.placeholder] * width)})"
+        return ", ".join([row] * n_rows)
+
+    def _key_predicate(self, key_columns: Sequence[str], n_keys: int) -> str:
+        """WHERE clause matching n_keys keys: an IN list for one column, OR-ed ANDs for composite keys."""
+        if len(key_columns) == 1:
+            return f"{key_columns[0]} IN ({', '.join([self.placeholder] * n_keys)})"
+        one = "(" + " AND ".join(f"{col} = {self.placeholder}" for col in key_columns) + ")"
+        return " OR ".join([one] * n_keys)
+
+    ## Bulk update / delete ##
+    @instrumented
+    @invalidates
+    def update_many(
+        self,
+        table: str,
+        rows: pd.DataFrame | Sequence[dict[str, Any]],
+        key_columns: Sequence[str],
+        update_columns: Sequence[str] | None = None,
+        batch_size: int = 1000,
+    ) -> int:
+        """Update many rows, matched on key_columns, in one transaction.
+
+        Each batch is a single UPDATE joined against a VALUES list (see _update_many_sql),
+        sized to the driver's parameter limit; backends without one use executemany.
+        Keys should be unique within rows.
 
+        Args:
+            table: Target table.
+            rows: DataFrame or list of dicts holding the key and update columns.
+            key_columns: Columns identifying the row to update.
+            update_columns: Columns to set. Defaults to every non-key column of rows that is in the table.
+            batch_size: Upper bound on rows per statement.
+        Returns:
+            Total rows affected (MySQL counts changed rows only).
+        Raises:
+            ValueError: unknown columns, or a value that cannot be converted to its column type.
+        """
+        df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+        schema = self.get_table_schema(table)
+        columns = [col for col in schema if col in df.columns]
+        missing = [col for col in key_columns if col not in columns]
+        if missing:
+            raise ValueError(f"key columns {missing} are not in both the rows and {table}")
+        if update_columns is None:
+            update_columns = [col for col in columns if col not in key_columns]
+        unknown = [col for col in update_columns if col not in columns]
+        if unknown:
+            raise ValueError(f"update columns {unknown} are not in both the rows and {table}")
+        if df.empty or not update_columns:
+            return 0
+
+        ordered = list(key_columns) + list(update_columns)
+        values = self._normalized_rows(table, df, ordered, schema)
+        per_statement = self._rows_per_statement(len(ordered), batch_size)
+        n_keys = len(key_columns)
+        affected = 0
+        with self.transaction() as conn:
+            cur = self._cursor(conn)
+            try:
+                for start in range(0, len(values), per_statement):
+                    chunk = values[start:start + per_statement]
+                    query = self._update_many_sql(table, key_columns, update_columns, len(chunk), schema)
+                    if query is None:
+                        set_clause = ", ".join(f"{col} = {self.placeholder}" for col in update_columns)
+                        where = " AND ".join(f"{col} = {self.placeholder}" for col in key_columns)
+                        cur.executemany(f"UPDATE {table} SET {set_clause} WHERE {where}",
+                                        [row[n_keys:] + row[:n_keys] for row in chunk])
+                    else:
+                        cur.execute(query, tuple(v for row in chunk for v in row))
+                    affected += max(cur.rowcount, 0)
+            finally:
+                cur.close()
+        return affected
+
+    @instrumented
+    @invalidates
+    def delete_many(
+        self,
+        table: str,
+        keys: pd.DataFrame | Sequence[Any],
+        key_columns: str | Sequence[str] | None = None,
+    ) -> int:
+        """Delete the rows matching any of `keys`, in one transaction.
+
+        Keys are sent as IN lists (one key column) or OR-ed AND groups (composite keys),
+        chunked to the driver's parameter limit.
 
+        Args:
+            table: Target table.
+            keys: DataFrame of key columns, or a list of scalars (one key column) or tuples.
+            key_columns: Key column name(s). Defaults to the DataFrame's columns.
+        Returns:
+            Total rows affected.
+        """
+        if isinstance(keys, pd.DataFrame):
+            key_columns = list(keys.columns) if key_columns is None else key_columns
+        if key_columns is None:
+            raise ValueError("key_columns is required unless keys is a DataFrame")
+        key_columns = [key_columns] if isinstance(key_columns, str) else list(key_columns)
+        if isinstance(keys, pd.DataFrame):
+            frame = keys[key_columns]
+        else:
+            frame = pd.DataFrame([k if isinstance(k, (tuple, list)) else (k,) for k in keys], columns=key_columns)
+        if frame.empty:
+            return 0
 
+        schema = self.get_table_schema(table)
+        missing = [col for col in key_columns if col not in schema]
+        if missing:
+            raise ValueError(f"key columns {missing} are not in {table}")
+        key_rows = list(dict.fromkeys(self._normalized_rows(table, frame, key_columns, schema)))
+        per_statement = max(1, self.max_params // len(key_columns))
+        affected = 0
+        with self.transaction() as conn:
+            cur = self._cursor(conn)
+            try:
+                for start in range(0, len(key_rows), per_statement):
+                    chunk = key_rows[start:start + per_statement]
+                    cur.execute(f"DELETE FROM {table} WHERE {self._key_predicate(key_columns, len(chunk))}",
+                                tuple(v for key in chunk for v in key))
+                    affected += max(cur.rowcount, 0)
+            finally:
+                cur.close()
+        return affected
+
+    def _normalized_rows(self, table: str, df: pd.DataFrame, columns: list[str], schema: dict[str, str]) -> list[tuple]:
+        """Normalize df[columns]; all or nothing, so the first bad value raises."""
+        rows, errors = self._normalize_frame(df, columns, schema)
+        if errors:
+            pos, error = errors[0]
+            raise ValueError(f"row {pos} cannot be written to {table}: {error}") from error
+        return rows
+
+    def _update_many_sql(self, table: str, key_columns: Sequence[str], update_columns: Sequence[str], n_rows: int, schema: dict[str, str]) -> str | None:
+        """UPDATE joined against n_rows VALUES rows of (key_columns + update_columns).
+        None makes update_many fall back to executemany of a single-row UPDATE."""
+        return None
+
+    ## Row hash dedup ##
+    @instrumented
+    def get_existing_hashes(self, table: str, hashes: Sequence[str], hash_column: str = "row_hash", chunk_size: int = 500) -> set[str]:
+        """Return the subset of `hashes` already stored in table.hash_column.
+        Looked up with IN lists of chunk_size parameters to stay under driver parameter limits.
+        """
+        if not hashes:
+            return set()
+
+        out: set[str] = set()
+        for i in range(0, len(hashes), chunk_size):
+            chunk = list(hashes[i:i + chunk_size])
+            placeholders = ",".join([self.placeholder] * len(chunk))
+            sql = f"SELECT {hash_column} FROM {table} WHERE {hash_column} IN ({placeholders})"
+            rows = self._select_uncached(sql, tuple(chunk))
+            out.update(r[hash_column] if isinstance(r, dict) else r[0] for r in rows)
+        return out
+
+    def _stable_row_hash(self, values: list[Any]) -> str:
+        return stable_row_hash(values)
+
+    def _df_with_hash(
+        self,
+        table: str,
+        df: pd.DataFrame,
+        exclude_columns: list[str] | None = None,
+        keep_non_schema_columns: bool = False,
+        hash_column: str = "row_hash",
+    ) -> pd.DataFrame:
+        """Normalize df into every schema column and add hash_column.
+        The hash covers the schema columns except hash_column and exclude_columns;
+        columns missing from df count as NULL.
+        """
+        schema = self.get_table_schema(table)
+        exclude = set(exclude_columns or []) | {hash_column}
+        schema_cols = [c for c in schema if c != hash_column]
+        hash_cols = [c for c in schema_cols if c not in exclude]
+
+        rows, errors = self._normalize_frame(df.reindex(columns=schema_cols), schema_cols, schema)
+        if errors:
+            raise errors[0][1]
+        cleaned_df = pd.DataFrame.from_records(rows, columns=schema_cols, nrows=len(df)) if rows else pd.DataFrame(columns=schema_cols)
+        cleaned_df[hash_column] = row_hashes([cleaned_df[c].tolist() for c in hash_cols], len(cleaned_df))
+
+        # Optionally keep extra columns from original df (not in schema)
+        if keep_non_schema_columns:
+            extra_cols = [c for c in df.columns if c not in cleaned_df.columns]
+            if extra_cols:
+                cleaned_df = pd.concat([cleaned_df, df[extra_cols].reset_index(drop=True)], axis=1)
+        return cleaned_df
+
+    @instrumented
+    @invalidates
+    def insert_dataframe_dedup(
+        self,
+        table: str,
+        df: pd.DataFrame,
+        hash_column: str = "row_hash",
+        exclude_columns: list[str] | None = None,
+        batch_size: int = 1000,
+        hash_cache: RowHashCache | None = None,
+        workers: int = 1,
+    ) -> dict[str, Any]:
+        """Insert only the rows of df whose row hash is not in the table yet.
+
+        Rows are normalized and hashed column-wise. Duplicates within df, hashes
+        known to hash_cache and hashes found by get_existing_hashes are skipped;
+        the rest are inserted like insert_dataframe, with hash_column filled in.
 
+        Args:
+            table: Target table; must have hash_column.
+            df: Rows to load; columns not in the table schema are ignored.
+            hash_column: Column holding the row hash.
+            exclude_columns: Columns left out of the hash (e.g. load timestamps).
+            batch_size: Rows per batch/transaction.
+            hash_cache: Known hashes, saves database lookups across runs; updated with every hash seen.
+            workers: Parallel partitions, as for insert_dataframe.
+        Returns:
+            {"attempted", "succeeded", "skipped", "failed", "errors": [(row_number, Exception)]}
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        schema = self.get_table_schema(table)
+        if hash_column not in schema:
+            raise ValueError(f"{table} has no {hash_column} column")
+
+        attempted = len(df)
+        if attempted == 0:
+            return {"attempted": 0, "succeeded": 0, "skipped": 0, "failed": 0, "errors": []}
+
+        exclude = set(exclude_columns or []) | {hash_column}
+        insert_cols = [c for c in schema if c != hash_column and c in df.columns]
+        hash_cols = [c for c in schema if c not in exclude]
+        normalize_cols = [c for c in schema if c in insert_cols or c in hash_cols]
+
+        rows, errors = self._normalize_frame(df.reindex(columns=normalize_cols), normalize_cols, schema)
+        failed_positions = {pos for pos, _ in errors}
+        index = {c: i for i, c in enumerate(normalize_cols)}
+        hashes = row_hashes([[row[index[c]] for row in rows] for c in hash_cols], len(rows))
+
+        candidates: dict[str, tuple[int, tuple]] = {}
+        for pos, (row, row_hash) in enumerate(zip(rows, hashes), start=1):
+            if pos not in failed_positions and row_hash not in candidates:
+                candidates[row_hash] = (pos, tuple(row[index[c]] for c in insert_cols) + (row_hash,))
+
+        new_hashes = list(candidates)
+        if hash_cache is not None:
+            new_hashes = hash_cache.filter_new(table, new_hashes)
+        existing = self.get_existing_hashes(table, new_hashes, hash_column)
+        if hash_cache is not None and existing:
+            hash_cache.add(table, existing)
+        new_hashes = [h for h in new_hashes if h not in existing]
+
+        pending = sorted((candidates[h] for h in new_hashes), key=lambda item: item[0])
+        query = self._insert_sql(table, insert_cols + [hash_column])
+        succeeded = self._load_rows(query, pending, batch_size, workers, False, errors)
+        if hash_cache is not None:
+            inserted_failed = {pos for pos, _ in errors}
+            hash_cache.add(table, (h for h in new_hashes if candidates[h][0] not in inserted_failed))
+
+        errors.sort(key=lambda e: e[0])
+        failed = len({pos for pos, _ in errors})
+        return {
+            "attempted": attempted,
+            "succeeded": succeeded,
+            "skipped": attempted - succeeded - failed,
+            "failed": failed,
+            "errors": errors,
+        }
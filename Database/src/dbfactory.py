@@ -4,6 +4,10 @@ from Database.src.sql_server import MSSQLDatabase
 from Database.src.mysql import MySQLDatabase
 from Database.src.sqlite import SQLiteDatabase
 from Database.src.dbbase import DatabaseType
+from Database.src.pool import PoolConfig
+from Database.src.asyncdb import AsyncDBBase, AsyncExecutorDatabase, AsyncPostgreSQLDatabase, AsyncSQLiteDatabase
+from Database.src.schema_cache import SchemaCache
+from Database.src.result_cache import ResultCache
 
 
 class DatabaseFactory:
@@ -19,7 +23,11 @@ class DatabaseFactory:
         database: str = "",
         user: str = "",
         password: str = "",
-        port: int | None = None
+        port: int | None = None,
+        pooled: bool = False,
+        pool_config: PoolConfig | None = None,
+        schema_cache: SchemaCache | None = None,
+        result_cache: ResultCache | None = None
     ) -> DBBase:
         """
         Create an instance of a database/connection
@@ -31,6 +39,10 @@ class DatabaseFactory:
             user (str, optional): username. Defaults to "".
             password (str, optional): user password. Defaults to "".
             port (int | None, optional): port number. Defaults to None.
+            pooled (bool, optional): borrow connections from a ConnectionPool instead of reconnecting per call. Defaults to False.
+            pool_config (PoolConfig | None, optional): pool settings; implies pooled=True. Defaults to None.
+            schema_cache (SchemaCache | None, optional): cache for get_table_schema, e.g. SHARED_SCHEMA_CACHE to share it between instances. Defaults to a private cache per instance.
+            result_cache (ResultCache | None, optional): cache select/select_df results (see DBBase.enable_result_cache). Defaults to None (no caching).
 
         Raises:
             ValueError: _description_
@@ -40,14 +52,61 @@ class DatabaseFactory:
             DBBase: instance of the correct database subclass
         """
         if db_type == DatabaseType.POSTGRESQL:
-            return PostgreSQLDatabase(host, database, user, password, port or 5432)
+            db = PostgreSQLDatabase(host, database, user, password, port or 5432)
         elif db_type == DatabaseType.MSSQL:
-            return MSSQLDatabase(host, database, user, password, port or 1433)
+            db = MSSQLDatabase(host, database, user, password, port or 1433)
         elif db_type == DatabaseType.MYSQL:
-            return MySQLDatabase(host, database, user, password, port or 3306)
+            db = MySQLDatabase(host, database, user, password, port or 3306)
         elif db_type == DatabaseType.SQLITE:
             if not database:
                 raise ValueError("SQLite requires a file path for 'database'")
-            return SQLiteDatabase(database)
+            db = SQLiteDatabase(database)
         else:
-            raise ValueError(f"Unsupported database type: {db_type}")
\ No newline at end of file
+            raise ValueError(f"Unsupported database type: {db_type}")
+
+        if schema_cache is not None:
+            db.schema_cache = schema_cache
+        if result_cache is not None:
+            db.enable_result_cache(result_cache)
+        if pooled or pool_config is not None:
+            db.enable_pool(pool_config)
+        return db
+
+    @staticmethod
+    def create_async(
+        db_type: DatabaseType,
+        host: str = "",
+        database: str = "",
+        user: str = "",
+        password: str = "",
+        port: int | None = None,
+        pool_config: PoolConfig | None = None,
+        max_workers: int = 4
+    ) -> AsyncDBBase:
+        """
+        Create an asyncio instance of a database/connection (connections are opened on first use,
+        so this is a plain function: `async with DatabaseFactory.create_async(...) as db:`)
+
+        PostgreSQL uses psycopg's native async connections (pooled when pool_config is given).
+        MSSQL and MySQL have no async driver here and run the sync class on a thread pool
+        of max_workers threads; SQLite runs on a single dedicated thread.
+
+        Args:
+            db_type (DatabaseType): select between supported databases enum { POSTGRESQL, MSSQL, MYSQL, SQLITE }
+            host, database, user, password, port: as for create().
+            pool_config (PoolConfig | None, optional): pool settings. Defaults to None.
+            max_workers (int, optional): executor threads for MSSQL/MySQL. Defaults to 4.
+
+        Returns:
+            AsyncDBBase: instance of the correct async database class
+        """
+        if db_type == DatabaseType.POSTGRESQL:
+            return AsyncPostgreSQLDatabase(host, database, user, password, port or 5432, pool_config=pool_config)
+        if db_type == DatabaseType.SQLITE:
+            if not database:
+                raise ValueError("SQLite requires a file path for 'database'")
+            return AsyncSQLiteDatabase(database)
+        if db_type in (DatabaseType.MSSQL, DatabaseType.MYSQL):
+            db = DatabaseFactory.create(db_type, host, database, user, password, port, pool_config=pool_config)
+            return AsyncExecutorDatabase(db, max_workers=max_workers)
+        raise ValueError(f"Unsupported database type: {db_type}")
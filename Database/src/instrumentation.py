@@ -0,0 +1,384 @@
+import bisect
+import functools
+import inspect
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+import pandas as pd
+
+from Database.src.result_cache import estimate_bytes, normalize_sql
+
+# Instrumentation is off until an observer is added (DBBase.add_observer). While off, an
+# instrumented method costs one attribute check; nothing below is created or timed.
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_PLACEHOLDER_RE = re.compile(r"%s|\?")
+
+PHASES = ("connect", "pool_wait", "execute", "fetch", "frame", "normalize")
+
+# histogram bucket upper bounds in seconds: 10 us to ~4 min, factor sqrt(2)
+BUCKETS = tuple(1e-5 * 2 ** (i / 2) for i in range(50))
+
+
+def fingerprint(query_or_table: str, operation: str) -> str:
+    """Statement shape without literals: 'SELECT * FROM t WHERE id = 5' and '... id = 7' share one.
+    For table-based calls (insert, insert_dataframe, ...) it is "<operation> <table>"."""
+    text = normalize_sql(query_or_table)
+    if " " not in text:
+        return f"{operation} {text}"
+    text = _STRING_RE.sub("?", text)
+    text = _NUMBER_RE.sub("?", text)
+    text = _PLACEHOLDER_RE.sub("?", text)
+    return _IN_LIST_RE.sub("(?, ...)", text)
+
+
+class QueryEvent:
+    """Timings and counters of one instrumented call. Phase times are in seconds."""
+
+    __slots__ = ("db_type", "operation", "fingerprint", "started", "total_seconds", "connect_seconds",
+                 "pool_wait_seconds", "execute_seconds", "fetch_seconds", "frame_seconds",
+                 "normalize_seconds", "rows", "bytes", "error")
+
+    def __init__(self, db_type: str, operation: str, fingerprint: str):
+        self.db_type = db_type
+        self.operation = operation
+        self.fingerprint = fingerprint
+        self.started = time.time()
+        self.total_seconds = 0.0
+        self.connect_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+        self.execute_seconds = 0.0
+        self.fetch_seconds = 0.0
+        self.frame_seconds = 0.0
+        self.normalize_seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.error: Exception | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data["error"] = None if self.error is None else repr(self.error)
+        return data
+
+
+class QueryObserver:
+    """Receives every instrumented call of the DBBase it is added to. Override either hook.
+    Hooks run on the calling thread and should be quick."""
+
+    def on_start(self, event: QueryEvent) -> None:
+        pass
+
+    def on_end(self, event: QueryEvent) -> None:
+        pass
+
+
+class _Stats:
+    __slots__ = ("db_type", "operation", "fingerprint", "count", "errors", "total", "max", "rows", "bytes", "phases", "buckets")
+
+    def __init__(self, event: QueryEvent):
+        self.db_type = event.db_type
+        self.operation = event.operation
+        self.fingerprint = event.fingerprint
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def add(self, event: QueryEvent) -> None:
+        self.count += 1
+        self.errors += event.error is not None
+        self.total += event.total_seconds
+        self.max = max(self.max, event.total_seconds)
+        self.rows += event.rows
+        self.bytes += event.bytes
+        for name in PHASES:
+            self.phases[name] += getattr(event, f"{name}_seconds")
+        self.buckets[bisect.bisect_left(BUCKETS, event.total_seconds)] += 1
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile, capped at the slowest call."""
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+
+class MetricsAggregator(QueryObserver):
+    """In-memory latency histograms and phase totals per (db_type, operation, fingerprint)."""
+
+    def __init__(self):
+        self._stats: dict[tuple[str, str, str], _Stats] = {}
+        self._lock = threading.Lock()
+
+    def on_end(self, event: QueryEvent) -> None:
+        key = (event.db_type, event.operation, event.fingerprint)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _Stats(event)
+            stats.add(event)
+
+    def summary(self) -> list[dict[str, Any]]:
+        """One dict per fingerprint, slowest total time first."""
+        with self._lock:
+            stats = sorted(self._stats.values(), key=lambda s: s.total, reverse=True)
+            return [{
+                "db_type": s.db_type, "operation": s.operation, "fingerprint": s.fingerprint,
+                "count": s.count, "errors": s.errors, "rows": s.rows, "bytes": s.bytes,
+                "total_seconds": s.total, "mean_seconds": s.total / s.count, "max_seconds": s.max,
+                "p50_seconds": s.percentile(0.50), "p95_seconds": s.percentile(0.95), "p99_seconds": s.percentile(0.99),
+                "phase_seconds": dict(s.phases),
+            } for s in stats]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    ## Exporters ##
+    def to_json(self, path: str | None = None) -> str:
+        """Summary as JSON; also written to path when given."""
+        text = json.dumps(self.summary(), indent=2)
+        if path is not None:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        return text
+
+    def to_prometheus(self, prefix: str = "db") -> str:
+        """Prometheus text exposition format: a duration histogram plus phase, row, byte and error counters."""
+        with self._lock:
+            stats = list(self._stats.values())
+        lines = [
+            f"# HELP {prefix}_query_duration_seconds Duration of instrumented database calls.",
+            f"# TYPE {prefix}_query_duration_seconds histogram",
+        ]
+        for s in stats:
+            labels = self._labels(s)
+            cumulative = 0
+            for bound, n in zip(BUCKETS, s.buckets):
+                cumulative += n
+                lines.append(f'{prefix}_query_duration_seconds_bucket{{{labels},le="{bound:.6g}"}} {cumulative}')
+            lines.append(f'{prefix}_query_duration_seconds_bucket{{{labels},le="+Inf"}} {s.count}')
+            lines.append(f"{prefix}_query_duration_seconds_sum{{{labels}}} {s.total:.9g}")
+            lines.append(f"{prefix}_query_duration_seconds_count{{{labels}}} {s.count}")
+        counters = [
+            ("phase_seconds_total", "Seconds spent per phase of instrumented calls.",
+             lambda s: [(f',phase="{name}"', f"{value:.9g}") for name, value in s.phases.items()]),
+            ("rows_total", "Rows returned or written.", lambda s: [("", str(s.rows))]),
+            ("bytes_total", "Approximate bytes returned or written.", lambda s: [("", str(s.bytes))]),
+            ("errors_total", "Calls that raised.", lambda s: [("", str(s.errors))]),
+        ]
+        for name, help_text, samples in counters:
+            lines.append(f"# HELP {prefix}_query_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_query_{name} counter")
+            for s in stats:
+                labels = self._labels(s)
+                lines.extend(f"{prefix}_query_{name}{{{labels}{extra}}} {value}" for extra, value in samples(s))
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _labels(s: _Stats) -> str:
+        def escape(value: str) -> str:
+            return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return f'db_type="{escape(s.db_type)}",operation="{escape(s.operation)}",fingerprint="{escape(s.fingerprint)}"'
+
+
+class TimedCursor:
+    """DB-API cursor wrapper that adds execute/fetch time to a QueryEvent; everything else passes through."""
+
+    __slots__ = ("_cursor", "_event")
+
+    def __init__(self, cursor, event: QueryEvent):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_event", event)
+
+    def execute(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = self._cursor.execute(*args, **kwargs)
+        finally:
+            self._event.execute_seconds += time.perf_counter() - started
+        self._count_rows()
+        return result
+
+    def executemany(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = self._cursor.executemany(*args, **kwargs)
+        finally:
+            self._event.execute_seconds += time.perf_counter() - started
+        self._count_rows()
+        return result
+
+    def _count_rows(self) -> None:
+        # rows written, for methods that return nothing (SQLite/MySQL execute, insert, ...);
+        # calls with a result count that instead (see instrumented)
+        rowcount = getattr(self._cursor, "rowcount", -1)
+        if isinstance(rowcount, int) and rowcount > 0:
+            self._event.rows += rowcount
+
+    def copy_to(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.copy_to(*args, **kwargs)
+        finally:
+            self._event.execute_seconds += time.perf_counter() - started
+
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return self._cursor.fetchone()
+        finally:
+            self._event.fetch_seconds += time.perf_counter() - started
+
+    def fetchmany(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.fetchmany(*args, **kwargs)
+        finally:
+            self._event.fetch_seconds += time.perf_counter() - started
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return self._cursor.fetchall()
+        finally:
+            self._event.fetch_seconds += time.perf_counter() - started
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._cursor.__exit__(*exc)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._cursor, name, value)
+
+
+@contextmanager
+def phase(event: QueryEvent | None, name: str) -> Iterator[None]:
+    """Add the time spent in the block to event.<name>_seconds (no-op without an event)."""
+    if event is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(event, f"{name}_seconds", getattr(event, f"{name}_seconds") + time.perf_counter() - started)
+
+
+def _rows_in(value: Any) -> int:
+    if isinstance(value, (list, pd.DataFrame)):
+        return len(value)
+    if isinstance(value, dict):
+        # insert_dataframe-style reports count "succeeded"; execute/insert/update/delete report "rows_affected"
+        # (-1 when the driver does not know)
+        rows = value["succeeded"] if "succeeded" in value else value.get("rows_affected", 0)
+        return max(rows or 0, 0)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    return getattr(value, "num_rows", 0)
+
+
+def _bytes_in(value: Any) -> int:
+    if isinstance(value, (list, pd.DataFrame)):
+        return estimate_bytes(value)
+    return getattr(value, "nbytes", 0)
+
+
+### Method decorator used by DBBase and the backends ###
+def instrumented(method: Callable) -> Callable:
+    """Report each call of a public method (first argument: query or table) to the instance's observers.
+    Calls made while another instrumented call is running on the same thread count toward the outer one."""
+    operation = method.__name__
+
+    def start(self, args: tuple, kwargs: dict) -> QueryEvent:
+        target = args[0] if args else next(iter(kwargs.values()), "")
+        event = QueryEvent(self.db_type.value, operation, fingerprint(str(target), operation))
+        for observer in self.observers:
+            observer.on_start(event)
+        return event
+
+    def end(self, event: QueryEvent) -> None:
+        for observer in self.observers:
+            observer.on_end(event)
+
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def generator_wrapper(self, *args, **kwargs):
+            if not self.observers or getattr(self._local, "event", None) is not None:
+                yield from method(self, *args, **kwargs)
+                return
+            event = start(self, args, kwargs)
+            items = method(self, *args, **kwargs)
+            elapsed = 0.0
+            rows = 0
+            try:
+                while True:
+                    # the event is current only while the generator runs, not while the caller holds a chunk
+                    self._local.event = event
+                    started = time.perf_counter()
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        break
+                    finally:
+                        elapsed += time.perf_counter() - started
+                        self._local.event = None
+                    # a streamed row (dict or tuple) is one row; chunks report their length
+                    rows += 1 if isinstance(item, (dict, tuple)) else _rows_in(item)
+                    event.bytes += _bytes_in(item)
+                    yield item
+            except Exception as e:
+                event.error = e
+                raise
+            finally:
+                items.close()
+                event.rows = rows
+                event.total_seconds = elapsed
+                end(self, event)
+        return generator_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self.observers or getattr(self._local, "event", None) is not None:
+            return method(self, *args, **kwargs)
+        event = start(self, args, kwargs)
+        self._local.event = event
+        started = time.perf_counter()
+        try:
+            result = method(self, *args, **kwargs)
+            if result is not None:
+                # else keep the rowcounts the call's cursors reported
+                event.rows = _rows_in(result)
+            payload = next((a for a in args if isinstance(a, pd.DataFrame)), result)
+            event.bytes = _bytes_in(payload)
+            return result
+        except Exception as e:
+            event.error = e
+            raise
+        finally:
+            event.total_seconds = time.perf_counter() - started
+            self._local.event = None
+            end(self, event)
+    return wrapper
@@ -1,13 +1,32 @@
 import mysql.connector
+from mysql.connector import FieldType
+from collections import OrderedDict
 from typing import Any
-from Database.src.dbbase import DBBase
+import weakref
+from Database.src.dbbase import DBBase, DatabaseType
+from Database.src.result_cache import cached_read, invalidates
+from Database.src.instrumentation import instrumented
+import pandas as pd
+
+# cursor.description type_code -> column kind used by select_df
+MYSQL_TYPE_KINDS = {
+    FieldType.TINY: "int", FieldType.SHORT: "int", FieldType.LONG: "int",
+    FieldType.LONGLONG: "int", FieldType.INT24: "int", FieldType.YEAR: "int",
+    FieldType.FLOAT: "float", FieldType.DOUBLE: "float",
+    FieldType.DATETIME: "datetime", FieldType.TIMESTAMP: "datetime",
+    FieldType.VARCHAR: "str", FieldType.VAR_STRING: "str", FieldType.STRING: "str",
+}
 
 
 class MySQLDatabase(DBBase):
     """MySQL implementation using mysql-connector-python."""
 
+    db_type = DatabaseType.MYSQL
+
     def __init__(self, host, database, user, password, port=3306):
         super().__init__(host, database, user, password, port)
+        # connection -> {sql: prepared cursor}; dropped with the connection
+        self._prepared: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
 
     def connect(self):
         """Create a MySQL connection."""
@@ -19,13 +38,26 @@ class MySQLDatabase(DBBase):
             port=self.port
         )
 
+    @instrumented
+    @cached_read
     def select(self, query: str, params: tuple = ()) -> list[dict[str, Any]]:
         """Execute SELECT and return all rows as list of dicts."""
-        with self.connect() as conn:
-            cur = conn.cursor(dictionary=True)
+        with self._connection() as conn:
+            cur = self._cursor(conn, dictionary=True)
             cur.execute(query, params)
             return cur.fetchall()
 
+    @instrumented
+    @cached_read
+    def select_df(self, query: str, params: tuple = (), include_columns_when_empty: bool = False) -> pd.DataFrame:
+        """Execute SELECT and return a DataFrame built column by column; columns are always kept."""
+        with self._connection() as conn:
+            cur = self._cursor(conn)
+            cur.execute(query, params)
+            return self._frame_from_cursor(cur)
+
+    @instrumented
+    @cached_read
     def select_where(
             self,
             query_or_table: str,
@@ -38,8 +70,8 @@ class MySQLDatabase(DBBase):
             - If `columns` or `where` are provided, builds a query automatically.
             - Otherwise, treats the first argument as a raw SQL string.
             """
-            with self.connect() as conn:
-                cur = conn.cursor(dictionary=True)
+            with self._connection() as conn:
+                cur = self._cursor(conn, dictionary=True)
                 if columns is not None or where is not None:
                     col_str = ", ".join(columns) if columns else "*"
                     query = f"SELECT {col_str} FROM {query_or_table}"
@@ -51,26 +83,122 @@ class MySQLDatabase(DBBase):
                 cur.execute(query, params)
                 return cur.fetchall()
 
+    def _type_kind(self, type_code):
+        return MYSQL_TYPE_KINDS.get(type_code)
+
+    def _stream_cursor(self, conn):
+        """Unbuffered cursor: rows are read from the socket as fetchmany asks for them."""
+        return self._cursor(conn, buffered=False)
+
+    @instrumented
+    @invalidates
     def execute(self, query: str, params: tuple = ()) -> None:
         """Execute INSERT/UPDATE/DELETE and commit."""
-        with self.connect() as conn:
-            cur = conn.cursor()
-            cur.execute(query, params)
-            conn.commit()
+        with self._connection() as conn:
+            cur = self._cursor(conn)
+            try:
+                cur.execute(query, params)
+            except Exception as e:
+                self._rollback(conn, e)
+                raise
+            self._commit(conn)
     
+    def _execute_statement(self, query: str, params: tuple) -> None:
+        """Cached statements run on a prepared cursor kept per pooled/pinned connection."""
+        if not self._reuses_connections():
+            return self.execute(query, params)
+        with self._connection() as conn:
+            cur = self._prepared_cursor(conn, query)
+            try:
+                cur.execute(query, params)
+            except Exception as e:
+                self._rollback(conn, e)
+                raise
+            self._commit(conn)
+
+    def _prepared_cursor(self, conn, query: str):
+        cursors = self._prepared.get(conn)
+        if cursors is None:
+            cursors = self._prepared[conn] = OrderedDict()
+        cur = cursors.get(query)
+        if cur is None:
+            cur = cursors[query] = conn.cursor(prepared=True)
+            while len(cursors) > self.statement_cache.max_entries:
+                _, old = cursors.popitem(last=False)
+                old.close()
+        cursors.move_to_end(query)
+        return cur
+
+    @instrumented
+    @invalidates
     def insert(self, table: str, data: dict[str, Any]) -> None:
-        columns = ", ".join(data.keys())
-        placeholders = ", ".join(["%s"] * len(data))
-        values = tuple(data.values())
-        query = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
-        self.execute(query, values)
+        return self._execute_statement(self._insert_sql(table, list(data)), tuple(data.values()))
 
+    @instrumented
+    @invalidates
     def update(self, table: str, data: dict[str, Any], where: str, params: tuple = ()) -> None:
-        set_clause = ", ".join([f"{col} = %s" for col in data.keys()])
-        values = tuple(data.values()) + params
-        query = f"UPDATE {table} SET {set_clause} WHERE {where}"
-        self.execute(query, values)
-        
+        return self._execute_statement(self._update_sql(table, list(data), where), tuple(data.values()) + params)
+
+    @instrumented
+    @invalidates
     def delete(self, table: str, where: str, params: tuple = ()) -> None:
-        query = f"DELETE FROM {table} WHERE {where}"
-        return self.execute(query, params)
\ No newline at end of file
+        return self._execute_statement(self._delete_sql(table, where), params)
+
+    def _batch_size_limit(self, width: int, sample: list[tuple]) -> int | None:
+        """Rows per batch that keep one executemany statement within half of max_allowed_packet."""
+        if not sample:
+            return None
+        try:
+            packet = int(self._select_uncached("SELECT @@max_allowed_packet AS p")[0]["p"])
+        except Exception:
+            return None
+        # rough wire size: quoted text plus separators, per value
+        row_bytes = max(1, max(sum(len(str(v)) + 4 for v in row) for row in sample))
+        return max(1, packet // 2 // row_bytes)
+
+    def _split_table(self, table: str) -> tuple[str, str]:
+        """In MySQL a schema is a database; unqualified tables live in self.database."""
+        if "." in table:
+            schema_name, table_name = table.split(".", 1)
+            return schema_name, table_name
+        return self.database, table
+
+    def _upsert_sql(self, table: str, columns, key_columns, update_columns, n_rows: int) -> str:
+        # VALUES(col) rather than the 8.0.19 row alias, so MariaDB and 5.7 work too
+        assignments = [f"{col} = VALUES({col})" for col in update_columns] or [f"{key_columns[0]} = {key_columns[0]}"]
+        return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES {self._values_sql(len(columns), n_rows)} "
+                f"ON DUPLICATE KEY UPDATE {', '.join(assignments)}")
+
+    def _update_many_sql(self, table: str, key_columns, update_columns, n_rows: int, schema) -> str:
+        # derived table of UNION ALL rows; VALUES ROW(...) would need MySQL 8.0.19
+        columns = list(key_columns) + list(update_columns)
+        first = "SELECT " + ", ".join(f"%s AS {col}" for col in columns)
+        rest = "SELECT " + ", ".join(["%s"] * len(columns))
+        derived = " UNION ALL ".join([first] + [rest] * (n_rows - 1))
+        set_clause = ", ".join(f"t.{col} = v.{col}" for col in update_columns)
+        on = " AND ".join(f"t.{col} = v.{col}" for col in key_columns)
+        return f"UPDATE {table} AS t JOIN ({derived}) AS v ON {on} SET {set_clause}"
+
+    def _fetch_table_schema(self, table: str) -> dict[str, str]:
+        schema_name, table_name = self._split_table(table)
+        query = """
+        SELECT COLUMN_NAME AS column_name, DATA_TYPE AS data_type
+        FROM information_schema.columns
+        WHERE table_schema = %s
+          AND table_name = %s
+        ORDER BY ordinal_position
+        """
+        rows = self._select_uncached(query, (schema_name, table_name))
+        return {r["column_name"]: r["data_type"] for r in rows}
+
+    def _fetch_schema_tables(self, schema: str) -> dict[str, dict[str, str]]:
+        query = """
+        SELECT TABLE_NAME AS table_name, COLUMN_NAME AS column_name, DATA_TYPE AS data_type
+        FROM information_schema.columns
+        WHERE table_schema = %s
+        ORDER BY table_name, ordinal_position
+        """
+        tables: dict[str, dict[str, str]] = {}
+        for r in self._select_uncached(query, (schema,)):
+            tables.setdefault(r["table_name"], {})[r["column_name"]] = r["data_type"]
+        return tables
@@ -0,0 +1,259 @@
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Callable, Sequence
+import math
+
+import numpy as np
+import pandas as pd
+
+# Type rules shared by every backend. They mirror the original DBBase.normalize_value:
+#   "timestamp" in type -> YYMMDDHHMM strings/ints become datetime, datetimes pass through
+#   type == "date"      -> DDMMYY strings become date
+#   "int" in type       -> int(value)
+#   "double"/"numeric"  -> float(value), blank strings become 0.0
+#   anything else       -> str(value)
+# Values the special timestamp/date rules do not handle fall through to the int/float/text rule.
+
+
+def _is_null(value: Any) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _to_float(value: Any) -> float:
+    if isinstance(value, str) and value.strip() == "":
+        return 0.0
+    return float(value)
+
+
+def _base_converter(t: str) -> Callable[[Any], Any]:
+    if "int" in t:
+        return int
+    if "double" in t or "numeric" in t:
+        return _to_float
+    # varchar / text / default
+    return str
+
+
+def parse_yymmddhhmm(s: str) -> datetime:
+    """'2512090506' -> datetime(2025, 12, 9, 5, 6)"""
+    return datetime(2000 + int(s[0:2]), int(s[2:4]), int(s[4:6]), int(s[6:8]), int(s[8:10]))
+
+
+def parse_ddmmyy(s: str) -> date:
+    """'081225' -> date(2025, 12, 8)"""
+    return date(2000 + int(s[4:6]), int(s[2:4]), int(s[0:2]))
+
+
+### Scalar converters ###
+def scalar_converter(data_type: str) -> Callable[[Any], Any]:
+    """Return a function converting one value to `data_type`; the type decision is made here, once."""
+    t = data_type.lower()
+    base = _base_converter(t)
+
+    if "timestamp" in t:
+        def convert(value: Any) -> Any:
+            if _is_null(value):
+                return None
+            if isinstance(value, (int, str)):
+                s = str(value)
+                if len(s) == 10 and s.isdigit():  # YYMMDDHHMM
+                    return parse_yymmddhhmm(s)
+            if isinstance(value, datetime):
+                return value
+            return base(value)
+    elif t == "date":
+        def convert(value: Any) -> Any:
+            if _is_null(value):
+                return None
+            if isinstance(value, str) and len(value) == 6:  # DDMMYY
+                return parse_ddmmyy(value)
+            return base(value)
+    else:
+        def convert(value: Any) -> Any:
+            return None if _is_null(value) else base(value)
+    return convert
+
+
+### Vectorized converters ###
+def column_converter(data_type: str) -> Callable[[pd.Series], list[Any]]:
+    """Return a function converting a whole column to a list of driver-ready Python values.
+    NULLs (anything pd.isna) become None. Raises if any cell cannot be converted.
+    """
+    t = data_type.lower()
+    base = _base_converter(t)
+    if "timestamp" in t:
+        convert_present = lambda values: _timestamp_values(values, base)
+    elif t == "date":
+        convert_present = lambda values: _date_values(values, base)
+    elif base is int:
+        convert_present = _int_values
+    elif base is _to_float:
+        convert_present = _float_values
+    else:
+        convert_present = lambda values: values.astype(str).tolist()
+
+    def convert(values: pd.Series) -> list[Any]:
+        null = values.isna().to_numpy()
+        out = np.full(len(values), None, dtype=object)
+        if null.all():
+            return out.tolist()
+        present = values[~null]
+        out[~null] = np.fromiter(convert_present(present), dtype=object, count=len(present))
+        return out.tolist()
+    return convert
+
+
+def _timestamp_values(values: pd.Series, base: Callable[[Any], Any]) -> list[Any]:
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return list(values.dt.to_pydatetime())
+    text = values.astype(str)
+    is_raw = values.map(lambda v: isinstance(v, (int, str))).to_numpy(dtype=bool)
+    stamp = is_raw & text.str.fullmatch(r"\d{10}").to_numpy(dtype=bool)  # YYMMDDHHMM
+    out = np.empty(len(values), dtype=object)
+    if stamp.any():
+        digits = text[stamp]
+        parsed = pd.to_datetime(pd.DataFrame({
+            "year": digits.str[0:2].astype(int) + 2000,
+            "month": digits.str[2:4].astype(int),
+            "day": digits.str[4:6].astype(int),
+            "hour": digits.str[6:8].astype(int),
+            "minute": digits.str[8:10].astype(int),
+        }))
+        out[stamp] = np.fromiter(parsed.dt.to_pydatetime(), dtype=object, count=int(stamp.sum()))
+    if not stamp.all():
+        rest = values[~stamp]
+        out[~stamp] = np.fromiter(
+            (v if isinstance(v, datetime) else base(v) for v in rest.tolist()),
+            dtype=object, count=len(rest))
+    return out.tolist()
+
+
+def _date_values(values: pd.Series, base: Callable[[Any], Any]) -> list[Any]:
+    text = values.astype(str)
+    is_str = values.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    ddmmyy = is_str & (text.str.len() == 6).to_numpy(dtype=bool)  # DDMMYY
+    out = np.empty(len(values), dtype=object)
+    if ddmmyy.any():
+        digits = text[ddmmyy]
+        parsed = pd.to_datetime(pd.DataFrame({
+            "year": digits.str[4:6].astype(int) + 2000,
+            "month": digits.str[2:4].astype(int),
+            "day": digits.str[0:2].astype(int),
+        }))
+        out[ddmmyy] = np.fromiter(parsed.dt.date, dtype=object, count=int(ddmmyy.sum()))
+    if not ddmmyy.all():
+        rest = values[~ddmmyy]
+        out[~ddmmyy] = np.fromiter((base(v) for v in rest.tolist()), dtype=object, count=len(rest))
+    return out.tolist()
+
+
+# int64 bounds, and the largest magnitude a float64 holds exactly
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+FLOAT_EXACT = 2 ** 53
+
+
+def _int_values(values: pd.Series) -> list[Any]:
+    """int(v) for a whole column. Raises where int64 would differ from int(v): out-of-range
+    values (which astype would wrap around) and text int() rejects, such as "1.9"; the caller
+    then converts the column cell by cell."""
+    if pd.api.types.is_bool_dtype(values) or pd.api.types.is_signed_integer_dtype(values):
+        return values.astype("int64").tolist()
+    if pd.api.types.is_float_dtype(values):
+        return _truncated_int64(values.to_numpy(dtype="float64"))
+    if not pd.api.types.is_unsigned_integer_dtype(values):
+        is_str = values.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+        if is_str.any() and not values[is_str].str.fullmatch(r"\s*[+-]?\d+\s*").all():
+            raise ValueError("non-integral text in an integer column")
+    numbers = pd.to_numeric(values, errors="raise")
+    if pd.api.types.is_integer_dtype(numbers):
+        if len(numbers) and (numbers.max() > INT64_MAX or numbers.min() < INT64_MIN):
+            raise OverflowError("integer out of int64 range")
+        return numbers.astype("int64").tolist()
+    floats = numbers.to_numpy(dtype="float64")
+    if len(floats) and np.abs(floats).max() >= FLOAT_EXACT:
+        # parsed through float64: large ints may already have lost digits
+        raise OverflowError("integer too large to convert exactly")
+    return _truncated_int64(floats)
+
+
+def _truncated_int64(floats: np.ndarray) -> list[Any]:
+    # int(1.9) == 1: truncate like the scalar rule does
+    truncated = np.trunc(floats)
+    if len(truncated) and not (np.isfinite(truncated).all() and truncated.min() >= INT64_MIN and truncated.max() < 2.0 ** 63):
+        raise OverflowError("value out of int64 range")
+    return truncated.astype("int64").tolist()
+
+
+def _float_values(values: pd.Series) -> list[Any]:
+    if not pd.api.types.is_numeric_dtype(values):
+        blank = values.map(lambda v: isinstance(v, str) and v.strip() == "").to_numpy(dtype=bool)
+        if blank.any():
+            values = values.astype(object).mask(blank, 0.0)
+    return pd.to_numeric(values, errors="raise").astype("float64").tolist()
+
+
+### Compiled table normalizer ###
+class TableNormalizer:
+    """Per-table converters compiled from a get_table_schema result.
+
+    `converters` holds one scalar function per column and `column_converters`
+    one vectorized function per column, both in schema order.
+    """
+
+    def __init__(self, schema: dict[str, str]):
+        self.columns: tuple[str, ...] = tuple(schema)
+        self.types: tuple[str, ...] = tuple(schema.values())
+        self.converters = tuple(scalar_converter(t) for t in self.types)
+        self.column_converters = tuple(column_converter(t) for t in self.types)
+        self._index = {col: i for i, col in enumerate(self.columns)}
+
+    def normalize_row(self, row: dict[str, Any]) -> dict[str, Any]:
+        """Convert the schema columns present in `row`; other keys are dropped."""
+        return {
+            col: convert(row[col])
+            for col, convert in zip(self.columns, self.converters)
+            if col in row
+        }
+
+    def normalize_frame(
+        self,
+        df: pd.DataFrame,
+        columns: Sequence[str] | None = None,
+        first_row: int = 1,
+    ) -> tuple[list[tuple], list[tuple[int, Exception]]]:
+        """Convert df[columns] one column at a time.
+
+        A column whose vectorized conversion fails is converted cell by cell so that
+        the failing rows can be reported.
+        Returns:
+            (rows as tuples, [(row_number, error)]) where row_number starts at first_row.
+            Failed cells are None in the returned rows.
+        """
+        columns = [col for col in self.columns if col in df.columns] if columns is None else list(columns)
+        converted = []
+        errors: dict[int, Exception] = {}
+        for col in columns:
+            i = self._index[col]
+            try:
+                converted.append(self.column_converters[i](df[col]))
+            except Exception:
+                convert = self.converters[i]
+                values = []
+                for pos, value in enumerate(df[col].tolist(), start=first_row):
+                    try:
+                        values.append(convert(value))
+                    except Exception as e:
+                        errors.setdefault(pos, e)
+                        values.append(None)
+                converted.append(values)
+        return list(zip(*converted)), sorted(errors.items())
+
+
+@lru_cache(maxsize=256)
+def _compile(schema_items: tuple[tuple[str, str], ...]) -> TableNormalizer:
+    return TableNormalizer(dict(schema_items))
+
+
+def compile_normalizer(schema: dict[str, str]) -> TableNormalizer:
+    """Return the TableNormalizer for a schema; identical schemas share one compiled instance."""
+    return _compile(tuple(schema.items()))
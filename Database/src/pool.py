@@ -0,0 +1,512 @@
+import asyncio
+import inspect
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the timeout."""
+
+
+@dataclass
+class PoolConfig:
+    """Settings for a ConnectionPool.
+
+    Args:
+        min_size: Connections kept open even when idle.
+        max_size: Upper bound on open connections (idle + in use).
+        timeout: Seconds to wait for a free connection before PoolTimeout.
+        idle_timeout: Seconds an idle connection above min_size is kept.
+        max_lifetime: Seconds after which a connection is recycled.
+        check_on_checkout: Run a health check before handing out an idle connection.
+    """
+    min_size: int = 1
+    max_size: int = 10
+    timeout: float = 30.0
+    idle_timeout: float = 300.0
+    max_lifetime: float = 3600.0
+    check_on_checkout: bool = True
+
+
+class _PoolEntry:
+    __slots__ = ("conn", "created", "last_used")
+
+    def __init__(self, conn: Any):
+        now = time.monotonic()
+        self.conn = conn
+        self.created = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of DB-API connections.
+
+    The pool does not know about any specific driver. It is given a
+    `connect` callable that opens a new connection, an optional `check`
+    callable that raises if a connection is unusable, and an optional
+    `reset` callable run when a connection is returned (defaults to rollback).
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        config: PoolConfig | None = None,
+        check: Callable[[Any], None] | None = None,
+        reset: Callable[[Any], None] | None = None,
+    ):
+        self.config = config or PoolConfig()
+        if self.config.max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        if self.config.min_size > self.config.max_size:
+            raise ValueError("min_size cannot be larger than max_size")
+
+        self._connect = connect
+        self._check = check
+        self._reset = reset or (lambda conn: conn.rollback())
+        self._cond = threading.Condition()
+        self._idle: deque[_PoolEntry] = deque()
+        self._in_use: dict[int, _PoolEntry] = {}
+        self._size = 0
+        self._closed = False
+        self._opened = False
+        self._stats = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "checkout_waits": 0,
+            "checkout_wait_seconds": 0.0,
+            "checkout_timeouts": 0,
+            "health_check_failures": 0,
+        }
+
+    ### Public API ###
+    def getconn(self, timeout: float | None = None) -> Any:
+        """Check out a connection, opening a new one if the pool has room."""
+        if not self._opened:
+            self._open()
+        timeout = self.config.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        waited = False
+        started = time.monotonic()
+
+        while True:
+            entry = None
+            create = False
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeout("pool is closed")
+                self._expire_idle_locked()
+                if self._idle:
+                    entry = self._idle.pop()  # LIFO keeps the rest idle long enough to expire
+                elif self._size < self.config.max_size:
+                    self._size += 1
+                    create = True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["checkout_timeouts"] += 1
+                        raise PoolTimeout(
+                            f"no connection available within {timeout}s "
+                            f"(max_size={self.config.max_size})"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+                    continue
+
+            if create:
+                entry = self._create_entry()
+            elif not self._is_healthy(entry):
+                self._discard(entry)
+                continue
+
+            with self._cond:
+                entry.last_used = time.monotonic()
+                self._in_use[id(entry.conn)] = entry
+                self._stats["checkouts"] += 1
+                if waited:
+                    self._stats["checkout_waits"] += 1
+                    self._stats["checkout_wait_seconds"] += time.monotonic() - started
+            return entry.conn
+
+    def putconn(self, conn: Any, discard: bool = False) -> None:
+        """Return a connection to the pool. Broken or expired connections are closed."""
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            raise ValueError("connection does not belong to this pool")
+
+        if not discard:
+            try:
+                self._reset(conn)
+            except Exception:
+                discard = True
+
+        now = time.monotonic()
+        if discard or self._closed or now - entry.created > self.config.max_lifetime:
+            self._discard(entry)
+            return
+
+        with self._cond:
+            entry.last_used = now
+            self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: float | None = None) -> Iterator[Any]:
+        """Borrow a connection for the duration of a `with` block."""
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def stats(self) -> dict[str, Any]:
+        """Return a snapshot of pool counters."""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "min_size": self.config.min_size,
+                "max_size": self.config.max_size,
+            })
+        return snapshot
+
+    def close(self) -> None:
+        """Close idle connections; in-use connections are closed when returned."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for entry in idle:
+            self._discard(entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    ### Private helper methods ###
+    def _open(self) -> None:
+        with self._cond:
+            if self._opened:
+                return
+            self._opened = True
+            reserved = max(self.config.min_size - self._size, 0)
+            self._size += reserved
+        try:
+            while reserved:
+                reserved -= 1  # _create_entry gives this slot back itself when connect fails
+                entry = self._create_entry()
+                with self._cond:
+                    self._idle.append(entry)
+                    self._cond.notify()
+        finally:
+            if reserved:
+                # a connect failed: give back the slots never filled and warm up again on the next checkout
+                with self._cond:
+                    self._size -= reserved
+                    self._opened = False
+                    self._cond.notify_all()
+
+    def _create_entry(self) -> _PoolEntry:
+        try:
+            conn = self._connect()
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["connections_created"] += 1
+        return _PoolEntry(conn)
+
+    def _is_healthy(self, entry: _PoolEntry) -> bool:
+        if time.monotonic() - entry.created > self.config.max_lifetime:
+            return False
+        if not self.config.check_on_checkout or self._check is None:
+            return True
+        try:
+            self._check(entry.conn)
+            return True
+        except Exception:
+            with self._cond:
+                self._stats["health_check_failures"] += 1
+            return False
+
+    def _discard(self, entry: _PoolEntry) -> None:
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._stats["connections_closed"] += 1
+            self._cond.notify()
+
+    def _expire_idle_locked(self) -> None:
+        """Close idle connections past idle_timeout or max_lifetime. Caller holds the lock."""
+        now = time.monotonic()
+        keep: deque[_PoolEntry] = deque()
+        expired: list[_PoolEntry] = []
+        # oldest-used first so the most recently used connections survive
+        for entry in self._idle:
+            too_old = now - entry.created > self.config.max_lifetime
+            too_idle = (
+                now - entry.last_used > self.config.idle_timeout
+                and self._size - len(expired) > self.config.min_size
+            )
+            if too_old or too_idle:
+                expired.append(entry)
+            else:
+                keep.append(entry)
+        if not expired:
+            return
+        self._idle = keep
+        for entry in expired:
+            try:
+                entry.conn.close()
+            except Exception:
+                pass
+            self._size -= 1
+            self._stats["connections_closed"] += 1
+        self._cond.notify_all()
+
+
+class AsyncConnectionPool:
+    """asyncio counterpart of ConnectionPool for async drivers (e.g. psycopg.AsyncConnection).
+
+    `connect`, `check` and `reset` are coroutine functions. Same PoolConfig and
+    stats() as the threaded pool; it must be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Awaitable[Any]],
+        config: PoolConfig | None = None,
+        check: Callable[[Any], Awaitable[None]] | None = None,
+        reset: Callable[[Any], Awaitable[None]] | None = None,
+    ):
+        self.config = config or PoolConfig()
+        if self.config.max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        if self.config.min_size > self.config.max_size:
+            raise ValueError("min_size cannot be larger than max_size")
+
+        self._connect = connect
+        self._check = check
+        self._reset = reset or (lambda conn: conn.rollback())
+        self._cond = asyncio.Condition()
+        self._idle: deque[_PoolEntry] = deque()
+        self._in_use: dict[int, _PoolEntry] = {}
+        self._size = 0
+        self._closed = False
+        self._opened = False
+        self._stats = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "checkout_waits": 0,
+            "checkout_wait_seconds": 0.0,
+            "checkout_timeouts": 0,
+            "health_check_failures": 0,
+        }
+
+    ### Public API ###
+    async def getconn(self, timeout: float | None = None) -> Any:
+        """Check out a connection, opening a new one if the pool has room."""
+        if not self._opened:
+            await self._open()
+        timeout = self.config.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        started = time.monotonic()
+        waited = False
+
+        while True:
+            entry = None
+            create = False
+            async with self._cond:
+                if self._closed:
+                    raise PoolTimeout("pool is closed")
+                expired = self._take_expired_idle()
+                if self._idle:
+                    entry = self._idle.pop()
+                elif self._size < self.config.max_size:
+                    self._size += 1
+                    create = True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["checkout_timeouts"] += 1
+                        raise PoolTimeout(
+                            f"no connection available within {timeout}s "
+                            f"(max_size={self.config.max_size})"
+                        )
+                    waited = True
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+            for old in expired:
+                await _close_quietly(old.conn)
+            if entry is None and not create:
+                continue
+
+            if create:
+                entry = await self._create_entry()
+            elif not await self._is_healthy(entry):
+                await self._discard(entry)
+                continue
+
+            entry.last_used = time.monotonic()
+            self._in_use[id(entry.conn)] = entry
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["checkout_waits"] += 1
+                self._stats["checkout_wait_seconds"] += time.monotonic() - started
+            return entry.conn
+
+    async def putconn(self, conn: Any, discard: bool = False) -> None:
+        """Return a connection to the pool. Broken or expired connections are closed."""
+        entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            raise ValueError("connection does not belong to this pool")
+        if not discard:
+            try:
+                await self._reset(conn)
+            except Exception:
+                discard = True
+        now = time.monotonic()
+        if discard or self._closed or now - entry.created > self.config.max_lifetime:
+            await self._discard(entry)
+            return
+        async with self._cond:
+            entry.last_used = now
+            self._idle.append(entry)
+            self._cond.notify()
+
+    @asynccontextmanager
+    async def connection(self, timeout: float | None = None) -> AsyncIterator[Any]:
+        """Borrow a connection for the duration of an `async with` block."""
+        conn = await self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            await self.putconn(conn)
+
+    def stats(self) -> dict[str, Any]:
+        """Return a snapshot of pool counters."""
+        snapshot = dict(self._stats)
+        snapshot.update({
+            "size": self._size,
+            "idle": len(self._idle),
+            "in_use": len(self._in_use),
+            "min_size": self.config.min_size,
+            "max_size": self.config.max_size,
+        })
+        return snapshot
+
+    async def close(self) -> None:
+        """Close idle connections; in-use connections are closed when returned."""
+        async with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for entry in idle:
+            await self._discard(entry)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    ### Private helper methods ###
+    async def _open(self) -> None:
+        if self._opened:
+            return
+        self._opened = True
+        reserved = max(self.config.min_size - self._size, 0)
+        self._size += reserved
+        try:
+            while reserved:
+                reserved -= 1  # _create_entry gives this slot back itself when connect fails
+                entry = await self._create_entry()
+                async with self._cond:
+                    self._idle.append(entry)
+                    self._cond.notify()
+        finally:
+            if reserved:
+                # a connect failed: give back the slots never filled and warm up again on the next checkout
+                async with self._cond:
+                    self._size -= reserved
+                    self._opened = False
+                    self._cond.notify_all()
+
+    async def _create_entry(self) -> _PoolEntry:
+        try:
+            conn = await self._connect()
+        except BaseException:
+            async with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        self._stats["connections_created"] += 1
+        return _PoolEntry(conn)
+
+    async def _is_healthy(self, entry: _PoolEntry) -> bool:
+        if time.monotonic() - entry.created > self.config.max_lifetime:
+            return False
+        if not self.config.check_on_checkout or self._check is None:
+            return True
+        try:
+            await self._check(entry.conn)
+            return True
+        except Exception:
+            self._stats["health_check_failures"] += 1
+            return False
+
+    async def _discard(self, entry: _PoolEntry) -> None:
+        await _close_quietly(entry.conn)
+        async with self._cond:
+            self._size -= 1
+            self._stats["connections_closed"] += 1
+            self._cond.notify()
+
+    def _take_expired_idle(self) -> list[_PoolEntry]:
+        """Remove idle entries past idle_timeout or max_lifetime. Caller holds the condition."""
+        now = time.monotonic()
+        keep: deque[_PoolEntry] = deque()
+        expired: list[_PoolEntry] = []
+        for entry in self._idle:
+            too_old = now - entry.created > self.config.max_lifetime
+            too_idle = (
+                now - entry.last_used > self.config.idle_timeout
+                and self._size - len(expired) > self.config.min_size
+            )
+            if too_old or too_idle:
+                expired.append(entry)
+            else:
+                keep.append(entry)
+        if expired:
+            self._idle = keep
+            self._size -= len(expired)
+            self._stats["connections_closed"] += len(expired)
+        return expired
+
+
+async def _close_quietly(conn: Any) -> None:
+    try:
+        result = conn.close()
+        if inspect.isawaitable(result):
+            await result
+    except Exception:
+        pass
@@ -1,13 +1,44 @@
 import psycopg
-from psycopg.rows import dict_row
-from typing import Any
-from Database.src.dbbase import DBBase
+from psycopg import postgres
+from psycopg.rows import dict_row, tuple_row
+from typing import Any, Iterable, Iterator, Sequence
+from decimal import Decimal
+from itertools import chain, islice
+import io
+import uuid
+from Database.src.dbbase import DBBase, DatabaseType
+from Database.src.arrow import ChunkReader, arrow_type, batch_csv, require_pyarrow
+from Database.src.result_cache import cached_read, invalidates
+from Database.src.instrumentation import instrumented
 import pandas as pd
 
 
 class PostgreSQLDatabase(DBBase):
     """PostgreSQL implementation using psycopg[binary]."""
 
+    db_type = DatabaseType.POSTGRESQL
+
+    # cursor.description type_code (OID) -> column kind used by select_df
+    TYPE_KINDS = {
+        16: "bool",
+        20: "int", 21: "int", 23: "int",
+        700: "float", 701: "float",
+        1114: "datetime", 1184: "datetime",
+        25: "str", 1042: "str", 1043: "str",
+    }
+
+    # catalog query behind get_table_schema (shared with AsyncPostgreSQLDatabase); params: (schema, table)
+    TABLE_SCHEMA_SQL = """
+        SELECT column_name, data_type
+        FROM information_schema.columns
+        WHERE table_schema = %s
+        AND table_name = %s
+        ORDER BY ordinal_position
+        """
+
+    # insert_dataframe switches to COPY for frames with at least this many rows (None disables)
+    copy_threshold: int | None = 10_000
+
     def __init__(self, host, database, user, password, port=5432):
         """Initialize the PostgreSQL connection.
         Args:
@@ -34,21 +65,28 @@ class PostgreSQLDatabase(DBBase):
             autocommit=False
         )
 
+    @instrumented
+    @cached_read
     def select(self, query: str, params: tuple = ()) -> list[dict[str, Any]]:
-        with self.connect() as conn:
-            with conn.cursor() as cur:
+        with self._connection() as conn:
+            with self._cursor(conn) as cur:
                 cur.execute(query, params)
                 return cur.fetchall()
+    @instrumented
+    @cached_read
     def select_df(self, query: str, params: tuple = (), include_columns_when_empty: bool = False) -> pd.DataFrame:
-    #def select_df(self, query: str, params: tuple = ()) -> pd.DataFrame:
-    ## ToDo implement include_columns_when_empty
-        with self.connect() as conn:
-            with conn.cursor() as cur:
+        """
+        Execute a SELECT query and return a DataFrame built column by column from tuple rows.
+        Columns are always kept, so an empty result still has them (include_columns_when_empty
+        is accepted for compatibility).
+        """
+        with self._connection() as conn:
+            with self._cursor(conn, row_factory=tuple_row) as cur:
                 cur.execute(query, params)
-                rows = cur.fetchall()
-        return pd.DataFrame(rows)
-
+                return self._frame_from_cursor(cur)
 
+    @instrumented
+    @cached_read
     def select_where(
         self,
         query_or_table: str,
@@ -57,8 +95,8 @@ class PostgreSQLDatabase(DBBase):
         params: tuple = ()
     ) -> list[dict[str, Any]]:
         """Execute SELECT from raw SQL or from table name + filters."""
-        with self.connect() as conn:
-            with conn.cursor() as cur:
+        with self._connection() as conn:
+            with self._cursor(conn) as cur:
                 if columns is not None or where is not None:
                     col_str = ", ".join(columns) if columns else "*"
                     query = f"SELECT {col_str} FROM {query_or_table}"
@@ -71,50 +109,344 @@ class PostgreSQLDatabase(DBBase):
                 cur.execute(query, params)
                 return cur.fetchall()            
             
+    @instrumented
+    @invalidates
     def execute(self, query: str, params: tuple = ()) -> None:
+        return self._execute(query, params)
+
+    def _execute_statement(self, query: str, params: tuple) -> dict[str, Any]:
+        # server-side prepare only pays off when the connection outlives the call;
+        # otherwise leave it to psycopg's prepare_threshold
+        return self._execute(query, params, prepare=True if self._reuses_connections() else None)
+
+    def _execute(self, query: str, params: tuple = (), prepare: bool | None = None) -> dict[str, Any]:
         try:
-            with self.connect() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(query, params)
-                conn.commit()
+            with self._connection() as conn:
+                try:
+                    with self._cursor(conn) as cur:
+                        cur.execute(query, params, prepare=prepare)
+                except Exception as e:
+                    self._rollback(conn, e)
+                    raise
+                self._commit(conn)
             return {"success": True, "rows_affected": cur.rowcount, "error": None}            
         except Exception as e:
             return {"success": False, "rows_affected": 0, "error": str(e)}
             
+    @instrumented
+    @invalidates
     def insert(self, table: str, data: dict[str, Any]) -> None:
-        columns = ", ".join(data.keys())
-        placeholders = ", ".join(["%s"] * len(data))
-        values = tuple(data.values())
-
-        query = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
-        return self.execute(query, values)
+        return self._execute_statement(self._insert_sql(table, list(data)), tuple(data.values()))
 
+    @instrumented
+    @invalidates
     def update(self, table: str, data: dict[str, Any], where: str, params: tuple = ()) -> None:
-        set_clause = ", ".join([f"{col} = %s" for col in data.keys()])
-        values = tuple(data.values()) + params
-
-        query = f"UPDATE {table} SET {set_clause} WHERE {where}"
-        return self.execute(query, values)
+        return self._execute_statement(self._update_sql(table, list(data), where), tuple(data.values()) + params)
 
+    @instrumented
+    @invalidates
     def delete(self, table: str, where: str, params: tuple = ()) -> None:
-        query = f"DELETE FROM {table} WHERE {where}"
-        return self.execute(query, params)
+        return self._execute_statement(self._delete_sql(table, where), params)
     
-    def get_table_schema(self, table: str) -> dict[str, str]:
-        schema, table_name = table.split(".", 1)
+    def _upsert_batch(self, cur, table: str, columns, key_columns, update_columns, rows: list[tuple]) -> tuple[int, int]:
+        """ON CONFLICT with RETURNING (xmax = 0): true for inserted rows, false for updated ones."""
+        action = ("DO UPDATE SET " + ", ".join(f"{col} = EXCLUDED.{col}" for col in update_columns)
+                  if update_columns else "DO NOTHING")
+        query = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES {self._values_sql(len(columns), len(rows))} "
+                 f"ON CONFLICT ({', '.join(key_columns)}) {action} RETURNING (xmax = 0) AS inserted")
+        cur.execute(query, tuple(v for row in rows for v in row))
+        flags = [r["inserted"] for r in cur.fetchall()]
+        inserted = sum(1 for flag in flags if flag)
+        return inserted, len(flags) - inserted
+
+    def _update_many_sql(self, table: str, key_columns, update_columns, n_rows: int, schema) -> str:
+        # untyped VALUES parameters resolve to text, so cast each one to its column type
+        columns = list(key_columns) + list(update_columns)
+        row = "(" + ", ".join(f"CAST(%s AS {schema[col]})" for col in columns) + ")"
+        set_clause = ", ".join(f"{col} = v.{col}" for col in update_columns)
+        on = " AND ".join(f"t.{col} = v.{col}" for col in key_columns)
+        return (f"UPDATE {table} AS t SET {set_clause} "
+                f"FROM (VALUES {', '.join([row] * n_rows)}) AS v ({', '.join(columns)}) WHERE {on}")
+
+    def _fetch_table_schema(self, table: str) -> dict[str, str]:
+        with self._connection() as conn:
+            with self._cursor(conn) as cur:
+                cur.execute(self.TABLE_SCHEMA_SQL, self._split_table(table))
+                rows = cur.fetchall()
 
+        # rows are dicts because of dict_row row_factory
+        return {r["column_name"]: r["data_type"] for r in rows}
+
+    def _fetch_schema_tables(self, schema: str) -> dict[str, dict[str, str]]:
         query = """
-        SELECT column_name, data_type
+        SELECT table_name, column_name, data_type
         FROM information_schema.columns
         WHERE table_schema = %s
-        AND table_name = %s
-        ORDER BY ordinal_position
+        ORDER BY table_name, ordinal_position
         """
+        tables: dict[str, dict[str, str]] = {}
+        for r in self._select_uncached(query, (schema,)):
+            tables.setdefault(r["table_name"], {})[r["column_name"]] = r["data_type"]
+        return tables
 
-        with self.connect() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (schema, table_name))
-                rows = cur.fetchall()
+    def _type_kind(self, type_code):
+        return self.TYPE_KINDS.get(type_code)
 
-        # rows are dicts because of dict_row row_factory
-        return {r["column_name"]: r["data_type"] for r in rows}
\ No newline at end of file
+    def _stream_cursor(self, conn):
+        """Named (server-side) cursor: rows stay on the server until fetched."""
+        return self._cursor(conn, name=f"select_iter_{uuid.uuid4().hex[:12]}", row_factory=tuple_row)
+
+    ## Bulk load (COPY) ##
+    @instrumented
+    @invalidates
+    def insert_dataframe(self, table: str, df: pd.DataFrame, batch_size: int | str = 1000, workers: int = 1, atomic: bool = False) -> dict[str, Any]:
+        """Batched INSERT for small frames, COPY for frames of copy_threshold rows or more.
+        Parallel (workers > 1), atomic and batch_size="auto" loads always use the batched INSERT path."""
+        if (workers == 1 and not atomic and batch_size != "auto"
+                and self.copy_threshold is not None and len(df) >= self.copy_threshold):
+            return self.copy_dataframe(table, df, chunk_size=max(batch_size, 10_000))
+        return super().insert_dataframe(table, df, batch_size, workers, atomic)
+
+    def _bulk_insert(self, table: str, df: pd.DataFrame, chunk_size: int) -> dict[str, Any]:
+        return self.copy_dataframe(table, df, chunk_size=chunk_size)
+
+    @instrumented
+    def get_existing_hashes(self, table: str, hashes: Sequence[str], hash_column: str = "row_hash", chunk_size: int = 500) -> set[str]:
+        """IN lists for small sets; otherwise COPY the hashes into a temp table and join once."""
+        if len(hashes) <= chunk_size:
+            return super().get_existing_hashes(table, hashes, hash_column, chunk_size)
+        incoming = f"_incoming_hashes_{uuid.uuid4().hex[:12]}"
+        with self._connection() as conn, self._atomic(conn):
+            with self._cursor(conn, row_factory=tuple_row) as cur:
+                cur.execute(f"CREATE TEMP TABLE {incoming} (h text PRIMARY KEY) ON COMMIT DROP")
+                with cur.copy(f"COPY {incoming} (h) FROM STDIN") as copy:
+                    for row_hash in set(hashes):
+                        copy.write_row((row_hash,))
+                cur.execute(f"SELECT i.h FROM {incoming} i WHERE EXISTS (SELECT 1 FROM {table} t WHERE t.{hash_column} = i.h)")
+                existing = {row[0] for row in cur.fetchall()}
+                cur.execute(f"DROP TABLE {incoming}")
+        return existing
+
+    @instrumented
+    @invalidates
+    def copy_rows(
+        self,
+        table: str,
+        columns: Sequence[str],
+        rows: Iterable[Sequence[Any]],
+        format: str = "text",
+        chunk_size: int = 10_000,
+        stage: bool = False,
+        conflict_columns: Sequence[str] | None = None,
+    ) -> int:
+        """
+        Stream rows into a table with COPY ... FROM STDIN.
+        Args:
+            table: Target table ("schema.table").
+            columns: Target columns, in the order values appear in each row.
+            rows: Any iterable of row sequences; consumed lazily, chunk_size rows at a time.
+            format: "text" (forgiving, server parses values) or "binary" (typed from get_table_schema).
+            chunk_size: Rows per COPY statement; each chunk is committed unless stage=True.
+            stage: COPY into a temporary table and merge into `table` in a single transaction.
+            conflict_columns: With stage=True, skip rows that conflict on these columns.
+        Returns:
+            Number of rows written to `table`. Raises on error; the failed chunk (with stage=True,
+            everything) is rolled back, and the chunks committed before it stay.
+        """
+        types = self._copy_types(table, columns, format)
+        rows_iter = iter(rows)
+        total = 0
+        with self._connection() as conn:
+            if not stage:
+                while chunk := list(islice(rows_iter, chunk_size)):
+                    with self._atomic(conn):
+                        total += self._copy_chunk(conn, table, columns, types, chunk, format)
+                return total
+            try:
+                target = self._create_staging_table(conn, table)
+                while chunk := list(islice(rows_iter, chunk_size)):
+                    self._copy_chunk(conn, target, columns, types, chunk, format)
+                total = self._merge_staging_table(conn, target, table, columns, conflict_columns)
+            except Exception as e:
+                self._rollback(conn, e)
+                raise
+            self._commit(conn)
+        return total
+
+    @instrumented
+    @invalidates
+    def copy_dataframe(
+        self,
+        table: str,
+        df: pd.DataFrame,
+        format: str = "text",
+        chunk_size: int = 10_000,
+        stage: bool = False,
+        conflict_columns: Sequence[str] | None = None,
+    ) -> dict[str, Any]:
+        """
+        Load a DataFrame with COPY, normalizing chunk_size rows at a time.
+
+        Without staging every chunk is its own transaction; a chunk that COPY rejects
+        is retried with batched INSERTs so the report lists the failing rows.
+        With stage=True the whole frame is merged in one transaction and any COPY
+        error is raised; rows skipped because of conflict_columns are counted as "skipped".
+
+        Returns:
+            Same report as insert_dataframe (plus "skipped" when staging).
+        """
+        schema = self.get_table_schema(table)
+        columns = [col for col in schema if col in df.columns]
+        attempted = len(df)
+        if attempted == 0 or not columns:
+            return super().insert_dataframe(table, df)
+
+        types = self._copy_types(table, columns, format, schema)
+        insert_query = self._insert_sql(table, columns)
+        errors: list[tuple[int, Exception]] = []
+        succeeded = 0
+        staged = 0
+        with self._connection() as conn:
+            try:
+                target = self._create_staging_table(conn, table) if stage else table
+                for start in range(0, attempted, chunk_size):
+                    chunk = df.iloc[start:start + chunk_size]
+                    rows, bad_rows = self._normalize_frame(chunk, columns, schema, first_row=start + 1)
+                    errors.extend(bad_rows)
+                    failed_positions = {pos for pos, _ in bad_rows}
+                    pending = [(pos, row) for pos, row in enumerate(rows, start=start + 1) if pos not in failed_positions]
+                    if not pending:
+                        continue
+                    if stage:
+                        staged += self._copy_chunk(conn, target, columns, types, [row for _, row in pending], format)
+                        continue
+                    try:
+                        with self._atomic(conn):
+                            copied = self._copy_chunk(conn, target, columns, types, [row for _, row in pending], format)
+                        succeeded += copied
+                    except Exception:
+                        succeeded += self._insert_batch(conn, insert_query, pending, errors)
+                if stage:
+                    succeeded = self._merge_staging_table(conn, target, table, columns, conflict_columns)
+            except Exception as e:
+                if stage:
+                    self._rollback(conn, e)
+                raise
+            if stage:
+                self._commit(conn)
+
+        errors.sort(key=lambda e: e[0])
+        skipped = staged - succeeded if stage else 0
+        result = {
+            "attempted": attempted,
+            "succeeded": succeeded,
+            "failed": attempted - succeeded - skipped,
+            "errors": errors,
+        }
+        if stage:
+            result["skipped"] = skipped
+        return result
+
+    def _copy_types(self, table: str, columns: Sequence[str], format: str, schema: dict[str, str] | None = None) -> list[str]:
+        if format not in ("text", "binary"):
+            raise ValueError(f"Unsupported COPY format: {format!r} (use 'text' or 'binary')")
+        schema = schema if schema is not None else self.get_table_schema(table)
+        missing = [col for col in columns if col not in schema]
+        if missing:
+            raise ValueError(f"Columns not in {table}: {missing}")
+        types = [schema[col] for col in columns]
+        if format == "binary":
+            unknown = [t for t in types if postgres.types.get(t) is None]
+            if unknown:
+                raise ValueError(f"Binary COPY cannot map types {unknown}; use format='text'")
+        return types
+
+    def _copy_chunk(self, conn, target: str, columns: Sequence[str], types: list[str], rows: list[Sequence[Any]], format: str) -> int:
+        query = f"COPY {target} ({', '.join(columns)}) FROM STDIN (FORMAT {format.upper()})"
+        count = len(rows)
+        with self._cursor(conn) as cur:
+            with cur.copy(query) as copy:
+                if format == "binary":
+                    copy.set_types(types)
+                    # the binary numeric dumper only accepts Decimal
+                    numeric = [i for i, t in enumerate(types) if t in ("numeric", "decimal")]
+                    if numeric:
+                        rows = (self._decimal_row(row, numeric) for row in rows)
+                for row in rows:
+                    copy.write_row(row)
+        return count
+
+    @staticmethod
+    def _decimal_row(row: Sequence[Any], numeric: list[int]) -> list[Any]:
+        row = list(row)
+        for i in numeric:
+            if isinstance(row[i], float):
+                row[i] = Decimal(repr(row[i]))
+        return row
+
+    ## Apache Arrow over COPY ... (FORMAT CSV) ##
+    @instrumented
+    def select_arrow_batches(self, query: str, params: tuple = (), batch_size: int = 65_536) -> Iterator[Any]:
+        """COPY (query) TO STDOUT as CSV, parsed by pyarrow's streaming CSV reader, so rows never
+        become Python objects. Column types come from the query's result description."""
+        pa = require_pyarrow()
+        import pyarrow.csv as pcsv
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        query = query.strip().rstrip(";")
+        with self._connection() as conn:
+            with self._cursor(conn, row_factory=tuple_row) as cur:
+                cur.execute(f"SELECT * FROM ({query}) AS q LIMIT 0", params)
+                columns = [col.name for col in cur.description]
+                types = [self._arrow_type(col.type_code) for col in cur.description]
+                with cur.copy(f"COPY ({query}) TO STDOUT (FORMAT CSV)", params) as copy:
+                    chunks = iter(copy)
+                    first = next(chunks, None)
+                    if first is None:
+                        yield pa.RecordBatch.from_arrays([pa.array([], type=t or pa.string()) for t in types], names=columns)
+                        return
+                    reader = pcsv.open_csv(
+                        io.BufferedReader(ChunkReader(chain([first], chunks)), buffer_size=1 << 20),
+                        read_options=pcsv.ReadOptions(column_names=columns, use_threads=False),
+                        # COPY writes NULL as an unquoted empty field and booleans as t/f
+                        convert_options=pcsv.ConvertOptions(
+                            column_types={name: t for name, t in zip(columns, types) if t is not None},
+                            true_values=["t"], false_values=["f"],
+                            strings_can_be_null=True, quoted_strings_can_be_null=False,
+                        ),
+                    )
+                    for batch in reader:
+                        for start in range(0, batch.num_rows, batch_size):
+                            yield batch.slice(start, batch_size)
+
+    def _insert_arrow_batch(self, conn, table: str, columns: list[str], batch: Any, first_row: int, errors: list[tuple[int, Exception]]) -> int:
+        """COPY the batch as CSV written by pyarrow; a rejected batch is retried with batched INSERTs."""
+        try:
+            with self._atomic(conn):
+                with self._cursor(conn) as cur:
+                    with cur.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN (FORMAT CSV)") as copy:
+                        copy.write(batch_csv(batch))
+            return batch.num_rows
+        except Exception:
+            return super()._insert_arrow_batch(conn, table, columns, batch, first_row, errors)
+
+    def _arrow_type(self, type_code: int) -> Any:
+        if type_code == 1184:
+            # timestamptz is written with its offset; keep it as a UTC timestamp
+            return require_pyarrow().timestamp("us", tz="UTC")
+        return arrow_type(self._type_kind(type_code))
+
+    def _create_staging_table(self, conn, table: str) -> str:
+        staging = f"_copy_stage_{uuid.uuid4().hex[:12]}"
+        with self._cursor(conn) as cur:
+            cur.execute(f"CREATE TEMP TABLE {staging} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+        return staging
+
+    def _merge_staging_table(self, conn, staging: str, table: str, columns: Sequence[str], conflict_columns: Sequence[str] | None) -> int:
+        col_str = ", ".join(columns)
+        query = f"INSERT INTO {table} ({col_str}) SELECT {col_str} FROM {staging}"
+        if conflict_columns:
+            query += f" ON CONFLICT ({', '.join(conflict_columns)}) DO NOTHING"
+        with self._cursor(conn) as cur:
+            cur.execute(query)
+            return cur.rowcount
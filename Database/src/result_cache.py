@@ -0,0 +1,374 @@
+import functools
+import hashlib
+import json
+import os
+import pickle
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable
+
+import pandas as pd
+
+from Database.src.arrow import require_pyarrow
+
+# Table names following FROM / JOIN / INTO / UPDATE / TABLE, with optional schema and quoting;
+# further names in a comma-separated FROM list are picked up by _FROM_LIST_RE
+_NAME = r"""(?:[\w$]+|"[^"]+"|\[[^\]]+\]|`[^`]+`)(?:\.(?:[\w$]+|"[^"]+"|\[[^\]]+\]|`[^`]+`))*"""
+_TABLE_RE = re.compile(rf"\b(?:from|join|into|update|table)\s+({_NAME})", re.IGNORECASE)
+_FROM_LIST_RE = re.compile(rf"\bfrom\s+{_NAME}(?:\s+(?:as\s+)?[\w$]+)?((?:\s*,\s*{_NAME}(?:\s+(?:as\s+)?(?!where\b|join\b|on\b)[\w$]+)?)+)", re.IGNORECASE)
+_LIST_ITEM_RE = re.compile(rf",\s*({_NAME})")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(query: str) -> str:
+    """Collapse whitespace and drop a trailing semicolon, so formatting does not split cache entries."""
+    return _SPACE_RE.sub(" ", query).strip().rstrip(";").rstrip()
+
+
+def tables_in(query_or_table: str) -> frozenset[str]:
+    """Lower-case bare table names a statement touches; a plain identifier is taken as a table name.
+    Schemas are dropped, so invalidation errs on the side of dropping too much."""
+    text = query_or_table.strip()
+    if not _SPACE_RE.search(text):
+        names = [text]
+    else:
+        names = _TABLE_RE.findall(text)
+        for tail in _FROM_LIST_RE.findall(text):
+            names.extend(_LIST_ITEM_RE.findall(tail))
+    return frozenset(name.split(".")[-1].strip('"[]`').lower() for name in names if name)
+
+
+def estimate_bytes(value: Any) -> int:
+    """Approximate memory held by a select/select_df result."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, list):
+        total = sys.getsizeof(value)
+        for row in value:
+            total += sys.getsizeof(row)
+            items = row.values() if isinstance(row, dict) else row
+            total += sum(sys.getsizeof(v) for v in items)
+        return total
+    return sys.getsizeof(value)
+
+
+def _copy(value: Any) -> Any:
+    # callers may mutate what they get back; the cached value must not change with it
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    if isinstance(value, list):
+        return [dict(row) if isinstance(row, dict) else row for row in value]
+    return value
+
+
+class _Entry:
+    __slots__ = ("value", "tables", "expires", "size")
+
+    def __init__(self, value: Any, tables: frozenset[str], expires: float, size: int):
+        self.value = value
+        self.tables = tables
+        self.expires = expires
+        self.size = size
+
+
+class ResultCache:
+    """Thread-safe, byte-bounded LRU cache of select/select_df results.
+
+    Entries expire after a TTL (per call via cache_ttl, per table via table_ttl, else ttl)
+    and are dropped whenever a write touches one of the tables the query reads. With
+    disk_dir set, results are also written to that directory and survive restarts: as
+    Parquet files (needs pyarrow), or pickled with disk_format="pickle", which is only
+    safe for a private directory since unpickling runs code from the files.
+    """
+
+    DISK_FORMATS = {"parquet": ".parquet", "pickle": ".pkl"}
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 60.0,
+        table_ttl: dict[str, float] | None = None,
+        disk_dir: str | None = None,
+        disk_format: str = "parquet",
+    ):
+        """
+        Args:
+            max_bytes: Memory bound; least recently used entries are evicted beyond it.
+            ttl: Default seconds a result stays valid.
+            table_ttl: {table: seconds} for queries reading that table (the smallest applies),
+                e.g. {"currency": 3600} for reference data.
+            disk_dir: Directory for the on-disk tier. None keeps results in memory only.
+            disk_format: "parquet" (results Arrow cannot hold stay in memory only) or "pickle"
+                (any result; never point it at a directory others can write to).
+        """
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be at least 1")
+        if disk_format not in self.DISK_FORMATS:
+            raise ValueError(f"disk_format must be one of {sorted(self.DISK_FORMATS)}")
+        if disk_dir is not None and disk_format == "parquet":
+            require_pyarrow("ResultCache(disk_dir=...) Parquet files")
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.table_ttl = {name.lower(): seconds for name, seconds in (table_ttl or {}).items()}
+        self.disk_dir = disk_dir
+        self.disk_format = disk_format
+        self._suffix = self.DISK_FORMATS[disk_format]
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.invalidations = 0
+        # table -> number of invalidations, so a result read before one is not cached after it
+        self._versions: dict[str, int] = {}
+        # on-disk index: file stem -> {"tables": [...], "expires": wall-clock seconds}
+        self._disk_index: dict[str, dict[str, Any]] = {}
+        if disk_dir is not None:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    ### Public API ###
+    def get(self, key: Hashable) -> Any | None:
+        """Return a copy of the cached result, or None when missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _copy(entry.value)
+            if entry is not None:
+                self._drop(key)
+        value = self._disk_get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        return _copy(value)
+
+    def version(self, tables: Iterable[str]) -> int:
+        """Invalidation count of `tables`; take it before running a query and pass it to put()."""
+        with self._lock:
+            return sum(self._versions.get(t, 0) for t in tables)
+
+    def put(self, key: Hashable, value: Any, tables: Iterable[str], version: int | None = None,
+            ttl: float | None = None) -> None:
+        """Cache value for key for `ttl` seconds (None: ttl_for(tables)). With `version` (see version()),
+        a result whose tables were invalidated while the query ran is not cached: it may predate the write."""
+        tables = frozenset(tables)
+        if ttl is None:
+            ttl = self.ttl_for(tables)
+        if ttl <= 0:
+            return
+        size = estimate_bytes(value)
+        if size > self.max_bytes:
+            return
+        value = _copy(value)
+        with self._lock:
+            if version is not None and sum(self._versions.get(t, 0) for t in tables) != version:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Entry(value, tables, time.monotonic() + ttl, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+        self._disk_put(key, value, tables, ttl)
+
+    def ttl_for(self, tables: Iterable[str]) -> float:
+        overrides = [self.table_ttl[t] for t in tables if t in self.table_ttl]
+        return min(overrides) if overrides else self.ttl
+
+    def invalidate_tables(self, tables: Iterable[str]) -> int:
+        """Drop every result that reads one of `tables`. Returns the number dropped."""
+        tables = frozenset(t.lower() for t in tables)
+        if not tables:
+            return 0
+        with self._lock:
+            for t in tables:
+                self._versions[t] = self._versions.get(t, 0) + 1
+            doomed = [key for key, entry in self._entries.items() if entry.tables & tables]
+            for key in doomed:
+                self._drop(key)
+            stems = [stem for stem, meta in self._disk_index.items() if tables.intersection(meta["tables"])]
+            for stem in stems:
+                self._disk_remove(stem)
+            if stems:
+                self._save_disk_index()
+            self.invalidations += len(doomed)
+        return len(doomed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            for stem in list(self._disk_index):
+                self._disk_remove(stem)
+            if self.disk_dir is not None:
+                self._save_disk_index()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "invalidations": self.invalidations, "disk_entries": len(self._disk_index)}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    ### Private helper methods ###
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    @staticmethod
+    def _stem(key: Hashable) -> str:
+        return hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+
+    def _disk_get(self, key: Hashable) -> Any | None:
+        if self.disk_dir is None:
+            return None
+        stem = self._stem(key)
+        with self._lock:
+            meta = self._disk_index.get(stem)
+            if meta is None:
+                return None
+            if meta["expires"] <= time.time():
+                self._disk_remove(stem)
+                self._save_disk_index()
+                return None
+        try:
+            stored_key, value = self._read_file(os.path.join(self.disk_dir, stem + self._suffix))
+        except (OSError, ValueError, pickle.PickleError, EOFError):
+            return None
+        if stored_key != repr(key):
+            return None
+        # promote to memory for the remaining lifetime
+        remaining = meta["expires"] - time.time()
+        size = estimate_bytes(value)
+        with self._lock:
+            if size <= self.max_bytes and key not in self._entries:
+                self._entries[key] = _Entry(value, frozenset(meta["tables"]), time.monotonic() + remaining, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    self._drop(next(iter(self._entries)))
+        return value
+
+    def _disk_put(self, key: Hashable, value: Any, tables: frozenset[str], ttl: float) -> None:
+        if self.disk_dir is None:
+            return
+        stem = self._stem(key)
+        path = os.path.join(self.disk_dir, stem + self._suffix)
+        tmp = f"{path}.tmp"
+        if not self._write_file(tmp, repr(key), value):
+            return
+        os.replace(tmp, path)
+        with self._lock:
+            self._disk_index[stem] = {"tables": sorted(tables), "expires": time.time() + ttl}
+            self._save_disk_index()
+
+    def _disk_remove(self, stem: str) -> None:
+        self._disk_index.pop(stem, None)
+        try:
+            os.remove(os.path.join(self.disk_dir, stem + self._suffix))
+        except OSError:
+            pass
+
+    def _write_file(self, path: str, key: str, value: Any) -> bool:
+        """Write (key, value) to path. False when the Parquet tier cannot hold value."""
+        if self.disk_format == "pickle":
+            with open(path, "wb") as f:
+                pickle.dump((key, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            return True
+        pa = require_pyarrow()
+        import pyarrow.parquet as pq
+        try:
+            if isinstance(value, pd.DataFrame):
+                table, kind = pa.Table.from_pandas(value), b"frame"
+            elif isinstance(value, list) and all(isinstance(row, dict) for row in value):
+                table, kind = pa.Table.from_pylist(value), b"rows"
+            else:
+                return False
+        except (pa.ArrowException, TypeError, ValueError):
+            # e.g. a column mixing types
+            return False
+        metadata = {**(table.schema.metadata or {}), b"result_cache_key": key.encode("utf-8"), b"result_cache_kind": kind}
+        pq.write_table(table.replace_schema_metadata(metadata), path)
+        return True
+
+    def _read_file(self, path: str) -> tuple[str, Any]:
+        if self.disk_format == "pickle":
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        pa = require_pyarrow()
+        import pyarrow.parquet as pq
+        try:
+            table = pq.read_table(path)
+        except pa.ArrowException as e:
+            raise ValueError(f"unreadable cache file {path}") from e
+        metadata = table.schema.metadata or {}
+        key = metadata.get(b"result_cache_key", b"").decode("utf-8")
+        if metadata.get(b"result_cache_kind") == b"frame":
+            return key, table.to_pandas()
+        return key, table.to_pylist()
+
+    def _load_disk_index(self) -> None:
+        path = os.path.join(self.disk_dir, "index.json")
+        try:
+            with open(path, encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        self._disk_index = {stem: meta for stem, meta in index.items() if meta.get("expires", 0) > now}
+
+    def _save_disk_index(self) -> None:
+        path = os.path.join(self.disk_dir, "index.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._disk_index, f)
+        os.replace(tmp, path)
+
+
+### Method decorators used by the backends ###
+def cached_read(method: Callable) -> Callable:
+    """Serve a select-style method (first argument: query or table) from db.result_cache.
+    The wrapped method takes an extra keyword cache_ttl: seconds to keep this result (default: see ResultCache.ttl_for)."""
+    @functools.wraps(method)
+    def wrapper(self, query_or_table: str, *args, cache_ttl: float | None = None, **kwargs):
+        cache = self.result_cache
+        if cache is None or self._in_transaction_block():
+            return method(self, query_or_table, *args, **kwargs)
+        key = (self.db_type.value, f"{self.host}:{self.port}", self.database, method.__name__,
+               normalize_sql(query_or_table), repr(args), repr(sorted(kwargs.items())))
+        tables = tables_in(query_or_table)
+        version = cache.version(tables)
+        result = cache.get(key)
+        if result is None:
+            result = method(self, query_or_table, *args, **kwargs)
+            cache.put(key, result, tables, version, cache_ttl)
+        return result
+    return wrapper
+
+
+def invalidates(method: Callable) -> Callable:
+    """Drop cached results for the tables a write method (first argument: table or statement) touches.
+    Inside transaction() the tables are only recorded; they are dropped when the transaction commits."""
+    @functools.wraps(method)
+    def wrapper(self, query_or_table: str, *args, **kwargs):
+        if self.result_cache is None:
+            return method(self, query_or_table, *args, **kwargs)
+        tables = tables_in(query_or_table)
+        # recorded up front, so an autocommit_every commit inside the method already covers them
+        deferred = self._defer_invalidation(tables)
+        try:
+            return method(self, query_or_table, *args, **kwargs)
+        finally:
+            if not deferred and self.result_cache is not None:
+                self.result_cache.invalidate_tables(tables)
+    return wrapper
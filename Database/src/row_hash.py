@@ -0,0 +1,110 @@
+import hashlib
+import os
+import threading
+from typing import Any, Iterable, Sequence
+
+import pandas as pd
+
+# Row hash: sha256 over the normalized values joined with \x1f, NULL written as <NULL>.
+# row_hashes() is the column-at-a-time version of stable_row_hash(); both give the same digest.
+NULL_TOKEN = "<NULL>"
+SEPARATOR = "\x1f"
+
+
+def stable_row_hash(values: Sequence[Any]) -> str:
+    parts = []
+    for v in values:
+        if v is None or (isinstance(v, float) and pd.isna(v)):
+            parts.append(NULL_TOKEN)
+        else:
+            parts.append(str(v))
+    return hashlib.sha256(SEPARATOR.join(parts).encode("utf-8")).hexdigest()
+
+
+def row_hashes(columns: Sequence[Sequence[Any]], length: int) -> list[str]:
+    """Hash rows given column-wise (one list of normalized values per column).
+
+    The text of each row is built with Series.str.cat instead of a per-row apply;
+    only the sha256 call itself runs per row.
+    """
+    if length == 0:
+        return []
+    if not columns:
+        return [stable_row_hash(())] * length
+    text = []
+    for values in columns:
+        series = pd.Series(values, dtype=object)
+        text.append(series.astype(str).mask(series.isna(), NULL_TOKEN))
+    joined = text[0].str.cat(text[1:], sep=SEPARATOR) if len(text) > 1 else text[0]
+    sha256 = hashlib.sha256
+    return [sha256(s.encode("utf-8")).hexdigest() for s in joined.tolist()]
+
+
+class RowHashCache:
+    """Thread-safe set of row hashes known to exist, per table, optionally persisted to a file.
+
+    A hit lets insert_dataframe_dedup skip the database lookup for that row. The set
+    is exact (no false positives), so a hit never drops a new row. Rows deleted from
+    the table behind the cache's back stay cached until invalidate() is called.
+    """
+
+    def __init__(self, path: str | None = None):
+        """
+        Args:
+            path: File the cache is loaded from and saved to (one "table<TAB>hash" per line).
+                None keeps the cache in memory only.
+        """
+        self.path = path
+        self._tables: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def filter_new(self, table: str, hashes: Iterable[str]) -> list[str]:
+        """Return the hashes not known for table, in input order."""
+        with self._lock:
+            known = self._tables.get(table, set())
+            hashes = list(hashes)
+            new = [h for h in hashes if h not in known]
+            self.hits += len(hashes) - len(new)
+            self.misses += len(new)
+        return new
+
+    def add(self, table: str, hashes: Iterable[str]) -> None:
+        with self._lock:
+            self._tables.setdefault(table, set()).update(hashes)
+
+    def invalidate(self, table: str | None = None) -> None:
+        """Forget one table, or everything when table is None."""
+        with self._lock:
+            if table is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(table, None)
+
+    def load(self) -> None:
+        with self._lock, open(self.path, encoding="utf-8") as f:
+            for line in f:
+                table, _, row_hash = line.rstrip("\n").partition("\t")
+                if row_hash:
+                    self._tables.setdefault(table, set()).add(row_hash)
+
+    def save(self) -> None:
+        """Write the cache to `path` (atomically, through a temporary file)."""
+        if self.path is None:
+            return
+        tmp = f"{self.path}.tmp"
+        with self._lock, open(tmp, "w", encoding="utf-8") as f:
+            for table, hashes in self._tables.items():
+                f.writelines(f"{table}\t{h}\n" for h in hashes)
+        os.replace(tmp, self.path)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"tables": len(self._tables), "entries": sum(len(h) for h in self._tables.values()),
+                    "hits": self.hits, "misses": self.misses}
+
+    def __len__(self) -> int:
+        return sum(len(h) for h in self._tables.values())
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SchemaCache:
+    """Thread-safe LRU cache of table schemas with a time-to-live.
+
+    Keys are tuples such as (backend, host, database, schema, table); values are
+    the {column_name: data_type} dicts returned by get_table_schema. One instance
+    can be shared by several DBBase objects.
+    """
+
+    def __init__(self, ttl: float | None = 300.0, max_entries: int = 256):
+        """
+        Args:
+            ttl: Seconds an entry stays valid. None keeps entries until evicted or invalidated.
+            max_entries: LRU bound on the number of cached tables.
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Hashable, tuple[float, dict[str, str]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> dict[str, str] | None:
+        """Return a copy of the cached schema, or None when missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry[0]):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, key: Hashable, schema: dict[str, str]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), dict(schema))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key: Hashable, load: Callable[[], dict[str, str]]) -> dict[str, str]:
+        """Return the cached schema or call `load` and cache its (non-empty) result."""
+        schema = self.get(key)
+        if schema is None:
+            schema = load()
+            if schema:
+                # an empty schema usually means the table does not exist (yet); do not pin that
+                self.put(key, schema)
+        return schema
+
+    async def get_or_load_async(self, key: Hashable, load: Callable[[], Awaitable[dict[str, str]]]) -> dict[str, str]:
+        """get_or_load for a coroutine function `load` (the asyncio classes)."""
+        schema = self.get(key)
+        if schema is None:
+            schema = await load()
+            if schema:
+                self.put(key, schema)
+        return schema
+
+    def invalidate(self, match: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key satisfies `match`. Returns the number dropped."""
+        with self._lock:
+            doomed = [key for key in self._entries if match(key)]
+            for key in doomed:
+                del self._entries[key]
+        return len(doomed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "ttl": self.ttl, "max_entries": self.max_entries}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and time.monotonic() - stored_at > self.ttl
+
+
+# Cache shared by instances that opt in with DatabaseFactory.create(..., schema_cache=SHARED_SCHEMA_CACHE)
+SHARED_SCHEMA_CACHE = SchemaCache()
@@ -1,11 +1,82 @@
 import pytds
-from Database.src.dbbase import DBBase
+from pytds import tds_base, tds_types
+from Database.src.dbbase import DBBase, DatabaseType
+from Database.src.result_cache import cached_read, invalidates
+from Database.src.instrumentation import instrumented
+from Database.src.arrow import batch_rows
 from typing import Any
+from datetime import date, datetime
+import time
 import pandas as pd
 
+# cursor.description type_code -> column kind used by select_df
+TDS_TYPE_KINDS = {
+    tds_base.SYBINTN: "int", tds_base.SYBINT1: "int", tds_base.SYBINT2: "int",
+    tds_base.SYBINT4: "int", tds_base.SYBINT8: "int",
+    tds_base.SYBFLTN: "float", tds_base.SYBFLT8: "float", tds_base.SYBREAL: "float",
+    tds_base.SYBBIT: "bool", tds_base.SYBBITN: "bool",
+    tds_base.SYBDATETIME: "datetime", tds_base.SYBDATETIMN: "datetime",
+    tds_base.SYBDATETIME4: "datetime", tds_base.SYBMSDATETIME2: "datetime",
+    tds_base.XSYBNVARCHAR: "str", tds_base.XSYBVARCHAR: "str",
+    tds_base.XSYBNCHAR: "str", tds_base.XSYBCHAR: "str",
+}
+
+
+class _TupleRows:
+    """Cursor wrapper returning tuple rows from a dict-row (as_dict=True) pytds cursor.
+
+    pytds fixes the row type per connection, and connect() keeps dict rows for callers;
+    the column-wise paths (select_df, select_numpy, the streaming selects) need tuples.
+    """
+
+    def __init__(self, cur):
+        self._cursor = cur
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._cursor.close()
+        return False
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return tuple(row.values()) if isinstance(row, dict) else row
+
+    def fetchmany(self, *args, **kwargs):
+        return [tuple(row.values()) if isinstance(row, dict) else row for row in self._cursor.fetchmany(*args, **kwargs)]
+
+    def fetchall(self):
+        return [tuple(row.values()) if isinstance(row, dict) else row for row in self._cursor.fetchall()]
+
+
+# INFORMATION_SCHEMA.COLUMNS.DATA_TYPE -> (TDS column type, Python types its serializer accepts)
+TDS_TYPES: dict[str, tuple[Any, tuple[type, ...]]] = {
+    "bigint": (tds_types.BigIntType, (int, bool)),
+    "int": (tds_types.IntType, (int, bool)),
+    "smallint": (tds_types.SmallIntType, (int, bool)),
+    "tinyint": (tds_types.TinyIntType, (int, bool)),
+    "bit": (tds_types.BitType, (bool, int)),
+    "float": (tds_types.FloatType, (float, int)),
+    "real": (tds_types.RealType, (float, int)),
+    "datetime": (tds_types.DateTimeType, (datetime,)),
+    "smalldatetime": (tds_types.SmallDateTimeType, (datetime,)),
+    "datetime2": (tds_types.DateTime2Type, (datetime,)),
+    "date": (tds_types.DateType, (date,)),
+}
+
 class MSSQLDatabase(DBBase):
     """Microsoft SQL Server implementation of BaseDatabase (no ODBC)."""
 
+    db_type = DatabaseType.MSSQL
+    default_schema = "dbo"
+    # 2100 parameters per request, 1000 rows per VALUES list
+    max_params = 2099
+    max_rows_per_statement = 1000
+
     def __init__(self, host, database, user, password, port=1433):
         super().__init__(host, database, user, password, port)
 
@@ -20,31 +91,37 @@ class MSSQLDatabase(DBBase):
             bytes_to_unicode=False
         )
 
+    @instrumented
+    @cached_read
     def select(self, query: str, params: tuple = ()) -> list[dict[str, Any]]:
-        with self.connect() as conn:
-            with conn.cursor() as cur:
+        with self._connection() as conn:
+            with self._cursor(conn) as cur:
                 cur.execute(query, params)
                 return cur.fetchall()
     
+    @instrumented
+    @cached_read
     def select_df(self, query: str, params: tuple = (), include_columns_when_empty: bool = False) -> pd.DataFrame:
-    #def select_df(self, query: str, params: tuple = ()) -> pd.DataFrame:
-        if include_columns_when_empty:
-            return self.select_df_with_columns(query, params)
-        
-        with self.connect() as conn:
-            with conn.cursor() as cur:
+        """
+        Execute a SELECT query and return a DataFrame built column by column from tuple rows.
+        Columns are always kept; include_columns_when_empty is accepted for compatibility.
+        """
+        with self._connection() as conn:
+            with self._stream_cursor(conn) as cur:
                 cur.execute(query, params)
-                rows = cur.fetchall()
-        return pd.DataFrame(rows)
+                return self._frame_from_cursor(cur)
 
     def select_df_with_columns(self, query: str, params: tuple = ()) -> pd.DataFrame:
-        with self.connect() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                rows = cur.fetchall()
-                columns = [col[0] for col in cur.description] if cur.description else []
-        return pd.DataFrame(rows, columns=columns)
+        return self.select_df(query, params, include_columns_when_empty=True)
+
+    def _type_kind(self, type_code):
+        return TDS_TYPE_KINDS.get(type_code)
+
+    def _stream_cursor(self, conn):
+        return _TupleRows(self._cursor(conn))
 
+    @instrumented
+    @cached_read
     def select_where(
             self,
             query_or_table: str,
@@ -57,8 +134,8 @@ class MSSQLDatabase(DBBase):
             - If `columns` or `where` are provided, builds a query automatically.
             - Otherwise, treats the first argument as a raw SQL string.
             """
-            with self.connect() as conn:
-                with conn.cursor() as cur:
+            with self._connection() as conn:
+                with self._cursor(conn) as cur:
                     if columns is not None or where is not None:
                         col_str = ", ".join(columns) if columns else "*"
                         query = f"SELECT {col_str} FROM {query_or_table}"
@@ -70,34 +147,88 @@ class MSSQLDatabase(DBBase):
                     cur.execute(query, params)
                     return cur.fetchall()
 
+    @instrumented
+    @invalidates
     def execute(self, query: str, params: tuple = ()) -> None:
         try:
-            with self.connect() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(query, params)
-                conn.commit()
+            with self._connection() as conn:
+                try:
+                    with self._cursor(conn) as cur:
+                        cur.execute(query, params)
+                except Exception as e:
+                    self._rollback(conn, e)
+                    raise
+                self._commit(conn)
             return {"success": True, "rows_affected": cur.rowcount, "error": None}            
         except Exception as e:
             return {"success": False, "rows_affected": 0, "error": str(e)}
     
+    @instrumented
+    @invalidates
     def insert(self, table: str, data: dict[str, Any]) -> None:
-        columns = ", ".join(data.keys())
-        placeholders = ", ".join(["%s"] * len(data))
-        values = tuple(data.values())
-        query = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
-        return self.execute(query, values)
+        return self._execute_statement(self._insert_sql(table, list(data)), tuple(data.values()))
+
+    def _insert_many(self, cur, query: str, rows: list[tuple]) -> None:
+        """
+        pytds executemany is one round trip per row, so send multi-row VALUES instead.
+        SQL Server allows at most 2100 parameters and 1000 rows per VALUES list.
+        """
+        head, values = query.split(" VALUES ", 1)
+        width = max(len(rows[0]), 1) if rows else 1
+        per_statement = max(1, min(self.max_rows_per_statement, self.max_params // width))
+        for start in range(0, len(rows), per_statement):
+            chunk = rows[start:start + per_statement]
+            sql = f"{head} VALUES " + ", ".join([values] * len(chunk))
+            cur.execute(sql, tuple(v for row in chunk for v in row))
 
+    @instrumented
+    @invalidates
     def update(self, table: str, data: dict[str, Any], where: str, params: tuple = ()) -> None:
-        set_clause = ", ".join([f"{col} = %s" for col in data.keys()])
-        values = tuple(data.values()) + params
-        query = f"UPDATE {table} SET {set_clause} WHERE {where}"
-        return self.execute(query, values)
-    
+        return self._execute_statement(self._update_sql(table, list(data), where), tuple(data.values()) + params)
+
+    @instrumented
+    @invalidates
     def delete(self, table: str, where: str, params: tuple = ()) -> None:
-        query = f"DELETE FROM {table} WHERE {where}"
-        return self.execute(query, params)
+        return self._execute_statement(self._delete_sql(table, where), params)
     
-    def get_table_schema(self, table: str) -> dict[str, str]:
+    ## Savepoints: T-SQL spells them SAVE/ROLLBACK TRANSACTION and has no release ##
+    def _savepoint(self, conn, session) -> str:
+        session.savepoints += 1
+        name = f"sp_{session.savepoints}"
+        self._run_sql(conn, f"SAVE TRANSACTION {name}")
+        return name
+
+    def _rollback_savepoint(self, conn, name: str) -> None:
+        self._run_sql(conn, f"ROLLBACK TRANSACTION {name}")
+
+    def _release_savepoint(self, conn, name: str) -> None:
+        pass
+
+    def _upsert_batch(self, cur, table: str, columns, key_columns, update_columns, rows: list[tuple]) -> tuple[int, int]:
+        """MERGE from a VALUES table constructor; OUTPUT $action tells inserts from updates."""
+        on = " AND ".join(f"target.{col} = source.{col}" for col in key_columns)
+        matched = (" WHEN MATCHED THEN UPDATE SET " + ", ".join(f"target.{col} = source.{col}" for col in update_columns)
+                   if update_columns else "")
+        query = (
+            f"MERGE INTO {table} WITH (HOLDLOCK) AS target "
+            f"USING (VALUES {self._values_sql(len(columns), len(rows))}) AS source ({', '.join(columns)}) "
+            f"ON {on}{matched} "
+            f"WHEN NOT MATCHED THEN INSERT ({', '.join(columns)}) VALUES ({', '.join(f'source.{col}' for col in columns)}) "
+            f"OUTPUT $action;"
+        )
+        cur.execute(query, tuple(v for row in rows for v in row))
+        actions = [row[0] if isinstance(row, (tuple, list)) else next(iter(row.values())) for row in cur.fetchall()]
+        inserted = actions.count("INSERT")
+        return inserted, actions.count("UPDATE")
+
+    def _update_many_sql(self, table: str, key_columns, update_columns, n_rows: int, schema) -> str:
+        columns = list(key_columns) + list(update_columns)
+        set_clause = ", ".join(f"target.{col} = v.{col}" for col in update_columns)
+        on = " AND ".join(f"target.{col} = v.{col}" for col in key_columns)
+        return (f"UPDATE target SET {set_clause} FROM {table} AS target "
+                f"JOIN (VALUES {self._values_sql(len(columns), n_rows)}) AS v ({', '.join(columns)}) ON {on}")
+
+    def _fetch_table_schema(self, table: str) -> dict[str, str]:
         """
         Return {column_name: data_type} for a SQL Server table.
 
@@ -105,10 +236,7 @@ class MSSQLDatabase(DBBase):
           - "schema.table"
           - "table" (defaults schema to dbo)
         """
-        if "." in table:
-            schema_name, table_name = table.split(".", 1)
-        else:
-            schema_name, table_name = "dbo", table
+        schema_name, table_name = self._split_table(table)
 
         query = """
         SELECT
@@ -120,8 +248,8 @@ class MSSQLDatabase(DBBase):
         ORDER BY c.ORDINAL_POSITION
         """
 
-        with self.connect() as conn:
-            with conn.cursor() as cur:
+        with self._connection() as conn:
+            with self._cursor(conn) as cur:
                 cur.execute(query, (schema_name, table_name))
                 rows = cur.fetchall()
 
@@ -133,4 +261,137 @@ class MSSQLDatabase(DBBase):
                 schema_map[r["column_name"]] = r["data_type"]
             else:
                 schema_map[r[0]] = r[1]
-        return schema_map
\ No newline at end of file
+        return schema_map
+
+    def _fetch_schema_tables(self, schema: str) -> dict[str, dict[str, str]]:
+        query = """
+        SELECT c.TABLE_NAME, c.COLUMN_NAME, c.DATA_TYPE
+        FROM INFORMATION_SCHEMA.COLUMNS c
+        WHERE c.TABLE_SCHEMA = %s
+        ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION
+        """
+        with self._connection() as conn:
+            with self._stream_cursor(conn) as cur:
+                cur.execute(query, (schema,))
+                rows = cur.fetchall()
+        tables: dict[str, dict[str, str]] = {}
+        for table_name, column_name, data_type in rows:
+            tables.setdefault(table_name, {})[column_name] = data_type
+        return tables
+
+    ## Bulk load (TDS bulk copy) ##
+    @instrumented
+    @invalidates
+    def bulk_insert_dataframe(
+        self,
+        table: str,
+        df: pd.DataFrame,
+        batch_size: int = 10_000,
+        tablock: bool = False,
+        check_constraints: bool = False,
+        fire_triggers: bool = False,
+        keep_nulls: bool = True,
+    ) -> dict[str, Any]:
+        """
+        Load a DataFrame with TDS bulk copy (INSERT BULK via pytds cursor.copy_to).
+
+        Each batch of batch_size rows is one bulk operation and one transaction.
+        Column types come from get_table_schema; a column whose values do not fit
+        the mapped TDS type is sent as NVARCHAR and converted by the server.
+        A batch the server rejects is retried with batched INSERTs so the report
+        lists the failing rows.
+
+        Returns:
+            The insert_dataframe report plus "elapsed_seconds" and "rows_per_sec".
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        started = time.perf_counter()
+        schema = self.get_table_schema(table)
+        columns = [col for col in schema if col in df.columns]
+        attempted = len(df)
+
+        if attempted == 0 or not columns:
+            result = super().insert_dataframe(table, df)
+        else:
+            insert_query = self._insert_sql(table, columns)
+            types = [schema[col].lower() for col in columns]
+            errors: list[tuple[int, Exception]] = []
+            succeeded = 0
+            with self._connection() as conn:
+                for start in range(0, attempted, batch_size):
+                    chunk = df.iloc[start:start + batch_size]
+                    rows, bad_rows = self._normalize_frame(chunk, columns, schema, first_row=start + 1)
+                    errors.extend(bad_rows)
+                    failed_positions = {pos for pos, _ in bad_rows}
+                    pending = [(pos, row) for pos, row in enumerate(rows, start=start + 1) if pos not in failed_positions]
+                    if not pending:
+                        continue
+                    metadata, values = self._tds_batch(columns, types, [row for _, row in pending])
+                    try:
+                        self._copy_to(conn, table, metadata, values, tablock=tablock, check_constraints=check_constraints,
+                                      fire_triggers=fire_triggers, keep_nulls=keep_nulls)
+                        succeeded += len(values)
+                    except Exception:
+                        succeeded += self._insert_batch(conn, insert_query, pending, errors)
+            errors.sort(key=lambda e: e[0])
+            result = {
+                "attempted": attempted,
+                "succeeded": succeeded,
+                "failed": attempted - succeeded,
+                "errors": errors,
+            }
+
+        elapsed = time.perf_counter() - started
+        result["elapsed_seconds"] = elapsed
+        result["rows_per_sec"] = result["succeeded"] / elapsed if elapsed > 0 else 0.0
+        return result
+
+    def _bulk_insert(self, table: str, df: pd.DataFrame, chunk_size: int) -> dict[str, Any]:
+        return self.bulk_insert_dataframe(table, df, batch_size=chunk_size)
+
+    def _insert_arrow_batch(self, conn, table: str, columns: list[str], batch: Any, first_row: int, errors: list[tuple[int, Exception]]) -> int:
+        """Bulk copy the batch; a rejected batch is retried with batched INSERTs."""
+        schema = self.get_table_schema(table)
+        rows = batch_rows(batch)
+        metadata, values = self._tds_batch(columns, [schema[col].lower() for col in columns], rows)
+        try:
+            self._copy_to(conn, table, metadata, values, keep_nulls=True)
+            return len(values)
+        except Exception:
+            pending = list(enumerate(rows, start=first_row))
+            return self._insert_batch(conn, self._insert_sql(table, columns), pending, errors)
+
+    def _copy_to(self, conn, table: str, metadata: list[tds_base.Column], values: list[tuple], **options) -> None:
+        """One INSERT BULK operation in its own transaction (savepoint inside transaction())."""
+        schema_name, table_name = self._split_table(table)
+        with self._atomic(conn):
+            cur = self._cursor(conn)
+            try:
+                cur.copy_to(table_or_view=table_name, schema=schema_name, columns=metadata, data=values, **options)
+            finally:
+                cur.close()
+
+    @staticmethod
+    def _tds_batch(columns: list[str], types: list[str], rows: list[tuple]) -> tuple[list[tds_base.Column], list[tuple]]:
+        """Build bulk-copy column metadata for a batch and coerce columns that need NVARCHAR."""
+        column_values = list(zip(*rows))
+        metadata = []
+        for i, (name, data_type) in enumerate(zip(columns, types)):
+            present = set(map(type, column_values[i]))
+            present.discard(type(None))
+            tds_type, accepted = TDS_TYPES.get(data_type, (None, ()))
+            # datetime is a subclass of date, but DATE columns must not receive datetimes
+            fits = tds_type is not None and all(
+                issubclass(t, accepted) and not (data_type == "date" and issubclass(t, datetime))
+                for t in present
+            )
+            if fits:
+                metadata.append(tds_base.Column(name=name, type=tds_type(), flags=tds_base.Column.fNullable))
+                continue
+            if present - {str}:
+                column_values[i] = tuple(None if v is None else str(v) for v in column_values[i])
+            longest = max(map(len, filter(None, column_values[i])), default=0)
+            nvarchar = tds_types.NVarCharType(size=4000) if longest <= 4000 else tds_types.NVarCharMaxType()
+            metadata.append(tds_base.Column(name=name, type=nvarchar, flags=tds_base.Column.fNullable))
+        return metadata, list(zip(*column_values))
@@ -1,29 +1,175 @@
 import sqlite3
-from typing import Any
-from Database.src.dbbase import DBBase
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Any, Iterator
+from Database.src.dbbase import DBBase, DatabaseType
+from Database.src.pool import ConnectionPool, PoolConfig
+from Database.src.result_cache import cached_read, invalidates
+from Database.src.instrumentation import instrumented
+import numpy as np
+import pandas as pd
+
+# 256 MiB of the database file read through a memory map
+DEFAULT_MMAP_SIZE = 268_435_456
+
+
+@dataclass
+class SQLitePragmas:
+    """PRAGMA settings applied to every connection opened by SQLiteDatabase; None leaves SQLite's default.
+
+    Args:
+        journal_mode: "WAL" lets readers run while one connection writes, and commits append to the log
+            instead of rewriting pages. Persistent in the database file.
+        synchronous: "NORMAL" fsyncs the WAL only at checkpoints; a power loss can drop the last
+            commits but never corrupts the file. "FULL" fsyncs every commit.
+        cache_size: Page cache per connection; negative values are KiB (-65536 = 64 MiB).
+        mmap_size: Bytes of the file read through a memory map instead of read() calls.
+        temp_store: "MEMORY" keeps temporary tables and sort spills in RAM.
+        busy_timeout: Milliseconds to wait for a lock before "database is locked".
+    """
+    journal_mode: str | None = "WAL"
+    synchronous: str | None = "NORMAL"
+    cache_size: int | None = -65536
+    mmap_size: int | None = DEFAULT_MMAP_SIZE
+    temp_store: str | None = "MEMORY"
+    busy_timeout: int | None = 5000
+
+    def apply(self, conn, read_only: bool = False) -> None:
+        for field in fields(self):
+            value = getattr(self, field.name)
+            # the journal mode is a property of the file, changed by the writer only
+            if value is None or (read_only and field.name == "journal_mode"):
+                continue
+            conn.execute(f"PRAGMA {field.name} = {value}").fetchall()
+        if read_only:
+            conn.execute("PRAGMA query_only = ON")
 
 
 class SQLiteDatabase(DBBase):
     """SQLite implementation using the built-in sqlite3 module."""
 
-    def __init__(self, database: str):
-        """SQLite only needs a database file path."""
+    db_type = DatabaseType.SQLITE
+    placeholder = "?"
+    default_schema = "main"
+    # one writer at a time: a second open write transaction would wait on the first
+    concurrent_writers = False
+    # SQLITE_MAX_VARIABLE_NUMBER since SQLite 3.32
+    max_params = 32766
+
+    def __init__(self, database: str, pragmas: SQLitePragmas | None = None):
+        """
+        Args:
+            database: Database file path (or ":memory:").
+            pragmas: PRAGMA settings for every new connection (None: SQLite's defaults).
+                See enable_high_throughput().
+        """
         super().__init__(host="", database=database, user="", password="", port=0)
+        self.pragmas = pragmas
+        # read-only connections for select*, see enable_high_throughput()
+        self.read_pool: ConnectionPool | None = None
 
     def connect(self):
         """Connect to an SQLite database file."""
-        conn = sqlite3.connect(self.database)
+        # pooled connections may be handed to another thread; the pool guarantees exclusive use
+        # sqlite3 keeps compiled statements per connection, keyed by SQL text
+        conn = sqlite3.connect(self.database, check_same_thread=False,
+                               cached_statements=self.statement_cache.max_entries)
         conn.row_factory = sqlite3.Row  # return dict-like rows
+        if self.pragmas is not None:
+            self.pragmas.apply(conn)
         return conn
+
+    def connect_readonly(self):
+        """Connect to the database file in read-only mode (mode=ro URI, query_only)."""
+        uri = Path(self.database).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                               cached_statements=self.statement_cache.max_entries)
+        conn.row_factory = sqlite3.Row
+        if self.pragmas is not None:
+            self.pragmas.apply(conn, read_only=True)
+        return conn
+
+    def enable_high_throughput(self, pragmas: SQLitePragmas | None = None, readers: int = 4) -> None:
+        """Switch to the profile for a local staging database.
+
+        - every connection gets `pragmas` (default SQLitePragmas(): WAL, synchronous=NORMAL, 64 MiB
+          cache, 256 MiB mmap, in-memory temp store), so a commit no longer costs an fsync;
+        - all writes share one long-lived connection (a pool of one): SQLite allows one writer at a
+          time anyway, and concurrent writers now queue in the pool instead of failing with
+          "database is locked";
+        - select, select_df, select_where and the streaming selects run on a pool of up to `readers`
+          read-only connections, which WAL lets read while the writer commits. Inside session() or
+          transaction() they use the pinned connection, so a transaction sees its own writes.
+
+        Bulk loads should still go through insert_dataframe (executemany, one transaction per
+        batch_size rows) or a transaction() block; insert() commits per call.
+
+        Args:
+            pragmas: PRAGMA settings. Defaults to SQLitePragmas().
+            readers: Size of the read-only pool; 0 reads on the writer connection.
+                An in-memory database has no readers (a second connection would see another database).
+        """
+        self.pragmas = pragmas or SQLitePragmas()
+        self.enable_pool(PoolConfig(min_size=1, max_size=1, max_lifetime=float("inf"), check_on_checkout=False))
+        with self._connection():
+            pass  # the writer sets the journal mode before a reader opens the file
+        if self.read_pool is not None:
+            self.read_pool.close()
+            self.read_pool = None
+        if readers > 0 and self.database not in ("", ":memory:"):
+            self.read_pool = ConnectionPool(self.connect_readonly,
+                                            PoolConfig(min_size=0, max_size=readers, check_on_checkout=False),
+                                            check=self.check_connection)
+
+    def close(self) -> None:
+        """Close the pools (if any). Safe to call more than once."""
+        super().close()
+        if self.read_pool is not None:
+            self.read_pool.close()
+            self.read_pool = None
  
+    @instrumented
+    @cached_read
     def select(self, query: str, params: tuple = ()) -> list[dict[str, Any]]:
         """Execute a SELECT query and return all rows as dicts."""
-        with self.connect() as conn:
-            cur = conn.cursor()
+        with self._read_connection() as conn:
+            cur = self._cursor(conn)
             cur.execute(query, params)
             rows = cur.fetchall()
             return [dict(row) for row in rows]
 
+    @instrumented
+    @cached_read
+    def select_df(self, query: str, params: tuple = (), include_columns_when_empty: bool = False) -> pd.DataFrame:
+        """Execute a SELECT query and return a DataFrame built column by column; columns are always kept."""
+        with self._read_connection() as conn:
+            cur = self._stream_cursor(conn)
+            cur.execute(query, params)
+            columns, arrays = self._fetch_columns(cur, 65_536)
+        return self._frame_from_columns(columns, arrays, len(arrays[0]) if arrays else 0)
+
+    @instrumented
+    def select_numpy(self, query: str, params: tuple = (), chunk_size: int = 65_536, expected_rows: int | None = None,
+                     mmap_size: int | None = DEFAULT_MMAP_SIZE) -> dict[str, np.ndarray]:
+        """Execute a SELECT query and return {column: NumPy array} (see DBBase.select_numpy).
+
+        Args:
+            mmap_size: PRAGMA mmap_size set on the connection first, so the pages are read from
+                the OS page cache through a memory map instead of copied by read() calls.
+                It stays set on a pooled connection. None keeps the connection's setting.
+        """
+        with self._read_connection() as conn:
+            if mmap_size is not None:
+                conn.execute(f"PRAGMA mmap_size = {int(mmap_size)}").fetchall()
+            cur = self._stream_cursor(conn)
+            cur.execute(query, params)
+            columns, arrays = self._fetch_columns(cur, chunk_size, expected_rows)
+        return dict(zip(columns, arrays))
+
+    @instrumented
+    @cached_read
     def select_where(
         self,
         query_or_table: str,
@@ -31,8 +177,8 @@ class SQLiteDatabase(DBBase):
         where: str | None = None,
         params: tuple = ()
     ) -> list[dict[str, Any]]:
-        with self.connect() as conn:
-            cur = conn.cursor()
+        with self._read_connection() as conn:
+            cur = self._cursor(conn)
             if columns is not None or where is not None:
                 col_str = ", ".join(columns) if columns else "*"
                 query = f"SELECT {col_str} FROM {query_or_table}"
@@ -45,28 +191,90 @@ class SQLiteDatabase(DBBase):
             rows = cur.fetchall()
             return [dict(row) for row in rows]
 
+    @contextmanager
+    def _read_connection(self) -> Iterator[Any]:
+        """A read-only pooled connection when enable_high_throughput() set up readers, else _connection()."""
+        if self.read_pool is None or getattr(self._local, "session", None) is not None:
+            with self._connection() as conn:
+                yield conn
+            return
+        event = self._event()
+        started = time.perf_counter()
+        with self.read_pool.connection() as conn:
+            if event is not None:
+                event.pool_wait_seconds += time.perf_counter() - started
+            yield conn
 
+    def _stream_cursor(self, conn):
+        """Plain tuple cursor; sqlite3 steps the statement lazily on each fetch."""
+        cur = self._cursor(conn)
+        cur.row_factory = None
+        return cur
 
+    @instrumented
+    @invalidates
     def execute(self, query: str, params: tuple = ()) -> None:
         """Execute INSERT/UPDATE/DELETE."""
-        with self.connect() as conn:
-            cur = conn.cursor()
-            cur.execute(query, params)
-            conn.commit()
+        with self._connection() as conn:
+            cur = self._cursor(conn)
+            try:
+                cur.execute(query, params)
+            except Exception as e:
+                self._rollback(conn, e)
+                raise
+            self._commit(conn)
     
+    @instrumented
+    @invalidates
     def insert(self, table: str, data: dict[str, Any]) -> None:
-        columns = ", ".join(data.keys())
-        placeholders = ", ".join(["?"] * len(data))
-        values = tuple(data.values())
-        query = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
-        self.execute(query, values)
+        return self._execute_statement(self._insert_sql(table, list(data)), tuple(data.values()))
 
+    @instrumented
+    @invalidates
     def update(self, table: str, data: dict[str, Any], where: str, params: tuple = ()) -> None:
-        set_clause = ", ".join([f"{col} = ?" for col in data.keys()])
-        values = tuple(data.values()) + params
-        query = f"UPDATE {table} SET {set_clause} WHERE {where}"
-        self.execute(query, values)
-        
+        return self._execute_statement(self._update_sql(table, list(data), where), tuple(data.values()) + params)
+
+    @instrumented
+    @invalidates
     def delete(self, table: str, where: str, params: tuple = ()) -> None:
-        query = f"DELETE FROM {table} WHERE {where}"
-        return self.execute(query, params)
\ No newline at end of file
+        return self._execute_statement(self._delete_sql(table, where), params)
+
+    def _begin(self, conn) -> None:
+        # sqlite3 only opens a transaction before DML; a leading SAVEPOINT would otherwise
+        # start (and its RELEASE end) a transaction of its own
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+
+    def _upsert_sql(self, table: str, columns, key_columns, update_columns, n_rows: int) -> str:
+        action = ("DO UPDATE SET " + ", ".join(f"{col} = excluded.{col}" for col in update_columns)
+                  if update_columns else "DO NOTHING")
+        return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES {self._values_sql(len(columns), n_rows)} "
+                f"ON CONFLICT ({', '.join(key_columns)}) {action}")
+
+    def _update_many_sql(self, table: str, key_columns, update_columns, n_rows: int, schema) -> str:
+        # UPDATE ... FROM needs SQLite 3.33; a leading WITH would leave cursor.rowcount at -1
+        columns = list(key_columns) + list(update_columns)
+        names = ", ".join(f"column{i} AS {col}" for i, col in enumerate(columns, start=1))
+        set_clause = ", ".join(f"{col} = v.{col}" for col in update_columns)
+        on = " AND ".join(f"{table}.{col} = v.{col}" for col in key_columns)
+        return (f"UPDATE {table} SET {set_clause} "
+                f"FROM (SELECT {names} FROM (VALUES {self._values_sql(len(columns), n_rows)})) AS v WHERE {on}")
+
+    def _fetch_table_schema(self, table: str) -> dict[str, str]:
+        """Declared column types from PRAGMA table_info, lowercased (may be "" for untyped columns)."""
+        schema_name, table_name = self._split_table(table)
+        rows = self._select_uncached("SELECT name, type FROM pragma_table_info(?, ?) ORDER BY cid", (table_name, schema_name))
+        return {r["name"]: r["type"].lower() for r in rows}
+
+    def _fetch_schema_tables(self, schema: str) -> dict[str, dict[str, str]]:
+        query = f"""
+        SELECT m.name AS table_name, p.name AS column_name, p.type AS data_type
+        FROM {schema}.sqlite_master m
+        JOIN pragma_table_info(m.name, ?) p
+        WHERE m.type IN ('table', 'view')
+        ORDER BY m.name, p.cid
+        """
+        tables: dict[str, dict[str, str]] = {}
+        for r in self._select_uncached(query, (schema,)):
+            tables.setdefault(r["table_name"], {})[r["column_name"]] = r["data_type"].lower()
+        return tables
@@ -0,0 +1,190 @@
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any
+
+from Database.src.dbbase import DBBase
+from Database.src.watermark import decode_value, encode_value
+
+# reader -> writer end-of-stream marker
+_DONE = object()
+
+
+class CopyCheckpoint:
+    """Progress of a copy_table run, kept in a small JSON file: rows copied and the last key written."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = 0
+        self.key: Any = None
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        self.rows = state["rows"]
+        self.key = decode_value(state.get("key"))
+
+    def save(self, rows: int, key: Any = None) -> None:
+        self.rows = rows
+        self.key = key
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"rows": rows, "key": encode_value(key)}, f)
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        self.rows = 0
+        self.key = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def copy_table(
+    source_db: DBBase,
+    source_query: str,
+    target_db: DBBase,
+    target_table: str,
+    chunk_size: int = 10_000,
+    queue_size: int = 4,
+    key_column: str | None = None,
+    checkpoint: str | None = None,
+) -> dict[str, Any]:
+    """
+    Stream the result of source_query on source_db into target_table on target_db.
+
+    A reader thread fetches chunk_size rows at a time with select_df_chunks (a server-side or
+    unbuffered cursor where the backend has one) and hands them over a bounded queue to the
+    writer, the calling thread, so fetching the next chunk overlaps writing the previous one
+    and at most queue_size chunks are held in memory. The writer loads every chunk through
+    the target's bulk path (COPY on PostgreSQL, bulk copy on SQL Server, batched INSERT
+    elsewhere), which normalizes values to the column types of target_db.get_table_schema.
+    Source columns are matched to target columns by name, ignoring case.
+
+    Args:
+        source_db: Database to read from.
+        source_query: SELECT to copy, or a bare table name to copy the columns that source and
+            target table share (per both get_table_schema).
+        target_db: Database to write to.
+        target_table: Existing target table.
+        chunk_size: Rows per fetch and per bulk load.
+        queue_size: Chunks buffered between reader and writer.
+        key_column: Column to order by and resume from: the source is read with
+            WHERE key_column > <last key written> ORDER BY key_column. Without it a resumed
+            copy skips the rows already copied, which needs a deterministic source order.
+        checkpoint: Path of a JSON file updated after every chunk (see CopyCheckpoint);
+            when it exists, the copy resumes from it.
+    Returns:
+        {"rows_read", "succeeded", "failed", "errors": [(row_number, Exception)], "chunks",
+         "resumed_from", "elapsed_seconds", "rows_per_sec"}. row_number is 1-based over the
+        whole copy, counting the rows copied before resumed_from.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    if queue_size < 1:
+        raise ValueError("queue_size must be at least 1")
+    started = time.perf_counter()
+
+    target_schema = target_db.get_table_schema(target_table)
+    if not target_schema:
+        raise ValueError(f"Target table {target_table} not found or has no columns")
+    target_names = {col.lower(): col for col in target_schema}
+
+    query = source_query.strip().rstrip(";")
+    if not any(ch.isspace() for ch in query):
+        shared = [col for col in source_db.get_table_schema(query) if col.lower() in target_names]
+        if not shared:
+            raise ValueError(f"{source_query} and {target_table} have no columns in common")
+        query = f"SELECT {', '.join(shared)} FROM {query}"
+
+    state = CopyCheckpoint(checkpoint) if checkpoint else None
+    resumed_from = state.rows if state else 0
+    params: tuple = ()
+    skip = 0
+    if key_column:
+        query = f"SELECT * FROM ({query}) AS src"
+        if state and state.key is not None:
+            query += f" WHERE {key_column} > {source_db.placeholder}"
+            params = (state.key,)
+        query += f" ORDER BY {key_column}"
+    else:
+        skip = resumed_from
+
+    chunks: queue.Queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(item: Any) -> bool:
+        # give up once the writer has stopped, so a failed copy does not leave the reader blocked
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read() -> None:
+        stream = source_db.select_df_chunks(query, params, chunk_size)
+        try:
+            to_skip = skip
+            for df in stream:
+                if to_skip:
+                    dropped = min(to_skip, len(df))
+                    to_skip -= dropped
+                    df = df.iloc[dropped:]
+                    if df.empty:
+                        continue
+                last_key = df[key_column].iloc[-1] if key_column else None
+                df = df.rename(columns=lambda col: target_names.get(str(col).lower(), col))
+                if not put((df, last_key)):
+                    return
+            put(_DONE)
+        except Exception as e:
+            put(e)
+        finally:
+            stream.close()
+
+    reader = threading.Thread(target=read, name="copy_table-reader", daemon=True)
+    reader.start()
+    rows_read = 0
+    succeeded = 0
+    n_chunks = 0
+    errors: list[tuple[int, Exception]] = []
+    try:
+        while True:
+            item = chunks.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            df, last_key = item
+            result = target_db._bulk_insert(target_table, df, chunk_size)
+            offset = resumed_from + rows_read
+            errors.extend((offset + pos, e) for pos, e in result["errors"])
+            succeeded += result["succeeded"]
+            rows_read += len(df)
+            n_chunks += 1
+            if state:
+                state.save(resumed_from + rows_read, last_key if key_column else None)
+    finally:
+        stop.set()
+        reader.join()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "rows_read": rows_read,
+        "succeeded": succeeded,
+        "failed": rows_read - succeeded,
+        "errors": errors,
+        "chunks": n_chunks,
+        "resumed_from": resumed_from,
+        "elapsed_seconds": elapsed,
+        "rows_per_sec": succeeded / elapsed if elapsed > 0 else 0.0,
+    }
@@ -0,0 +1,83 @@
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+
+def encode_value(value: Any) -> dict[str, Any] | None:
+    """JSON-safe form of a key/watermark value that decode_value turns back into the same type."""
+    if value is None:
+        return None
+    if isinstance(value, pd.Timestamp):
+        value = value.to_pydatetime()
+    elif isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, datetime):
+        return {"type": "datetime", "value": value.isoformat()}
+    if isinstance(value, date):
+        return {"type": "date", "value": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"type": "decimal", "value": str(value)}
+    return {"type": "raw", "value": value}
+
+
+def decode_value(state: dict[str, Any] | None) -> Any:
+    if state is None:
+        return None
+    decode = {"datetime": datetime.fromisoformat, "date": date.fromisoformat, "decimal": Decimal}.get(state["type"])
+    return decode(state["value"]) if decode else state["value"]
+
+
+class WatermarkStore(ABC):
+    """Where select_incremental keeps the last seen value per (database, table, column)."""
+
+    @abstractmethod
+    def get(self, name: str) -> Any:
+        """Stored watermark for name, or None when there is none."""
+
+    @abstractmethod
+    def set(self, name: str, value: Any) -> None:
+        """Store the watermark for name."""
+
+    @abstractmethod
+    def delete(self, name: str) -> None:
+        """Forget the watermark for name, so the next extract reads everything."""
+
+
+class SQLiteWatermarkStore(WatermarkStore):
+    """Watermarks in a small SQLite file (default store of select_incremental)."""
+
+    def __init__(self, path: str = "watermarks.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS watermarks (name TEXT PRIMARY KEY, value TEXT NOT NULL, updated TEXT NOT NULL)"
+            )
+
+    def get(self, name: str) -> Any:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM watermarks WHERE name = ?", (name,)).fetchone()
+        return decode_value(json.loads(row[0])) if row else None
+
+    def set(self, name: str, value: Any) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO watermarks (name, value, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET value = excluded.value, updated = excluded.updated",
+                (name, json.dumps(encode_value(value)), datetime.now().isoformat()),
+            )
+
+    def delete(self, name: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM watermarks WHERE name = ?", (name,))
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,253 @@
+"""
+Benchmarks for the DBBase data paths.
+
+Not collected by pytest (run it directly):
+
+    python -m benchmarks.bench_db                              # SQLite in memory and on disk, 1k and 10k rows
+    python -m benchmarks.bench_db --rows 1000 100000 10000000 --width narrow wide
+    python -m benchmarks.bench_db --save benchmarks/baseline.json
+    python -m benchmarks.bench_db --compare benchmarks/baseline.json --threshold 0.25
+
+PostgreSQL / MySQL run too when BENCH_PG_HOST / BENCH_MYSQL_HOST are set (plus _PORT, _DATABASE,
+_USER, _PASSWORD), e.g. against local containers. The benchmark table is created and dropped.
+With --compare the exit code is 1 when a benchmark's median is more than --threshold slower than
+in the baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+
+from Database.src.dbbase import DBBase
+from Database.src.dbfactory import DatabaseFactory, DatabaseType
+
+TABLE = "bench_data"
+
+# column kind -> DDL type per backend
+DDL_TYPES = {
+    DatabaseType.SQLITE: {"int": "integer", "float": "double precision", "str": "text", "datetime": "timestamp"},
+    DatabaseType.POSTGRESQL: {"int": "bigint", "float": "double precision", "str": "text", "datetime": "timestamp"},
+    DatabaseType.MYSQL: {"int": "BIGINT", "float": "DOUBLE", "str": "VARCHAR(64)", "datetime": "DATETIME"},
+}
+
+WIDTHS = {"narrow": 3, "wide": 50}
+KINDS = ("int", "float", "str", "datetime")
+
+# single-row insert() is benchmarked on at most this many rows
+INSERT_ROWS = 1000
+
+
+## Data ##
+def columns_for(width: str) -> list[tuple[str, str]]:
+    """(name, kind) per column; the first is the integer primary key id."""
+    n = WIDTHS[width]
+    return [("id", "int")] + [(f"c{i}_{KINDS[i % len(KINDS)]}", KINDS[i % len(KINDS)]) for i in range(1, n)]
+
+
+def make_frame(width: str, rows: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    data: dict[str, Any] = {}
+    start = datetime(2025, 1, 1)
+    for name, kind in columns_for(width):
+        if name == "id":
+            data[name] = np.arange(rows, dtype=np.int64)
+        elif kind == "int":
+            data[name] = rng.integers(0, 1_000_000, rows)
+        elif kind == "float":
+            data[name] = rng.random(rows) * 1000
+        elif kind == "str":
+            data[name] = pd.Series(rng.integers(0, 1_000_000, rows)).map("value-{}".format)
+        else:
+            data[name] = pd.to_datetime(start) + pd.to_timedelta(rng.integers(0, 86_400 * 365, rows), unit="s")
+    return pd.DataFrame(data)
+
+
+## Backends ##
+def open_backends(selected: list[str], tmpdir: str) -> dict[str, DBBase]:
+    backends: dict[str, DBBase] = {}
+    if "sqlite-memory" in selected:
+        backends["sqlite-memory"] = DatabaseFactory.create(DatabaseType.SQLITE, database=":memory:")
+    if "sqlite-disk" in selected:
+        backends["sqlite-disk"] = DatabaseFactory.create(DatabaseType.SQLITE, database=os.path.join(tmpdir, "bench.db"))
+    for name, db_type, prefix in (("postgresql", DatabaseType.POSTGRESQL, "BENCH_PG"), ("mysql", DatabaseType.MYSQL, "BENCH_MYSQL")):
+        if name not in selected or not os.getenv(f"{prefix}_HOST"):
+            continue
+        db = DatabaseFactory.create(
+            db_type,
+            host=os.environ[f"{prefix}_HOST"],
+            database=os.getenv(f"{prefix}_DATABASE", "bench"),
+            user=os.getenv(f"{prefix}_USER", "bench"),
+            password=os.getenv(f"{prefix}_PASSWORD", "bench"),
+            port=int(os.environ[f"{prefix}_PORT"]) if os.getenv(f"{prefix}_PORT") else None,
+        )
+        try:
+            db.select("SELECT 1")
+        except Exception as e:
+            print(f"skipping {name}: {e}", file=sys.stderr)
+            continue
+        backends[name] = db
+    return backends
+
+
+def create_table(db: DBBase, width: str) -> None:
+    types = DDL_TYPES[db.db_type]
+    columns = ", ".join(f"{name} {types[kind]}" + (" PRIMARY KEY" if name == "id" else "") for name, kind in columns_for(width))
+    db.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    db.execute(f"CREATE TABLE {TABLE} ({columns})")
+    db.invalidate_schema(TABLE)
+
+
+## Benchmarks ##
+def cases(db: DBBase, width: str, rows: int, df: pd.DataFrame) -> list[tuple[str, int, Callable[[], None], Callable[[], Any]]]:
+    """(name, rows handled, setup, timed function) per benchmark."""
+    placeholder = db.placeholder
+    # insert() takes plain Python values; the drivers do not all bind pandas Timestamps
+    insert_rows = [{k: v.to_pydatetime() if isinstance(v, pd.Timestamp) else v for k, v in row.items()}
+                   for row in df.head(INSERT_ROWS).to_dict("records")]
+    columns = [name for name, _ in columns_for(width)][:3]
+
+    def empty() -> None:
+        db.execute(f"DELETE FROM {TABLE}")
+
+    def loaded() -> None:
+        if db.select(f"SELECT COUNT(*) AS n FROM {TABLE}")[0]["n"] != rows:
+            empty()
+            db.insert_dataframe(TABLE, df, batch_size=10_000)
+
+    def insert() -> None:
+        for row in insert_rows:
+            db.insert(TABLE, row)
+
+    def schema() -> None:
+        db.invalidate_schema(TABLE)
+        db.get_table_schema(TABLE)
+
+    return [
+        ("insert", len(insert_rows), empty, insert),
+        ("insert_dataframe", rows, empty, lambda: db.insert_dataframe(TABLE, df, batch_size=10_000)),
+        ("select", rows, loaded, lambda: db.select(f"SELECT * FROM {TABLE}")),
+        ("select_df", rows, loaded, lambda: db.select_df(f"SELECT * FROM {TABLE}")),
+        ("select_where", rows // 2, loaded,
+         lambda: db.select_where(TABLE, columns=columns, where=f"id < {placeholder}", params=(rows // 2,))),
+        ("get_table_schema", 1, lambda: None, schema),
+    ]
+
+
+def measure(setup: Callable[[], None], fn: Callable[[], Any], rounds: int) -> list[float]:
+    times = []
+    for _ in range(rounds):
+        setup()
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def stats(times: list[float], rows: int) -> dict[str, float]:
+    median = statistics.median(times)
+    return {
+        "min": min(times), "max": max(times), "mean": statistics.fmean(times),
+        "stddev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "median": median, "rounds": len(times),
+        "rows_per_sec": rows / median if median > 0 else 0.0,
+    }
+
+
+def run(backends: dict[str, DBBase], row_counts: list[int], widths: list[str], rounds: int, only: str | None = None) -> list[dict[str, Any]]:
+    results = []
+    for backend, db in backends.items():
+        # one pinned connection per backend: an in-memory SQLite database lives only as long as its connection
+        with db.session():
+            for width in widths:
+                create_table(db, width)
+                for rows in row_counts:
+                    df = make_frame(width, rows)
+                    for case, n, setup, fn in cases(db, width, rows, df):
+                        name = f"{case}[{backend}-{width}-{rows}]"
+                        if only and only not in name:
+                            continue
+                        results.append({
+                            "name": name, "group": case,
+                            "params": {"backend": backend, "width": width, "rows": rows},
+                            "stats": stats(measure(setup, fn, rounds), n),
+                        })
+                        print(f"  {name}: {results[-1]['stats']['median'] * 1000:.2f} ms", file=sys.stderr)
+                db.execute(f"DROP TABLE {TABLE}")
+    return results
+
+
+## Output ##
+def report(results: list[dict[str, Any]]) -> str:
+    """pytest-benchmark style table, times in milliseconds."""
+    header = f"{'Name (time in ms)':<48}{'Min':>12}{'Max':>12}{'Mean':>12}{'StdDev':>12}{'Median':>12}{'Rounds':>8}{'Rows/s':>14}"
+    lines = [header, "-" * len(header)]
+    for r in sorted(results, key=lambda r: (r["group"], r["stats"]["median"])):
+        s = r["stats"]
+        lines.append(f"{r['name']:<48}" + "".join(f"{s[k] * 1000:>12.3f}" for k in ("min", "max", "mean", "stddev", "median"))
+                     + f"{s['rounds']:>8}{s['rows_per_sec']:>14,.0f}")
+    return "\n".join(lines)
+
+
+def save(results: list[dict[str, Any]], path: str) -> None:
+    document = {
+        "machine_info": {"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine()},
+        "datetime": datetime.now().isoformat(),
+        "benchmarks": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+
+
+def compare(baseline: dict[str, Any], results: list[dict[str, Any]], threshold: float) -> list[tuple[str, float, float]]:
+    """(name, baseline median, current median) for every benchmark slower than baseline * (1 + threshold)."""
+    previous = {r["name"]: r["stats"]["median"] for r in baseline["benchmarks"]}
+    regressions = []
+    for r in results:
+        before = previous.get(r["name"])
+        now = r["stats"]["median"]
+        if before is not None and now > before * (1 + threshold):
+            regressions.append((r["name"], before, now))
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["sqlite-memory", "sqlite-disk", "postgresql", "mysql"])
+    parser.add_argument("--rows", nargs="+", type=int, default=[1_000, 10_000])
+    parser.add_argument("--width", nargs="+", choices=sorted(WIDTHS), default=["narrow", "wide"])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("-k", dest="only", help="only run benchmarks whose name contains this text")
+    parser.add_argument("--save", help="write the results as JSON (a new baseline)")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown of the median, 0.2 = 20%%")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        backends = open_backends(args.backends, tmpdir)
+        results = run(backends, args.rows, args.width, args.rounds, args.only)
+        for db in backends.values():
+            db.close()
+    print(report(results))
+    if args.save:
+        save(results, args.save)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        for name, before, now in regressions:
+            print(f"REGRESSION {name}: median {before * 1000:.3f} ms -> {now * 1000:.3f} ms (+{(now / before - 1) * 100:.0f}%)")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,40 @@
 import unittest
 #from Database.src.dbbase import DBBase
 from Database.src.dbfactory import DatabaseFactory, DatabaseType
-from datetime import datetime
+from datetime import datetime, date
 import pandas as pd
 import uuid
+import os
+import sqlite3
+import tempfile
+import threading
+import asyncio
+import gc
+import warnings
+from Database.src.pool import AsyncConnectionPool, ConnectionPool, PoolConfig, PoolTimeout
+from Database.src.sql_server import MSSQLDatabase
+from pytds import tds_base
+from Database.src.mysql import MySQLDatabase
+from Database.src.postgresql import PostgreSQLDatabase
+from Database.src.sqlite import SQLiteDatabase, SQLitePragmas
+from Database.src.asyncdb import AsyncPostgreSQLDatabase
+from Database.src.normalizer import compile_normalizer
+from Database.src.row_hash import RowHashCache, row_hashes, stable_row_hash
+from Database.src.result_cache import ResultCache, tables_in
+from Database.src.schema_cache import SchemaCache
+from Database.src.table_copy import CopyCheckpoint, copy_table
+from Database.src.watermark import SQLiteWatermarkStore
+from Database.src.instrumentation import MetricsAggregator, QueryObserver, fingerprint
+from Database.src.batching import AdaptiveBatcher
+from Database.src.columnar import ColumnBuffer
+import json
+from benchmarks import bench_db
+import time
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
 ########################################################################################################################
 ### Tests for PostgreSQL
 ########################################################################################################################
@@ -375,6 +406,1300 @@ class TesSQLServer(unittest.TestCase):
         self.assertEqual(len(df), 4)
     # *************************************************************************************************************
 
+########################################################################################################################
+### Tests for SQLite (runs locally against a temporary file)
+########################################################################################################################
+
+class TestSQLite(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        db = self._make_db()
+        db.execute("CREATE TABLE test (id integer PRIMARY KEY, name text, value double precision, state integer, updated timestamp);")
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _make_db(self):
+        db = DatabaseFactory.create(
+            db_type=DatabaseType.SQLITE,
+            database=os.path.join(self.tmpdir.name, "test.db")
+        )
+        return db
+    ########################################################################################################################
+    ### Tests        
+    ########################################################################################################################
+    # *************************************************************************************************************
+    def test_construction(self):
+        db = self._make_db()
+        self.assertEqual(type(db).__name__, "SQLiteDatabase")
+    # *************************************************************************************************************
+    def test_insert_dataframe(self):
+        db = self._make_db()
+        df = pd.DataFrame({
+            "id": [1, 2, 2, "x", 5],
+            "name": ["a", "b", "c", "d", None],
+            "value": ["+20.00", "", 1.5, 2, None],
+            "state": [0, 0, 1, 2, 3],
+            "updated": ["2512090506", 2512090507, None, "2512090506", "2512090506"],
+        })
+        result = db.insert_dataframe("test", df, batch_size=2)
+        self.assertEqual(result["attempted"], 5)
+        self.assertEqual(result["succeeded"], 3)
+        self.assertEqual(result["failed"], 2)
+        self.assertEqual([pos for pos, _ in result["errors"]], [3, 4])
+
+        rows = db.select("SELECT * FROM test ORDER BY id")
+        self.assertEqual([r["id"] for r in rows], [1, 2, 5])
+        self.assertEqual(rows[0]["value"], 20.0)
+        self.assertEqual(rows[1]["value"], 0.0)
+        self.assertEqual(rows[0]["updated"], "2025-12-09 05:06:00")
+    # *************************************************************************************************************
+    def test_insert_dataframe_int_range(self):
+        db = self._make_db()
+        df = pd.DataFrame({"id": [1, 2, 3, 4], "state": ["7", "12345678901234567890", "1.9", "99999999999999999999"]})
+        result = db.insert_dataframe("test", df)
+        # out of int64 range or not a whole number: reported, never wrapped or truncated
+        self.assertEqual([pos for pos, _ in result["errors"]], [2, 3, 4])
+        self.assertEqual(db.select("SELECT id, state FROM test"), [{"id": 1, "state": 7}])
+
+        result = db.insert_dataframe("test", pd.DataFrame({"id": [5, 6], "state": [9223372036854775808, 2.5]}))
+        self.assertEqual([pos for pos, _ in result["errors"]], [1])
+        self.assertEqual(db.select("SELECT state FROM test WHERE id = 6"), [{"state": 2}])  # int(2.5)
+    # *************************************************************************************************************
+    def test_select_df(self):
+        db = self._make_db()
+        db.insert_dataframe("test", pd.DataFrame({"id": [1, 2], "name": ["a", None], "value": [1.5, 2.5], "state": [1, None]}))
+        df = db.select_df("SELECT id, name, value, state FROM test ORDER BY id")
+        self.assertEqual(list(df.columns), ["id", "name", "value", "state"])
+        self.assertEqual(str(df["id"].dtype), "int64")
+        self.assertEqual(str(df["value"].dtype), "float64")
+        self.assertTrue(pd.isna(df["state"].iloc[1]))
+
+        empty = db.select_df("SELECT * FROM test WHERE id < 0")
+        self.assertEqual(len(empty), 0)
+        self.assertEqual(list(empty.columns), ["id", "name", "value", "state", "updated"])
+    # *************************************************************************************************************
+    def test_select_iter(self):
+        db = self._make_db()
+        db.insert_dataframe("test", pd.DataFrame({"id": range(25), "state": [i % 3 for i in range(25)]}))
+        rows = db.select_iter("SELECT id, state FROM test WHERE state = ? ORDER BY id", (0,), batch_size=4)
+        self.assertEqual(next(rows), {"id": 0, "state": 0})
+        self.assertEqual(sum(1 for _ in rows), 8)
+
+        chunks = list(db.select_df_chunks("SELECT * FROM test", chunk_size=10))
+        self.assertEqual([len(c) for c in chunks], [10, 10, 5])
+        self.assertEqual(list(chunks[0].columns), ["id", "name", "value", "state", "updated"])
+    # *************************************************************************************************************
+    def test_schema_cache(self):
+        db = self._make_db()
+        schema = db.get_table_schema("test")
+        self.assertEqual(schema, {"id": "integer", "name": "text", "value": "double precision", "state": "integer", "updated": "timestamp"})
+
+        db.execute("ALTER TABLE test ADD COLUMN extra text;")
+        self.assertNotIn("extra", db.get_table_schema("main.test"))  # served from cache
+        db.invalidate_schema("test")
+        self.assertIn("extra", db.get_table_schema("test"))
+        self.assertEqual(db.schema_cache.stats()["hits"], 1)
+
+        db.execute("CREATE TABLE other (a integer);")
+        db.clear_schema_cache()
+        self.assertEqual(db.prefetch_schema(), 2)
+        self.assertEqual(db.get_table_schema("other"), {"a": "integer"})
+        self.assertEqual(db.schema_cache.stats()["hits"], 2)
+    # *************************************************************************************************************
+    def test_insert_dataframe_workers(self):
+        db = DatabaseFactory.create(DatabaseType.SQLITE, database=os.path.join(self.tmpdir.name, "test.db"),
+                                    pool_config=PoolConfig(min_size=0, max_size=3))
+        ids = list(range(1, 31))
+        ids[9] = ids[24] = 1  # duplicates of row 1 in the second and third partition
+        result = db.insert_dataframe("test", pd.DataFrame({"id": ids, "state": [1] * 30}), batch_size=4, workers=3)
+        self.assertEqual((result["attempted"], result["succeeded"], result["failed"]), (30, 28, 2))
+        self.assertEqual([pos for pos, _ in result["errors"]], [10, 25])
+        self.assertEqual(len(db.select("SELECT * FROM test")), 28)
+        self.assertEqual(db.pool_stats()["connections_created"], 3)
+        db.close()
+    # *************************************************************************************************************
+    def test_insert_dataframe_atomic(self):
+        db = self._make_db()
+        result = db.insert_dataframe("test", pd.DataFrame({"id": [1, 2, 3, 2, 5]}), batch_size=2, workers=2, atomic=True)
+        self.assertEqual((result["succeeded"], result["failed"]), (0, 5))
+        self.assertEqual([pos for pos, _ in result["errors"]], [3])  # first row of the failing batch
+        self.assertEqual(db.select("SELECT * FROM test"), [])
+
+        result = db.insert_dataframe("test", pd.DataFrame({"id": [1, "x", 3]}), atomic=True)
+        self.assertEqual(result["succeeded"], 0)
+        self.assertEqual([pos for pos, _ in result["errors"]], [2])
+
+        result = db.insert_dataframe("test", pd.DataFrame({"id": range(10)}), batch_size=3, atomic=True)
+        self.assertEqual((result["succeeded"], result["failed"]), (10, 0))
+        self.assertEqual(len(db.select("SELECT * FROM test")), 10)
+    # *************************************************************************************************************
+    def test_adaptive_batcher(self):
+        # synthetic throughput curve peaking at 400 rows per batch
+        rate = lambda size: max(1000, 100_000 - 2 * (size - 400) ** 2)
+        batcher = AdaptiveBatcher(100, step=25)
+        for _ in range(100):
+            size = batcher.size
+            batcher.record(size, size / rate(size))
+        self.assertTrue(350 <= batcher.settled <= 450)
+
+        batcher.back_off(300)  # rejected by the driver: never grow past 150 again
+        for _ in range(50):
+            size = batcher.size
+            batcher.record(size, size / rate(size))
+        self.assertEqual((batcher.maximum, batcher.settled), (150, 150))
+        self.assertEqual(batcher.backoffs, 1)
+    # *************************************************************************************************************
+    def test_insert_dataframe_auto_batch(self):
+        db = self._make_db()
+        result = db.insert_dataframe("test", pd.DataFrame({"id": range(5000), "state": [1] * 5000}), batch_size="auto")
+        self.assertEqual((result["succeeded"], result["failed"]), (5000, 0))
+        self.assertGreaterEqual(result["batch_size"], 1)
+        self.assertEqual(len(db.select("SELECT * FROM test")), 5000)
+        with self.assertRaises(ValueError):
+            db.insert_dataframe("test", pd.DataFrame({"id": [1]}), batch_size="large")
+
+        class Limited(SQLiteDatabase):
+            def _insert_many(self, cur, query, rows):
+                if len(rows) > 50:
+                    raise sqlite3.OperationalError("too many SQL variables")
+                super()._insert_many(cur, query, rows)
+
+        db = Limited(os.path.join(self.tmpdir.name, "test.db"))
+        db.execute("DELETE FROM test")
+        result = db.insert_dataframe("test", pd.DataFrame({"id": range(3000), "state": [1] * 3000}), batch_size="auto")
+        self.assertEqual((result["succeeded"], result["errors"]), (3000, []))
+        self.assertLessEqual(result["batch_size"], 50)
+    # *************************************************************************************************************
+    def test_partition(self):
+        db = self._make_db()
+        parts = db._partition([(i, ()) for i in range(1, 11)], 3)
+        self.assertEqual([len(p) for p in parts], [4, 3, 3])
+        self.assertEqual([p[0][0] for p in parts], [1, 5, 8])
+        self.assertEqual(len(db._partition([(1, ())], 4)), 1)
+    # *************************************************************************************************************
+    def test_upsert_dataframe(self):
+        db = self._make_db()
+        db.insert_dataframe("test", pd.DataFrame({"id": [1, 2], "name": ["a", "b"], "state": [0, 0]}))
+        df = pd.DataFrame({"id": [2, 3, 4, 3, "x"], "name": ["B", "c", "d", "C", "e"], "state": [1, 1, 1, 1, 1]})
+        result = db.upsert_dataframe("test", df, key_columns=["id"], update_columns=["name"], batch_size=2)
+        self.assertEqual((result["attempted"], result["inserted"], result["updated"], result["skipped"], result["failed"]), (5, 2, 1, 1, 1))
+        rows = db.select("SELECT id, name, state FROM test ORDER BY id")
+        self.assertEqual([(r["id"], r["name"], r["state"]) for r in rows], [(1, "a", 0), (2, "B", 0), (3, "C", 1), (4, "d", 1)])
+
+        result = db.upsert_dataframe("test", pd.DataFrame({"id": [1, 5], "name": ["z", "e"]}), key_columns=["id"], update_columns=[])
+        self.assertEqual((result["inserted"], result["updated"], result["skipped"]), (1, 0, 1))
+        self.assertEqual(db.select("SELECT name FROM test WHERE id = 1"), [{"name": "a"}])
+        with self.assertRaises(ValueError):
+            db.upsert_dataframe("test", df, key_columns=["missing"])
+    # *************************************************************************************************************
+    def test_insert_dataframe_dedup(self):
+        db = self._make_db()
+        db.execute("CREATE TABLE feed (id integer, name text, loaded text, row_hash text);")
+        df = pd.DataFrame({"id": [1, 2, 1, 3, "x"], "name": ["a", "b", "a", None, "e"], "loaded": ["t1"] * 5})
+        cache = RowHashCache(os.path.join(self.tmpdir.name, "hashes.txt"))
+
+        result = db.insert_dataframe_dedup("feed", df, exclude_columns=["loaded"], hash_cache=cache)
+        self.assertEqual((result["attempted"], result["succeeded"], result["skipped"], result["failed"]), (5, 3, 1, 1))
+        self.assertEqual([pos for pos, _ in result["errors"]], [5])
+        stored = db.select("SELECT id, name, row_hash FROM feed ORDER BY id")
+        self.assertEqual(stored[2]["row_hash"], stable_row_hash([3, None]))
+
+        # redelivery with a different load time: everything is known to the cache
+        cache.save()
+        cache = RowHashCache(cache.path)
+        result = db.insert_dataframe_dedup("feed", df.assign(loaded="t2").head(4), exclude_columns=["loaded"], hash_cache=cache)
+        self.assertEqual((result["succeeded"], result["skipped"]), (0, 4))
+        self.assertEqual(cache.stats()["hits"], 3)
+
+        # without a cache the rows are found in the table
+        result = db.insert_dataframe_dedup("feed", pd.DataFrame({"id": [2, 4], "name": ["b", "d"]}), exclude_columns=["loaded"])
+        self.assertEqual((result["succeeded"], result["skipped"]), (1, 1))
+        self.assertEqual(len(db.select("SELECT * FROM feed")), 4)
+    # *************************************************************************************************************
+    def test_df_with_hash(self):
+        db = self._make_db()
+        df = pd.DataFrame({"id": [1, 2], "name": ["a", None], "updated": ["2512090506", None], "extra": [0, 1]})
+        hashed = db._df_with_hash("test", df, exclude_columns=["value"], keep_non_schema_columns=True)
+        self.assertEqual(list(hashed.columns), ["id", "name", "value", "state", "updated", "row_hash", "extra"])
+        self.assertEqual(hashed["row_hash"][0], stable_row_hash([1, "a", None, datetime(2025, 12, 9, 5, 6)]))
+        self.assertEqual(row_hashes([[1, None], ["a", 2.5]], 2), [stable_row_hash([1, "a"]), stable_row_hash([None, 2.5])])
+    # *************************************************************************************************************
+    def test_update_many(self):
+        db = self._make_db()
+        db.insert_dataframe("test", pd.DataFrame({"id": range(10), "name": ["n"] * 10, "state": [0] * 10}))
+        db.max_params = 6  # force several statements: 3 parameters per row -> 2 rows each
+        changed = db.update_many("test", pd.DataFrame({"id": [1, 3, 5, 7, 99], "name": ["a", "b", "c", "d", "e"], "state": 1}), key_columns=["id"])
+        self.assertEqual(changed, 4)
+        rows = db.select("SELECT id, name, state FROM test WHERE state = 1 ORDER BY id")
+        self.assertEqual([(r["id"], r["name"]) for r in rows], [(1, "a"), (3, "b"), (5, "c"), (7, "d")])
+
+        self.assertEqual(db.update_many("test", [{"id": 2, "name": "z"}], key_columns=["id"], update_columns=["name"]), 1)
+        with self.assertRaises(ValueError):
+            db.update_many("test", [{"id": "x", "name": "z"}], key_columns=["id"])
+        with self.assertRaises(ValueError):
+            db.update_many("test", [{"id": 2, "nope": "z"}], key_columns=["id"], update_columns=["nope"])
+    # *************************************************************************************************************
+    def test_delete_many(self):
+        db = self._make_db()
+        db.insert_dataframe("test", pd.DataFrame({"id": range(10), "state": [i % 2 for i in range(10)]}))
+        db.max_params = 3
+        self.assertEqual(db.delete_many("test", [1, 2, 3, 3, 42, 5], key_columns="id"), 4)
+        self.assertEqual(db.delete_many("test", pd.DataFrame({"id": [0, 4, 7], "state": [0, 1, 1]})), 2)
+        self.assertEqual(sorted(r["id"] for r in db.select("SELECT id FROM test")), [4, 6, 8, 9])
+        with self.assertRaises(ValueError):
+            db.delete_many("test", [1])
+    # *************************************************************************************************************
+    def test_statement_cache(self):
+        db = self._make_db()
+        for i in range(5):
+            db.insert("test", {"id": i, "name": "n"})
+            db.update("test", {"state": i}, "id = ?", (i,))
+        db.delete("test", "id = ?", (0,))
+        self.assertEqual(db.statement_cache.stats()["misses"], 3)
+        self.assertEqual(db.statement_cache.stats()["hits"], 8)
+        self.assertEqual(len(db.select("SELECT * FROM test WHERE state > 0")), 4)
+    # *************************************************************************************************************
+    def test_result_cache(self):
+        db = DatabaseFactory.create(DatabaseType.SQLITE, database=os.path.join(self.tmpdir.name, "test.db"),
+                                    result_cache=ResultCache(ttl=60, table_ttl={"other": 0.05}))
+        db.execute("CREATE TABLE other (a integer);")
+        db.insert("test", {"id": 1, "name": "a"})
+        self.assertEqual(len(db.select("SELECT * FROM test")), 1)
+        rows = db.select("SELECT *\n  FROM test;")  # same query, other formatting
+        rows[0]["name"] = "mutated"
+        df = db.select_df("SELECT id FROM test")
+        self.assertEqual(db.select("SELECT * FROM test")[0]["name"], "a")
+        self.assertEqual(db.result_cache.stats()["hits"], 2)
+
+        db.insert("test", {"id": 2})  # invalidates both cached queries on test
+        self.assertEqual(len(db.select("SELECT * FROM test")), 2)
+        self.assertEqual(len(db.select_df("SELECT id FROM test")), 2)
+        self.assertEqual(len(df), 1)
+        db.insert_dataframe("test", pd.DataFrame({"id": [3]}))
+        self.assertEqual(len(db.select("SELECT * FROM test")), 3)
+
+        db.select("SELECT * FROM other")
+        time.sleep(0.1)  # table_ttl for other has run out
+        misses = db.result_cache.stats()["misses"]
+        db.select("SELECT * FROM other")
+        self.assertEqual(db.result_cache.stats()["misses"], misses + 1)
+
+        with db.transaction():
+            db.insert("test", {"id": 4})
+            self.assertEqual(len(db.select("SELECT * FROM test")), 4)  # bypasses the cache
+        self.assertEqual(len(db.select("SELECT * FROM test")), 4)
+    # *************************************************************************************************************
+    def test_result_cache_transaction(self):
+        db = self._make_db()
+        cache = db.enable_result_cache(ResultCache(ttl=60))
+        db.insert("test", {"id": 1})
+        db.select("SELECT * FROM test")
+        with db.transaction():
+            db.insert("test", {"id": 2})
+            # uncommitted: other threads must keep seeing (and caching) the committed rows
+            self.assertEqual((len(cache), cache.stats()["invalidations"]), (1, 0))
+            with db.transaction():
+                db.execute("UPDATE test SET name = 'x'")
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(len(db.select("SELECT * FROM test")), 2)
+
+        with self.assertRaises(RuntimeError), db.transaction():
+            db.insert("test", {"id": 3})
+            raise RuntimeError("rolled back")
+        self.assertEqual(len(cache), 1)
+
+        with db.transaction(autocommit_every=1):
+            db.insert("test", {"id": 3})
+            self.assertEqual(len(cache), 0)  # committed by autocommit_every
+            db.select("SELECT * FROM test")
+
+        # a result read before an invalidation is not cached after it
+        version = cache.version({"test"})
+        cache.invalidate_tables({"test"})
+        cache.put("stale", [], {"test"}, version)
+        self.assertIsNone(cache.get("stale"))
+    # *************************************************************************************************************
+    @unittest.skipIf(pyarrow is None, "pyarrow not installed")
+    def test_arrow(self):
+        db = self._make_db()
+        db.insert_dataframe("test", pd.DataFrame({"id": [1, 2, 3], "name": [None, "b", "c"], "value": [0.5, None, 2.5]}))
+        table = db.select_arrow("SELECT id, name, value FROM test ORDER BY id")
+        self.assertEqual(table.column_names, ["id", "name", "value"])
+        self.assertEqual(table.column("name").to_pylist(), [None, "b", "c"])
+        self.assertEqual(table.column("name").type, pyarrow.string())
+        batches = list(db.select_arrow_batches("SELECT id FROM test ORDER BY id", batch_size=2))
+        self.assertEqual([b.num_rows for b in batches], [2, 1])
+        empty = db.select_arrow("SELECT id, name FROM test WHERE id > 10")
+        self.assertEqual((empty.num_rows, empty.column_names), (0, ["id", "name"]))
+
+        path = os.path.join(self.tmpdir.name, "test.parquet")
+        pyarrow.parquet.write_table(table.append_column("extra", pyarrow.array([1, 2, 3])), path)
+        db.execute("DELETE FROM test")
+        result = db.insert_arrow("test", path, batch_size=2)
+        self.assertEqual((result["attempted"], result["succeeded"], result["failed"]), (3, 3, 0))
+        self.assertEqual(db.select_arrow("SELECT id, name, value FROM test ORDER BY id").to_pylist(), table.to_pylist())
+
+        clash = pyarrow.table({"id": [3, 4], "name": ["dup", "new"]})
+        result = db.insert_arrow("test", clash)
+        self.assertEqual((result["succeeded"], result["failed"], result["errors"][0][0]), (1, 1, 1))
+    # *************************************************************************************************************
+    def test_copy_table(self):
+        source = self._make_db()
+        source.insert_dataframe("test", pd.DataFrame({"id": range(1, 26), "name": [f"n{i}" for i in range(1, 26)],
+                                                      "updated": [datetime(2025, 1, 1, i % 24) for i in range(1, 26)]}))
+        target = DatabaseFactory.create(DatabaseType.SQLITE, database=os.path.join(self.tmpdir.name, "target.db"))
+        target.execute("CREATE TABLE copy (ID integer PRIMARY KEY, Name text, updated timestamp, note text);")
+
+        result = copy_table(source, "test", target, "copy", chunk_size=4, queue_size=1)
+        self.assertEqual((result["rows_read"], result["succeeded"], result["failed"], result["chunks"]), (25, 25, 0, 7))
+        self.assertGreater(result["rows_per_sec"], 0)
+        self.assertEqual(target.select("SELECT ID, Name FROM copy WHERE ID = 25"), [{"ID": 25, "Name": "n25"}])
+
+        # key checkpoint: a second run picks up after the last key the first run wrote
+        target.execute("DELETE FROM copy WHERE ID > 3")
+        path = os.path.join(self.tmpdir.name, "copy.json")
+        copy_table(source, "SELECT id, name FROM test WHERE id BETWEEN 4 AND 10", target, "copy",
+                   chunk_size=4, key_column="id", checkpoint=path)
+        self.assertEqual((CopyCheckpoint(path).rows, CopyCheckpoint(path).key), (7, 10))
+        result = copy_table(source, "SELECT id, name FROM test", target, "copy", chunk_size=4, key_column="id", checkpoint=path)
+        self.assertEqual((result["resumed_from"], result["rows_read"], result["failed"]), (7, 15, 0))
+        self.assertEqual(target.select("SELECT count(*) AS n FROM copy")[0]["n"], 25)
+
+        # offset checkpoint: skip the rows already copied; duplicates are reported per row
+        CopyCheckpoint(path).save(20)
+        result = copy_table(source, "SELECT id, name FROM test ORDER BY id", target, "copy", checkpoint=path)
+        self.assertEqual((result["rows_read"], result["failed"], result["errors"][0][0]), (5, 5, 21))
+
+        with self.assertRaises(Exception):
+            copy_table(source, "SELECT id FROM missing_table", target, "copy")
+    # *************************************************************************************************************
+    def test_select_incremental(self):
+        db = self._make_db()
+        db.execute("CREATE TABLE events (id integer, timeofcreation text);")
+        db.insert_dataframe("events", pd.DataFrame({"id": range(5), "timeofcreation": [f"25120905{m:02d}" for m in range(5)]}))
+        db.insert("events", {"id": 99})  # NULL watermark: never extracted
+        store = SQLiteWatermarkStore(os.path.join(self.tmpdir.name, "watermarks.db"))
+
+        chunks = list(db.select_incremental("events", "timeofcreation", store, columns=["id"], chunk_size=2))
+        self.assertEqual([len(c) for c in chunks], [2, 2, 1])
+        self.assertEqual(list(chunks[0].columns), ["id", "timeofcreation"])
+        self.assertEqual(list(db.select_incremental("events", "timeofcreation", store)), [])
+
+        db.insert_dataframe("events", pd.DataFrame({"id": [5, 6, 7], "timeofcreation": ["2512090600", "2512090601", "2512090602"]}))
+        extract = db.select_incremental("events", "timeofcreation", store, chunk_size=2)
+        self.assertEqual(next(extract)["id"].tolist(), [5, 6])
+        extract.close()  # stopped before asking for more: the chunk is read again next time
+        rows = pd.concat(db.select_incremental("events", "timeofcreation", store, where="id <> ?", params=(6,)))
+        self.assertEqual(rows["id"].tolist(), [5, 7])
+        reopened = SQLiteWatermarkStore(store.path)
+        self.assertEqual(reopened.get(db._watermark_name("events", "timeofcreation")), "2512090602")
+
+        cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)  # the default store is watermarks.db in the working directory
+        try:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always", ResourceWarning)
+                for _ in range(3):
+                    list(db.select_incremental("events", "timeofcreation"))
+                gc.collect()
+        finally:
+            os.chdir(cwd)
+        self.assertFalse([w for w in caught if issubclass(w.category, ResourceWarning)])
+        self.assertEqual(reopened.get(db._watermark_name("events", "timeofcreation")), "2512090602")
+    # *************************************************************************************************************
+    def test_instrumentation(self):
+        db = self._make_db()
+        metrics = db.add_observer(MetricsAggregator())
+        events = db.add_observer(QueryObserver())
+        events.on_end = lambda event: setattr(events, "last", event)
+
+        db.insert_dataframe("test", pd.DataFrame({"id": range(10), "name": ["a"] * 10}))
+        self.assertEqual((events.last.operation, events.last.rows), ("insert_dataframe", 10))
+        self.assertGreater(events.last.normalize_seconds, 0)
+        for i in range(5):
+            db.select(f"SELECT * FROM test WHERE id = {i} AND name = 'a'")
+        self.assertGreater(events.last.fetch_seconds, 0)
+        self.assertGreater(events.last.connect_seconds, 0)
+        self.assertEqual(len(list(db.select_df_chunks("SELECT * FROM test", chunk_size=4))), 3)
+        self.assertEqual((events.last.rows, events.last.frame_seconds > 0), (10, True))
+        with self.assertRaises(Exception):
+            db.execute("INSERT INTO missing VALUES (1)")
+
+        summary = {row["fingerprint"]: row for row in metrics.summary()}
+        # nested calls (get_table_schema inside insert_dataframe) count toward the outer call only
+        self.assertEqual(set(summary), {"insert_dataframe test", "SELECT * FROM test WHERE id = ? AND name = ?",
+                                        "SELECT * FROM test", "INSERT INTO missing VALUES (?)"})
+        selects = summary["SELECT * FROM test WHERE id = ? AND name = ?"]
+        self.assertEqual((selects["count"], selects["rows"]), (5, 5))
+        self.assertLessEqual(selects["p50_seconds"], selects["p99_seconds"])
+        self.assertEqual(summary["INSERT INTO missing VALUES (?)"]["errors"], 1)
+        self.assertEqual(len(json.loads(metrics.to_json())), 4)
+        text = metrics.to_prometheus()
+        self.assertIn('db_query_duration_seconds_count{db_type="sqlite",operation="select",fingerprint="SELECT * FROM test WHERE id = ? AND name = ?"} 5', text)
+        self.assertIn('phase="fetch"', text)
+
+        db.remove_observer(metrics)
+        db.select("SELECT 1")
+        self.assertEqual(len(metrics.summary()), 4)
+        db.update("test", {"name": "b"}, "id < ?", (3,))
+        self.assertEqual((events.last.operation, events.last.rows), ("update", 3))
+        db.execute("DELETE FROM test WHERE id >= 8")
+        self.assertEqual(events.last.rows, 2)
+        self.assertEqual(len(list(db.select_iter("SELECT * FROM test", batch_size=3))), 8)
+        self.assertEqual((events.last.operation, events.last.rows), ("select_iter", 8))
+        self.assertEqual(fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s)", "select"), "SELECT * FROM t WHERE id IN (?, ...)")
+    # *************************************************************************************************************
+    @unittest.skipIf(pyarrow is None, "pyarrow not installed")
+    def test_result_cache_bounds_and_disk(self):
+        cache_dir = os.path.join(self.tmpdir.name, "results")
+        cache = ResultCache(max_bytes=4000, disk_dir=cache_dir)
+        cache.put("small", [{"a": 1, "at": datetime(2025, 1, 2)}], {"t"})
+        cache.put("big", [{"a": "x" * 5000}], {"t"})  # larger than the bound: not cached
+        cache.put("second", [{"a": 2}] * 5, {"u"})
+        cache.put("frame", pd.DataFrame({"id": [1, 2], "name": ["a", None]}), {"u"})
+        cache.put("mixed", [{"a": 1}, {"a": "one"}], {"u"})  # Arrow cannot hold it: memory only
+        self.assertIsNone(cache.get("big"))
+        self.assertEqual((len(cache), cache.stats()["disk_entries"]), (4, 3))
+        self.assertFalse([name for name in os.listdir(cache_dir) if name.endswith(".pkl")])
+
+        restarted = ResultCache(max_bytes=4000, disk_dir=cache_dir)
+        self.assertEqual(restarted.get("small"), [{"a": 1, "at": datetime(2025, 1, 2)}])
+        frame = restarted.get("frame")
+        self.assertEqual((list(frame["id"]), frame["name"][0], frame["name"].isna()[1]), ([1, 2], "a", True))
+        self.assertIsNone(restarted.get("mixed"))
+        self.assertEqual(restarted.stats()["disk_hits"], 2)
+        restarted.invalidate_tables(["T"])
+        self.assertIsNone(ResultCache(disk_dir=cache_dir).get("small"))
+        self.assertEqual(tables_in("SELECT * FROM tst.a x, b JOIN c ON 1 = 1"), {"a", "b", "c"})
+
+        pickled = ResultCache(disk_dir=os.path.join(self.tmpdir.name, "pickled"), disk_format="pickle")
+        pickled.put("mixed", [{"a": 1}, {"a": "one"}], {"u"})
+        self.assertEqual(ResultCache(disk_dir=pickled.disk_dir, disk_format="pickle").get("mixed"), [{"a": 1}, {"a": "one"}])
+        with self.assertRaises(ValueError):
+            ResultCache(disk_format="json")
+    # *************************************************************************************************************
+    def test_result_cache_ttl_per_call(self):
+        db = self._make_db()
+        cache = db.enable_result_cache(ResultCache(ttl=60))
+        db.insert("test", {"id": 1})
+        db.select("SELECT * FROM test", cache_ttl=0.05)
+        db.select_df("SELECT id FROM test", cache_ttl=0)  # not cached
+        db.select("SELECT * FROM test", cache_ttl=0.05)
+        self.assertEqual((len(cache), cache.stats()["hits"]), (1, 1))
+        time.sleep(0.1)
+        self.assertEqual(len(db.select("SELECT * FROM test")), 1)
+        self.assertEqual(cache.stats()["hits"], 1)  # expired: read again
+    # *************************************************************************************************************
+    def test_high_throughput(self):
+        db = self._make_db()
+        db.enable_high_throughput(SQLitePragmas(cache_size=-8192), readers=2)
+        self.assertEqual(db.select("PRAGMA journal_mode")[0]["journal_mode"], "wal")
+        with db.session() as conn:
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+            self.assertEqual(conn.execute("PRAGMA cache_size").fetchone()[0], -8192)
+
+        result = db.insert_dataframe("test", pd.DataFrame({"id": range(2000), "state": [1] * 2000}), batch_size=500)
+        self.assertEqual(result["succeeded"], 2000)
+        for i in range(10):
+            db.insert("test", {"id": -i - 1, "state": 2})
+        self.assertEqual(db.select("SELECT COUNT(*) AS n FROM test")[0]["n"], 2010)
+        self.assertEqual(db.pool_stats()["connections_created"], 1)
+        self.assertGreater(db.read_pool.stats()["checkouts"], 0)
+        with self.assertRaises(sqlite3.OperationalError):
+            with db._read_connection() as conn:
+                conn.execute("DELETE FROM test")
+
+        # readers see committed rows only; the transaction reads its own writes
+        seen = []
+        with db.transaction():
+            db.insert("test", {"id": 10_000})
+            self.assertEqual(len(db.select("SELECT id FROM test WHERE id = ?", (10_000,))), 1)
+            reader = threading.Thread(target=lambda: seen.append(db.select("SELECT id FROM test WHERE id = ?", (10_000,))))
+            reader.start()
+            reader.join()
+        self.assertEqual(seen, [[]])
+        db.close()
+        self.assertIsNone(db.read_pool)
+    # *************************************************************************************************************
+    def test_select_numpy(self):
+        db = self._make_db()
+        db.insert_dataframe("test", pd.DataFrame({"id": range(100), "name": [f"n{i}" for i in range(100)],
+                                                  "value": [i / 2 for i in range(100)], "state": [None] * 50 + [1] * 50}))
+        arrays = db.select_numpy("SELECT id, name, value, state FROM test ORDER BY id", chunk_size=7, expected_rows=10)
+        self.assertEqual(list(arrays), ["id", "name", "value", "state"])
+        self.assertEqual([str(a.dtype) for a in arrays.values()], ["int64", "object", "float64", "float64"])
+        self.assertEqual(arrays["id"].tolist(), list(range(100)))
+        self.assertTrue(pd.isna(arrays["state"][49]) and arrays["state"][50] == 1)
+        self.assertEqual(db.select_numpy("SELECT id FROM test WHERE id < 0")["id"].tolist(), [])
+        with db.session() as conn:
+            db.select_numpy("SELECT 1", mmap_size=1 << 20)
+            self.assertEqual(conn.execute("PRAGMA mmap_size").fetchone()[0], 1 << 20)
+
+        buffer = ColumnBuffer("int", capacity=2)
+        for chunk in ((1, 2), (3,), (None, 5)):
+            buffer.extend(chunk)
+        self.assertEqual(str(buffer.data.dtype), "float64")  # promoted by the NULL
+        self.assertEqual(len(buffer.data), 8)  # doubled from 2
+        values = buffer.finish()
+        self.assertEqual(len(values), 5)
+        self.assertEqual(values[[0, 1, 2, 4]].tolist(), [1.0, 2.0, 3.0, 5.0])
+        self.assertTrue(pd.isna(values[3]))
+    # *************************************************************************************************************
+    def test_select_df_parallel(self):
+        db = DatabaseFactory.create(DatabaseType.SQLITE, database=os.path.join(self.tmpdir.name, "test.db"),
+                                    pool_config=PoolConfig(min_size=0, max_size=3))
+        db.insert_dataframe("test", pd.DataFrame({"id": range(1, 101), "name": [f"n{i}" for i in range(100)],
+                                                  "state": [None if i % 10 == 0 else i for i in range(100)]}))
+        df = db.select_df_parallel("test", "id", num_partitions=4, columns=["id", "name"])
+        self.assertEqual(df["id"].tolist(), list(range(1, 101)))  # slices in range order
+        self.assertEqual(str(df["id"].dtype), "int64")
+        self.assertLessEqual(db.pool_stats()["connections_created"], 3)
+
+        df = db.select_df_parallel("test", "state", num_partitions=3, columns=["id", "state"], where="id <= ?", params=(50,))
+        self.assertEqual(sorted(df["id"]), list(range(1, 51)))
+        self.assertEqual(str(df["state"].dtype), "float64")  # NULL slice last, as NaN
+        self.assertTrue(df["state"].iloc[-5:].isna().all())
+        pd.testing.assert_frame_equal(df.sort_values("id", ignore_index=True),
+                                      db.select_df("SELECT id, state FROM test WHERE id <= 50 ORDER BY id"))
+
+        empty = db.select_df_parallel("test", "id", where="id < 0")
+        self.assertEqual((len(empty), list(empty.columns)), (0, ["id", "name", "value", "state", "updated"]))
+        with self.assertRaises(ValueError):
+            db.select_df_parallel("test", "name")
+        db.close()
+    # *************************************************************************************************************
+    def test_transaction(self):
+        db = self._make_db()
+        observer = self._make_db()
+        count = lambda: len(observer.select("SELECT * FROM test"))
+        with db.transaction():
+            db.insert("test", {"id": 1, "name": "a"})
+            db.update("test", {"name": "b"}, "id = ?", (1,))
+            self.assertEqual(count(), 0)  # nothing committed yet
+        self.assertEqual(observer.select("SELECT name FROM test"), [{"name": "b"}])
+
+        with self.assertRaises(KeyError):
+            with db.transaction():
+                db.insert("test", {"id": 2})
+                raise KeyError("abort")
+        self.assertEqual(count(), 1)
+
+        with db.transaction():
+            db.insert("test", {"id": 3})
+            with self.assertRaises(ValueError):
+                with db.transaction():  # savepoint
+                    db.insert("test", {"id": 4})
+                    raise ValueError("inner")
+            result = db.insert_dataframe("test", pd.DataFrame({"id": [5, 1, 6]}))
+            self.assertEqual([pos for pos, _ in result["errors"]], [2])
+        self.assertEqual([r["id"] for r in observer.select("SELECT id FROM test ORDER BY id")], [1, 3, 5, 6])
+
+        with self.assertRaises(RuntimeError):  # a failed statement dooms the block even when caught
+            with db.transaction():
+                db.insert("test", {"id": 7})
+                with self.assertRaises(sqlite3.OperationalError):
+                    db.execute("INSERT INTO missing VALUES (1)")
+        self.assertEqual(count(), 4)
+    # *************************************************************************************************************
+    def test_transaction_autocommit_every(self):
+        db = self._make_db()
+        with self.assertRaises(RuntimeError):
+            with db.transaction(autocommit_every=2):
+                for i in range(5):
+                    db.insert("test", {"id": i})
+                raise RuntimeError("crash after 5 statements")
+        self.assertEqual(len(db.select("SELECT * FROM test")), 4)
+    # *************************************************************************************************************
+    def test_session(self):
+        db = DatabaseFactory.create(DatabaseType.SQLITE, database=os.path.join(self.tmpdir.name, "test.db"), pooled=True)
+        with db.session() as conn:
+            for i in range(3):
+                db.insert("test", {"id": i})
+            self.assertEqual(len(db.select("SELECT * FROM test")), 3)
+            with db.session() as inner:
+                self.assertIs(inner, conn)
+        self.assertEqual(db.pool_stats()["checkouts"], 1)
+        with db:
+            self.assertIsNotNone(db.conn)
+            db.delete("test", "id = ?", (0,))
+        self.assertEqual(len(self._make_db().select("SELECT * FROM test")), 2)
+        self.assertIsNotNone(db.pool)  # the with block only releases its pinned connection
+        self.assertEqual(db.pool_stats()["checkouts"], 2)
+        db.select("SELECT * FROM test")
+        self.assertEqual(db.pool_stats()["connections_created"], 1)
+        db.close()
+    # *************************************************************************************************************
+    def test_pooled(self):
+        db = DatabaseFactory.create(DatabaseType.SQLITE, database=os.path.join(self.tmpdir.name, "test.db"), pooled=True)
+        db.insert_dataframe("test", pd.DataFrame({"id": [1, 2, 3]}))
+        self.assertEqual(len(db.select("SELECT * FROM test")), 3)
+        self.assertEqual(db.pool_stats()["connections_created"], 1)
+        db.close()
+    # *************************************************************************************************************
+
+########################################################################################################################
+### Tests for the compiled normalizer
+########################################################################################################################
+
+class TestNormalizer(unittest.TestCase):
+    SCHEMA = {
+        "timeofcreation": "timestamp without time zone",
+        "bookingdate": "date",
+        "accountnumber": "integer",
+        "bookedamount": "double precision",
+        "shortadvice": "character varying",
+    }
+    # *************************************************************************************************************
+    def test_scalar_matches_vectorized(self):
+        df = pd.DataFrame({
+            "timeofcreation": ["2512090506", 2512090507, datetime(2024, 1, 1), None, "abc"],
+            "bookingdate": ["081225", "010124", None, "x", "311299"],
+            "accountnumber": ["12764170", 2, 3.0, None, "5"],
+            "bookedamount": ["+20.00", "", None, 1.5, 2],
+            "shortadvice": ["MPS060000009914", None, 5, 1.5, "x"],
+        })
+        normalizer = compile_normalizer(self.SCHEMA)
+        rows, errors = normalizer.normalize_frame(df)
+        self.assertEqual(errors, [])
+        db = SQLiteDatabase(":memory:")
+        for row, (_, raw) in zip(rows, df.iterrows()):
+            expected = tuple(db.normalize_value(raw[col], t) for col, t in self.SCHEMA.items())
+            self.assertEqual(row, expected)
+        self.assertEqual(rows[0][0], datetime(2025, 12, 9, 5, 6))
+        self.assertEqual(rows[0][1], date(2025, 12, 8))
+    # *************************************************************************************************************
+    def test_scalar_matches_vectorized_ints(self):
+        db = SQLiteDatabase(":memory:")
+        cases = [
+            ["12345678901234567890", "99999999999999999999", "-5", " 7 "],  # text: out of range, in range
+            [9223372036854775808, 2 ** 63 - 1, -2 ** 63, 3],                 # Python ints beyond int64
+            ["1.9", "3.0", "1e3", "4"],                                      # non-integral text
+            [1.9, -2.5, 1e20, 7.0],                                          # floats truncate
+            ["9007199254740993", 1.5, 2, None],                             # float64 would lose digits
+        ]
+        for values in cases:
+            with self.subTest(values=values):
+                rows, errors = compile_normalizer({"n": "bigint"}).normalize_frame(pd.DataFrame({"n": values}))
+                failed = dict(errors)
+                for pos, (value, (got,)) in enumerate(zip(values, rows), start=1):
+                    try:
+                        expected = db.normalize_value(value, "bigint")
+                    except Exception:
+                        self.assertIn(pos, failed)
+                        continue
+                    self.assertNotIn(pos, failed)
+                    self.assertEqual((got, type(got)), (expected, type(expected)))
+    # *************************************************************************************************************
+    def test_compiled_once(self):
+        self.assertIs(compile_normalizer(dict(self.SCHEMA)), compile_normalizer(dict(self.SCHEMA)))
+        normalizer = compile_normalizer(self.SCHEMA)
+        self.assertEqual(normalizer.normalize_row({"accountnumber": "7", "other": 1}), {"accountnumber": 7})
+    # *************************************************************************************************************
+
+########################################################################################################################
+### Tests for the connection pool
+########################################################################################################################
+
+class TestConnectionPool(unittest.TestCase):
+    def _make_pool(self, **kwargs):
+        config = PoolConfig(**kwargs)
+        return ConnectionPool(lambda: sqlite3.connect(":memory:", check_same_thread=False), config,
+                              check=lambda conn: conn.execute("SELECT 1").fetchall())
+    ########################################################################################################################
+    ### Tests        
+    ########################################################################################################################
+    # *************************************************************************************************************
+    def test_reuse(self):
+        pool = self._make_pool(min_size=0, max_size=2)
+        with pool.connection() as conn1:
+            pass
+        with pool.connection() as conn2:
+            pass
+        self.assertIs(conn1, conn2)
+        stats = pool.stats()
+        self.assertEqual(stats["connections_created"], 1)
+        self.assertEqual(stats["checkouts"], 2)
+        self.assertEqual(stats["idle"], 1)
+        pool.close()
+    # *************************************************************************************************************
+    def test_bounded(self):
+        pool = self._make_pool(min_size=0, max_size=2, timeout=0.05)
+        conn1 = pool.getconn()
+        conn2 = pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        self.assertEqual(pool.stats()["checkout_timeouts"], 1)
+
+        released = threading.Timer(0.05, pool.putconn, args=(conn1,))
+        released.start()
+        conn3 = pool.getconn(timeout=2)
+        self.assertIs(conn3, conn1)
+        self.assertEqual(pool.stats()["checkout_waits"], 1)
+        pool.putconn(conn2)
+        pool.putconn(conn3)
+        pool.close()
+    # *************************************************************************************************************
+    def test_health_check_discards_broken(self):
+        pool = self._make_pool(min_size=0, max_size=1)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        conn.close()  # simulate a dropped connection sitting idle in the pool
+        fresh = pool.getconn()
+        self.assertIsNot(fresh, conn)
+        self.assertEqual(pool.stats()["health_check_failures"], 1)
+        pool.putconn(fresh)
+        pool.close()
+    # *************************************************************************************************************
+    def test_max_lifetime(self):
+        pool = self._make_pool(min_size=0, max_size=1, max_lifetime=0)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        self.assertEqual(pool.stats()["size"], 0)
+        pool.close()
+    # *************************************************************************************************************
+    def test_min_size(self):
+        pool = self._make_pool(min_size=2, max_size=3)
+        with pool.connection():
+            self.assertEqual(pool.stats()["size"], 2)
+        pool.close()
+        self.assertEqual(pool.stats()["size"], 0)
+    # *************************************************************************************************************
+    def test_min_size_connect_failure(self):
+        attempts = []
+        def connect():
+            attempts.append(1)
+            if len(attempts) == 2:
+                raise sqlite3.OperationalError("server unavailable")
+            return sqlite3.connect(":memory:", check_same_thread=False)
+        pool = ConnectionPool(connect, PoolConfig(min_size=3, max_size=3, timeout=0.05))
+        with self.assertRaises(sqlite3.OperationalError):
+            pool.getconn()
+        self.assertEqual(pool.stats()["size"], 1)  # no slots held for connections that were never opened
+        conns = [pool.getconn() for _ in range(3)]  # warms up again, full capacity
+        self.assertEqual(pool.stats()["size"], 3)
+        for conn in conns:
+            pool.putconn(conn)
+        pool.close()
+    # *************************************************************************************************************
+
+########################################################################################################################
+### Tests for the asyncio API (SQLite runs on a worker thread, the pool against fake async connections)
+########################################################################################################################
+
+class _FakeAsyncConnection:
+    def __init__(self):
+        self.closed = False
+    async def execute(self, query):
+        if self.closed:
+            raise RuntimeError("connection is closed")
+    async def rollback(self):
+        pass
+    async def close(self):
+        self.closed = True
+    @classmethod
+    async def connect(cls):
+        return cls()
+
+
+class _FakeAsyncPgCursor:
+    """Async cursor over one table test (id integer, name text); rows with a NULL id are rejected."""
+    def __init__(self, conn, row_factory=None):
+        self.conn = conn
+        self.tuples = row_factory is not None
+        self.description = None
+        self.rowcount = -1
+        self.result = []
+    async def __aenter__(self):
+        return self
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        return False
+    async def execute(self, query, params=()):
+        if query.lstrip().startswith("SELECT"):
+            self.result = self.conn.server.query(query, params, self.tuples)
+            self.description = [("id", 23), ("name", 25)]
+        else:
+            await self.executemany(query, [params])
+    async def executemany(self, query, rows):
+        rows = [tuple(row) for row in rows]
+        if any(row[0] is None for row in rows):
+            raise RuntimeError('null value in column "id" violates not-null constraint')
+        self.conn.pending.extend(rows)
+        self.rowcount = len(rows)
+    async def fetchall(self):
+        return self.result
+
+class _FakeAsyncPgServer:
+    def __init__(self):
+        self.rows = []
+        self.schema_queries = 0
+    def query(self, query, params, tuples):
+        if "information_schema.columns" in query:
+            self.schema_queries += 1
+            return [{"column_name": "id", "data_type": "integer"}, {"column_name": "name", "data_type": "text"}]
+        rows = sorted(self.rows)
+        return rows if tuples else [{"id": id, "name": name} for id, name in rows]
+
+class _FakeAsyncPgConnection(_FakeAsyncConnection):
+    def __init__(self, server):
+        super().__init__()
+        self.server = server
+        self.pending = []
+    def cursor(self, name=None, row_factory=None):
+        return _FakeAsyncPgCursor(self, row_factory)
+    async def commit(self):
+        self.server.rows.extend(self.pending)
+        self.pending = []
+    async def rollback(self):
+        self.pending = []
+
+class _StandInAsyncPostgreSQL(AsyncPostgreSQLDatabase):
+    def __init__(self, pool_config):
+        self.server = _FakeAsyncPgServer()
+        super().__init__("localhost", "test", "testuser", "testuser", pool_config=pool_config)
+    async def connect(self):
+        return _FakeAsyncPgConnection(self.server)
+
+
+class TestAsync(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "test.db")
+        SQLiteDatabase(self.path).execute("CREATE TABLE test (id integer PRIMARY KEY, name text, value double precision, state integer, updated timestamp);")
+    def tearDown(self):
+        self.tmpdir.cleanup()
+    ########################################################################################################################
+    ### Tests        
+    ########################################################################################################################
+    # *************************************************************************************************************
+    async def test_sqlite_roundtrip(self):
+        async with DatabaseFactory.create_async(DatabaseType.SQLITE, database=self.path) as db:
+            self.assertEqual(type(db).__name__, "AsyncSQLiteDatabase")
+            result = await db.insert_dataframe("test", pd.DataFrame({"id": [1, 2, 2], "name": ["a", "b", "c"]}))
+            self.assertEqual((result["succeeded"], result["failed"]), (2, 1))
+            await db.insert("test", {"id": 3, "name": "c"})
+            await db.update("test", {"state": 7}, "id = ?", (1,))
+
+            rows, df = await asyncio.gather(
+                db.select_where("test", ["id", "state"], "id >= ?", (1,)),
+                db.select_df("SELECT id, name FROM test ORDER BY id"),
+            )
+            self.assertEqual(len(rows), 3)
+            self.assertEqual(list(df["name"]), ["a", "b", "c"])
+            await db.delete("test", "id = ?", (3,))
+            self.assertEqual(len(await db.select("SELECT * FROM test")), 2)
+            self.assertEqual(db.sync.pool_stats()["connections_created"], 1)
+    # *************************************************************************************************************
+    async def test_async_pool(self):
+        pool = AsyncConnectionPool(_FakeAsyncConnection.connect, PoolConfig(min_size=0, max_size=1, timeout=0.05),
+                                   check=lambda conn: conn.execute("SELECT 1"))
+        conn = await pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            await pool.getconn()
+
+        waiter = asyncio.create_task(pool.getconn(timeout=2))
+        await asyncio.sleep(0.01)
+        await pool.putconn(conn)
+        self.assertIs(await waiter, conn)
+        await pool.putconn(conn)
+
+        conn.closed = True  # dropped while idle: the health check replaces it
+        async with pool.connection() as fresh:
+            self.assertIsNot(fresh, conn)
+        stats = pool.stats()
+        self.assertEqual((stats["checkout_timeouts"], stats["checkout_waits"], stats["health_check_failures"]), (1, 1, 1))
+        await pool.close()
+        self.assertEqual(pool.stats()["size"], 0)
+    # *************************************************************************************************************
+    async def test_postgresql_stand_in(self):
+        db = _StandInAsyncPostgreSQL(PoolConfig(min_size=0, max_size=2))
+        db.sync.schema_cache = SchemaCache()
+        result = await db.execute("INSERT INTO test (id, name) VALUES (%s, %s)", (1, "a"))
+        self.assertEqual(result, {"success": True, "rows_affected": 1, "error": None})
+        result = await db.execute("INSERT INTO test (id, name) VALUES (%s, %s)", (None, "x"))
+        self.assertFalse(result["success"])
+
+        df = pd.DataFrame({"id": [2, None, 4], "name": ["b", "c", "d"], "extra": [0, 0, 0]})
+        result = await db.insert_dataframe("test", df, batch_size=2)
+        self.assertEqual((result["succeeded"], result["failed"], result["errors"][0][0]), (2, 1, 2))
+        await db.insert_dataframe("test", pd.DataFrame({"id": [5], "name": ["e"]}))
+        self.assertEqual(db.server.schema_queries, 1)  # second load: schema cache hit
+        self.assertEqual(db.sync.schema_cache.stats()["hits"], 1)
+
+        df, rows = await asyncio.gather(db.select_df("SELECT id, name FROM test"), db.select("SELECT * FROM test"))
+        self.assertEqual(list(df["id"]), [1, 2, 4, 5])
+        self.assertEqual(str(df["id"].dtype), "int64")
+        self.assertEqual(rows[0], {"id": 1, "name": "a"})
+        stats = db.pool_stats()
+        self.assertLessEqual(stats["connections_created"], 2)
+        self.assertEqual(stats["in_use"], 0)
+        await db.close()
+    # *************************************************************************************************************
+    async def test_async_pool_min_size_connect_failure(self):
+        attempts = []
+        async def connect():
+            attempts.append(1)
+            if len(attempts) == 2:
+                raise ConnectionError("server unavailable")
+            return _FakeAsyncConnection()
+        pool = AsyncConnectionPool(connect, PoolConfig(min_size=3, max_size=3, timeout=0.05))
+        with self.assertRaises(ConnectionError):
+            await pool.getconn()
+        self.assertEqual(pool.stats()["size"], 1)
+        conns = [await pool.getconn() for _ in range(3)]
+        self.assertEqual(pool.stats()["size"], 3)
+        for conn in conns:
+            await pool.putconn(conn)
+        await pool.close()
+    # *************************************************************************************************************
+
+########################################################################################################################
+### Tests for MySQL prepared statements against a local stand-in
+########################################################################################################################
+
+class _FakeMySQLCursor:
+    def __init__(self, prepared):
+        self.prepared = prepared
+        self.executed = []
+    def execute(self, query, params=()):
+        self.executed.append(params)
+    def close(self):
+        pass
+
+class _FakeMySQLConnection:
+    def __init__(self):
+        self.cursors = []
+        self.commits = 0
+    def cursor(self, prepared=False):
+        cur = _FakeMySQLCursor(prepared)
+        self.cursors.append(cur)
+        return cur
+    def commit(self):
+        self.commits += 1
+    def rollback(self):
+        pass
+    def close(self):
+        pass
+
+class _StandInMySQL(MySQLDatabase):
+    def __init__(self):
+        super().__init__("localhost", "test", "testuser", "testuser")
+        self.fake = _FakeMySQLConnection()
+    def connect(self):
+        return self.fake
+
+class TestMySQLPrepared(unittest.TestCase):
+    # *************************************************************************************************************
+    def test_prepared_cursor_reuse(self):
+        db = _StandInMySQL()
+        db.insert("test", {"id": 1})
+        self.assertFalse(db.fake.cursors[0].prepared)  # one-off connection: plain cursor
+
+        db.fake.cursors.clear()
+        with db.session():
+            for i in range(3):
+                db.insert("test", {"id": i})
+            db.update("test", {"name": "x"}, "id = %s", (1,))
+        self.assertEqual([c.prepared for c in db.fake.cursors], [True, True])
+        self.assertEqual(db.fake.cursors[0].executed, [(0,), (1,), (2,)])
+        self.assertEqual(db.statement_cache.stats()["hits"], 3)
+    # *************************************************************************************************************
+
+########################################################################################################################
+### Tests for SQL Server bulk copy against a local stand-in
+########################################################################################################################
+
+class _FakeTdsCursor:
+    def __init__(self, conn):
+        self.conn = conn
+    def copy_to(self, table_or_view=None, schema=None, columns=None, data=None, **options):
+        rows = list(data)
+        if any(row[0] is None for row in rows):
+            raise ValueError("NULL id")
+        self.conn.bulk_calls.append({"table": f"{schema}.{table_or_view}", "columns": columns, "rows": rows, "options": options})
+    def execute(self, query, params=()):
+        if query.startswith("SELECT"):
+            # dict rows, as pytds returns them on an as_dict=True connection
+            self.description = [("id", tds_base.SYBINT4), ("name", tds_base.XSYBNVARCHAR)]
+            self.output = [{"id": row[0], "name": row[1]} for row in self.conn.inserted]
+            return
+        if None in params[0::3]:
+            raise ValueError("NULL id")
+        rows = [tuple(params[i:i + 3]) for i in range(0, len(params), 3)]
+        if query.startswith("MERGE"):
+            self.conn.statements.append(query)
+            self.output = [("UPDATE" if row[0] in self.conn.keys else "INSERT",) for row in rows]
+            self.conn.keys.update(row[0] for row in rows)
+            return
+        self.conn.inserted.extend(rows)
+    def fetchall(self):
+        return self.output
+    def fetchmany(self, size):
+        rows, self.output = self.output[:size], self.output[size:]
+        return rows
+    def close(self):
+        pass
+    def __enter__(self):
+        return self
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+class _FakeTdsConnection:
+    def __init__(self):
+        self.bulk_calls = []
+        self.inserted = []
+        self.statements = []
+        self.keys = set()
+    def cursor(self):
+        return _FakeTdsCursor(self)
+    def commit(self):
+        pass
+    def rollback(self):
+        pass
+    def close(self):
+        pass
+
+class _StandInMSSQL(MSSQLDatabase):
+    def __init__(self):
+        super().__init__("localhost", "test", "testuser", "testuser")
+        self.fake = _FakeTdsConnection()
+    def connect(self):
+        return self.fake
+    def _fetch_table_schema(self, table):
+        return {"id": "int", "name": "nvarchar", "updated": "datetime2"}
+
+class TestSQLServerBulkInsert(unittest.TestCase):
+    # *************************************************************************************************************
+    def test_select_dict_rows(self):
+        db = _StandInMSSQL()
+        db.fake.inserted.extend([(1, "a", None), (2, None, None), (3, "c", None)])
+        query = "SELECT id, name FROM dbo.test"
+        self.assertEqual(db.select(query)[1], {"id": 2, "name": None})  # connect() keeps dict rows
+        df = db.select_df(query)
+        self.assertEqual((list(df.columns), str(df["id"].dtype), df["name"].isna().tolist()), (["id", "name"], "int64", [False, True, False]))
+        arrays = db.select_numpy(query, chunk_size=2)
+        self.assertEqual(arrays["id"].tolist(), [1, 2, 3])
+        self.assertEqual(sum(len(chunk) for chunk in db.select_df_chunks(query, chunk_size=2)), 3)
+    # *************************************************************************************************************
+    def test_bulk_insert_dataframe(self):
+        db = _StandInMSSQL()
+        df = pd.DataFrame({
+            "id": [1, 2, 3, 4, 5],
+            "name": ["a", "b", None, "d", "e"],
+            "updated": ["2512090506"] * 5,
+            "ignored": [0] * 5,
+        })
+        result = db.bulk_insert_dataframe("dbo.test", df, batch_size=2, tablock=True)
+        self.assertEqual(result["attempted"], 5)
+        self.assertEqual(result["succeeded"], 5)
+        self.assertEqual(result["errors"], [])
+        self.assertIn("rows_per_sec", result)
+        self.assertEqual(len(db.fake.bulk_calls), 3)
+
+        first = db.fake.bulk_calls[0]
+        self.assertEqual(first["table"], "dbo.test")
+        self.assertTrue(first["options"]["tablock"])
+        self.assertEqual([type(c.type).__name__ for c in first["columns"]], ["IntType", "NVarCharType", "NVarCharType"])
+        self.assertEqual(first["rows"][0], (1, "a", "2512090506"))
+    # *************************************************************************************************************
+    @unittest.skipIf(pyarrow is None, "pyarrow not installed")
+    def test_insert_arrow_bulk_copy(self):
+        db = _StandInMSSQL()
+        table = pyarrow.table({"id": [1, None, 3], "name": ["a", "b", None], "updated": [datetime(2025, 1, 1)] * 3})
+        result = db.insert_arrow("dbo.test", table, batch_size=2)
+        self.assertEqual((result["attempted"], result["succeeded"], [pos for pos, _ in result["errors"]]), (3, 2, [2]))
+        self.assertEqual(len(db.fake.bulk_calls), 1)  # the batch with the NULL id falls back to INSERTs
+        self.assertEqual(db.fake.bulk_calls[0]["rows"], [(3, None, datetime(2025, 1, 1))])
+        self.assertEqual(db.fake.inserted, [(1, "a", datetime(2025, 1, 1))])
+    # *************************************************************************************************************
+    def test_upsert_dataframe_merge(self):
+        db = _StandInMSSQL()
+        db.fake.keys = {1, 2}
+        df = pd.DataFrame({"id": range(1, 1502), "name": ["x"] * 1501, "updated": [None] * 1501})
+        result = db.upsert_dataframe("dbo.test", df, key_columns=["id"], update_columns=["name"])
+        self.assertEqual((result["inserted"], result["updated"], result["failed"]), (1499, 2, 0))
+        self.assertEqual(len(db.fake.statements), 3)  # 2099 parameters / 3 columns -> 699 rows per MERGE
+        self.assertIn("WHEN MATCHED THEN UPDATE SET target.name = source.name", db.fake.statements[0])
+        self.assertTrue(db.fake.statements[0].endswith("OUTPUT $action;"))
+    # *************************************************************************************************************
+    def test_bulk_insert_dataframe_fallback(self):
+        db = _StandInMSSQL()
+        df = pd.DataFrame({"id": ["1", None, "3"], "name": ["a", "b", "c"], "updated": [datetime(2024, 1, 1)] * 3})
+        df["id"] = df["id"].astype(object)
+        result = db.bulk_insert_dataframe("dbo.test", df)
+        self.assertEqual(result["succeeded"], 2)
+        self.assertEqual(result["failed"], 1)
+        self.assertEqual([pos for pos, _ in result["errors"]], [2])
+        self.assertEqual(db.fake.bulk_calls, [])
+        self.assertEqual([row[0] for row in db.fake.inserted], [1, 3])
+    # *************************************************************************************************************
+
+
+########################################################################################################################
+### Tests for PostgreSQL COPY against a local stand-in (rows with a NULL id are rejected, as NOT NULL would)
+########################################################################################################################
+
+class _FakePgCopy:
+    def __init__(self, cur, query):
+        self.cur = cur
+        self.target = query.split()[1]
+        self.rows = []
+    def __enter__(self):
+        return self
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.cur.conn.copies += 1
+            self.cur.conn.write(self.target, self.rows)
+        return False
+    def set_types(self, types):
+        pass
+    def write_row(self, row):
+        self.rows.append(tuple(row))
+
+class _FakePgCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = -1
+    def __enter__(self):
+        return self
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+    def execute(self, query, params=(), prepare=None):
+        self.conn.check()
+        words = query.split()
+        if words[0] == "SAVEPOINT":
+            self.conn.savepoints[words[1]] = (len(self.conn.pending), dict(self.conn.staged))
+        elif words[0] == "ROLLBACK":
+            size, staged = self.conn.savepoints[words[-1]]
+            del self.conn.pending[size:]
+            self.conn.staged, self.conn.aborted = staged, False
+        elif query.startswith("INSERT INTO") and " SELECT " in query:
+            rows = self.conn.staged.pop(query.split(" FROM ")[-1].strip(), [])
+            self.conn.write(words[2], rows)
+            self.rowcount = len(rows)
+    def executemany(self, query, rows):
+        self.conn.check()
+        self.conn.write(query.split()[2], [tuple(row) for row in rows])
+    def copy(self, query):
+        self.conn.check()
+        return _FakePgCopy(self, query)
+    def close(self):
+        pass
+
+class _FakePgConnection:
+    def __init__(self):
+        self.committed = []
+        self.pending = []
+        self.staged = {}
+        self.savepoints = {}
+        self.aborted = False
+        self.rollbacks = 0
+        self.copies = 0
+    def check(self):
+        if self.aborted:
+            raise RuntimeError("current transaction is aborted, commands ignored until end of transaction block")
+    def write(self, target, rows):
+        self.check()
+        if any(row[0] is None for row in rows):
+            self.aborted = True
+            raise RuntimeError('null value in column "id" violates not-null constraint')
+        if target.startswith("_copy_stage_"):
+            self.staged.setdefault(target, []).extend(rows)
+        else:
+            self.pending.extend(rows)
+    def cursor(self, *args, **kwargs):
+        return _FakePgCursor(self)
+    def commit(self):
+        # the server turns COMMIT of an aborted transaction into a rollback
+        if not self.aborted:
+            self.committed.extend(self.pending)
+        self.pending, self.staged, self.aborted = [], {}, False
+    def rollback(self):
+        self.rollbacks += 1
+        self.pending, self.staged, self.aborted = [], {}, False
+    def close(self):
+        pass
+
+class _StandInPostgreSQL(PostgreSQLDatabase):
+    def __init__(self):
+        super().__init__("localhost", "test", "testuser", "testuser")
+        self.fake = _FakePgConnection()
+    def connect(self):
+        return self.fake
+    def _fetch_table_schema(self, table):
+        return {"id": "integer", "name": "text"}
+
+class TestPostgreSQLCopy(unittest.TestCase):
+    # *************************************************************************************************************
+    def test_copy_rows_rolls_back_failed_chunk(self):
+        db = _StandInPostgreSQL()
+        with db.session():
+            with self.assertRaises(RuntimeError):
+                db.copy_rows("test", ["id", "name"], [(1, "a"), (2, "b"), (None, "c"), (4, "d")], chunk_size=2)
+            self.assertFalse(db.fake.aborted)  # the pinned connection is usable again
+            db.copy_rows("test", ["id", "name"], [(5, "e")])
+        self.assertEqual([row[0] for row in db.fake.committed], [1, 2, 5])
+        self.assertEqual(db.fake.rollbacks, 1)
+
+        with self.assertRaises(RuntimeError):
+            db.copy_rows("test", ["id", "name"], [(6, "f"), (None, "g")], stage=True)
+        self.assertEqual((len(db.fake.committed), db.fake.aborted), (3, False))
+        self.assertEqual(db.copy_rows("test", ["id", "name"], [(6, "f"), (7, "g")], stage=True), 2)
+        self.assertEqual([row[0] for row in db.fake.committed], [1, 2, 5, 6, 7])
+    # *************************************************************************************************************
+    def test_copy_rows_in_transaction(self):
+        db = _StandInPostgreSQL()
+        with self.assertRaises(RuntimeError):
+            with db.transaction():
+                db.copy_rows("test", ["id", "name"], [(1, "a")])
+                db.copy_rows("test", ["id", "name"], [(None, "b")])
+        self.assertEqual((db.fake.committed, db.fake.aborted), ([], False))
+    # *************************************************************************************************************
+    def test_copy_dataframe(self):
+        db = _StandInPostgreSQL()
+        df = pd.DataFrame({"id": [1, 2, None, 4, 5], "name": list("abcde")}).astype({"id": object})
+        with db.session():
+            result = db.copy_dataframe("test", df, chunk_size=2)
+            # the rejected chunk is rolled back and retried row by row
+            self.assertEqual((result["succeeded"], [pos for pos, _ in result["errors"]]), (4, [3]))
+            self.assertFalse(db.fake.aborted)
+            with self.assertRaises(RuntimeError):
+                db.copy_dataframe("test", df, stage=True)
+            self.assertFalse(db.fake.aborted)
+        self.assertEqual([row[0] for row in db.fake.committed], [1, 2, 4, 5])
+    # *************************************************************************************************************
+    def test_insert_dataframe_auto_batch_skips_copy(self):
+        db = _StandInPostgreSQL()
+        db.copy_threshold = 10
+        df = pd.DataFrame({"id": range(50), "name": ["x"] * 50})
+        result = db.insert_dataframe("test", df)
+        self.assertEqual((result["succeeded"], db.fake.copies), (50, 1))  # large frame: COPY
+        self.assertNotIn("batch_size", result)
+
+        result = db.insert_dataframe("test", df, batch_size="auto")
+        self.assertEqual((result["succeeded"], db.fake.copies), (50, 1))  # batched INSERT, adaptive size
+        self.assertGreaterEqual(result["batch_size"], 1)
+        self.assertEqual(len(db.fake.committed), 100)
+    # *************************************************************************************************************
+
+########################################################################################################################
+### Benchmark runner (the benchmarks themselves run with python -m benchmarks.bench_db)
+########################################################################################################################
+
+class TestBenchmarks(unittest.TestCase):
+    # *************************************************************************************************************
+    def test_run_and_compare(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            backends = bench_db.open_backends(["sqlite-memory", "sqlite-disk"], tmpdir)
+            results = bench_db.run(backends, [50], ["narrow"], rounds=1)
+            for db in backends.values():
+                db.close()
+        self.assertEqual(len(results), 2 * 6)
+        self.assertIn("insert_dataframe[sqlite-memory-narrow-50]", bench_db.report(results))
+        baseline = {"benchmarks": [dict(r, stats=dict(r["stats"], median=r["stats"]["median"] / 2)) for r in results]}
+        self.assertEqual(len(bench_db.compare(baseline, results, threshold=0.5)), len(results))
+        self.assertEqual(bench_db.compare({"benchmarks": results}, results, threshold=0.0), [])
+    # *************************************************************************************************************
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -400,4 +1725,4 @@ if __name__ == '__main__':
 
 # GRANT ALL ON TABLE tst.test TO lakas;
 
-# GRANT ALL ON TABLE tst.test TO testuser;
\ No newline at end of file
+# GRANT ALL ON TABLE tst.test TO testuser;